@@ -0,0 +1,798 @@
+"""Analysis engines: the same result tables computed in-process or with Spark.
+
+`data_analyzer.py` defines each analysis section once against the
+`AnalysisEngine` interface. `PandasEngine` runs in-process on columnar
+DataFrames and avoids JVM startup for small inputs; `SparkEngine`
+distributes the work for large ones. Both return small pandas tables
+with the same columns and deterministic ordering (ties broken by key).
+"""
+
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from arrow_store import load_frame
+from utils import NORMALIZER_VERSION, TITLE_STOP_WORDS, title_token_column, tokenize_title
+
+# Inputs above this size (videos + comments JSON) go to Spark
+SPARK_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+VIDEO_COLUMNS = ["videoId", "title", "channelTitle", "query", "publishedAt",
+                 "viewCount", "likeCount", "commentCount", "titleTokens", "tokensVersion"]
+
+COMMENT_EXPORT_COLUMNS = ["videoId", "commentId", "author", "text", "likeCount", "publishedAt"]
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Export file prefixes, named after their content (outputs/analysis_videos_* and
+# analysis_comments_* are the per-video and per-comment tables of earlier runs)
+TOP_CHANNELS_EXPORT = 'analysis_top_channels'
+COMMENTS_EXPORT = 'analysis_comment_records'
+
+SENTIMENT_DIMENSIONS = ("query", "month", "channelTitle", "videoId")
+
+# Stop words of the title keyword analysis
+KEYWORD_STOP_WORDS = TITLE_STOP_WORDS
+
+
+def extract_title_keywords(title):
+    """Normalized, de-duplicated keywords of a title."""
+    return keywords_from_tokens(tokenize_title(title))
+
+
+def keywords_from_tokens(tokens):
+    """De-duplicated keywords of a title's stored tokens."""
+    return [token for token in dict.fromkeys(tokens) if token not in KEYWORD_STOP_WORDS]
+
+
+def with_spark_keywords(df):
+    """Spark DataFrame of videos with a `keywords` column.
+
+    Spark evaluates a Python UDF for every row even inside when/otherwise,
+    so rows with current stored tokens are split off and filtered
+    natively; only the others go through the Python extractor.
+    """
+    from pyspark.sql.functions import array_distinct, coalesce, col, filter, lit, udf
+    from pyspark.sql.types import ArrayType, StringType
+
+    extract_keywords_udf = udf(extract_title_keywords, ArrayType(StringType()))
+    if 'titleTokens' not in df.columns:
+        return df.withColumn("keywords", extract_keywords_udf(col("title")))
+
+    current = coalesce(col("tokensVersion") == NORMALIZER_VERSION, lit(False))
+    stored = df.filter(current) \
+               .withColumn("keywords", filter(array_distinct(col("titleTokens")),
+                                              lambda token: ~token.isin(list(KEYWORD_STOP_WORDS))))
+    stale = df.filter(~current).withColumn("keywords", extract_keywords_udf(col("title")))
+    return stored.unionByName(stale)
+
+
+# =============================================================================
+# INTERFACE
+# =============================================================================
+
+class AnalysisEngine:
+    """Result tables of every analysis section."""
+
+    name = 'base'
+    label = 'base'
+    duplicates_excluded = False
+
+    def general_stats(self):
+        """Dict with video/comment counts and mean views, likes, comments."""
+        raise NotImplementedError
+
+    def top_channels(self, n=10):
+        """channelTitle, nb_videos, total_views, total_likes."""
+        raise NotImplementedError
+
+    def timeline(self, n=10):
+        """published_date, video_count for the n most recent dates."""
+        raise NotImplementedError
+
+    def keyword_counts(self, n=15):
+        """keyword, count over title keywords."""
+        raise NotImplementedError
+
+    def top_videos(self, n=10):
+        """viewCount, channelTitle, title of the most viewed videos."""
+        raise NotImplementedError
+
+    def top_authors(self, n=10):
+        """author, count of the most active commenters."""
+        raise NotImplementedError
+
+    def top_liked_comments(self, n=5):
+        """likeCount, author, text of the most liked comments."""
+        raise NotImplementedError
+
+    def reply_threads(self, n=5):
+        """(reply count, table of the most replied threads), or None without replies."""
+        raise NotImplementedError
+
+    def query_stats(self):
+        """query, nb_videos, total_views, total_likes."""
+        raise NotImplementedError
+
+    def sentiment(self):
+        """Dict with label counts, aggregates per dimension, scored count and elapsed seconds."""
+        raise NotImplementedError
+
+    def sketches(self):
+        """EngagementSketches (distinct commenters, percentiles) of the data."""
+        raise NotImplementedError
+
+    def daily_activity(self):
+        """date, query, videos, comments, sentiment_sum, sentiment_comments per publication day."""
+        raise NotImplementedError
+
+    def anomalies(self):
+        """AnomalyDetector with the spike days of the daily series, synced if the data changed."""
+        from anomalies import AnomalyDetector
+        from text_features import sources_version
+
+        version = sources_version(self.data_dir)
+        if self.duplicates_excluded:
+            version += '|without-duplicates'
+        detector = AnomalyDetector(self.data_dir)
+        if detector.version != version:
+            resumed, replayed = detector.sync(self.daily_activity(), version)
+            detector.save()
+            print(f"   Anomalies: {resumed} series resumed, {replayed} replayed")
+        return detector
+
+    def interaction_edges(self):
+        """author, videoId, comments, channelTitle: one row per author–video pair of the comment graph."""
+        raise NotImplementedError
+
+    def topics(self):
+        """Dict with NMF topics (top terms) and their shares per query and month."""
+        raise NotImplementedError
+
+    def duplicates(self):
+        """DuplicateReport (near-duplicate clusters, suspicious authors) of the comments."""
+        raise NotImplementedError
+
+    def exclude_duplicates(self, report):
+        """Drop copies (all but the first comment of each cluster) and suspicious authors' comments."""
+        raise NotImplementedError
+
+    def export(self, outputs_dir, formats=EXPORT_FORMATS, merge_summaries=False):
+        """Write the top-channels summary and comment tables to outputs/.
+
+        Files are named `<prefix>_<engine>` (see TOP_CHANNELS_EXPORT and
+        COMMENTS_EXPORT). Tables are written in the engine's native layout;
+        with `merge_summaries`, summaries go to a single
+        `analysis_top_channels_<engine>.<format>` file.
+        """
+        raise NotImplementedError
+
+    def stop(self):
+        """Release engine resources."""
+
+
+def _aggregate_sentiment(df, key):
+    """Shared pandas aggregation of scored comments (used on Spark partial results too)."""
+    return (
+        df.groupby(key, dropna=False)
+          .agg(comments=('sentimentScore', 'size'),
+               mean_score=('sentimentScore', 'mean'),
+               positive_share=('positive', 'mean'),
+               negative_share=('negative', 'mean'))
+          .reset_index()
+          .sort_values([key], kind='mergesort')
+          .reset_index(drop=True)
+    )
+
+
+# =============================================================================
+# IN-PROCESS ENGINE
+# =============================================================================
+
+class PandasEngine(AnalysisEngine):
+    """Columnar in-process engine for inputs that fit in memory."""
+
+    name = 'pandas'
+    label = 'pandas'
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        # Memory-mapped Arrow cache: only the selected video columns are read
+        self.videos = load_frame('videos', VIDEO_COLUMNS, data_dir)
+        self.comments = load_frame('comments', data_dir=data_dir)
+
+    def general_stats(self):
+        return {
+            'video_count': len(self.videos),
+            'comment_count': len(self.comments),
+            'avg_views': self.videos['viewCount'].mean(),
+            'avg_likes': self.videos['likeCount'].mean(),
+            'avg_comments': self.videos['commentCount'].mean(),
+        }
+
+    def top_channels(self, n=10):
+        table = (
+            self.videos.groupby('channelTitle', dropna=False)
+                       .agg(nb_videos=('channelTitle', 'size'),
+                            total_views=('viewCount', 'sum'),
+                            total_likes=('likeCount', 'sum'))
+                       .reset_index()
+        )
+        return table.sort_values(['nb_videos', 'channelTitle'], ascending=[False, True]) \
+                    .head(n).reset_index(drop=True)
+
+    def timeline(self, n=10):
+        dates = pd.to_datetime(self.videos['publishedAt'].str[:10]).dt.date
+        table = dates.value_counts().rename_axis('published_date').reset_index(name='video_count')
+        return table.sort_values('published_date', ascending=False).head(n).reset_index(drop=True)
+
+    def keyword_counts(self, n=15):
+        if 'titleTokens' in self.videos.columns:
+            tokens = title_token_column(self.videos['title'], self.videos['titleTokens'],
+                                        self.videos['tokensVersion'])
+        else:
+            tokens = title_token_column(self.videos['title'])
+        keywords = pd.Series([keywords_from_tokens(t) for t in tokens], dtype=object).explode().dropna()
+        table = keywords.value_counts().rename_axis('keyword').reset_index(name='count')
+        return table.sort_values(['count', 'keyword'], ascending=[False, True]) \
+                    .head(n).reset_index(drop=True)
+
+    def top_videos(self, n=10):
+        return self.videos.sort_values(['viewCount', 'videoId'], ascending=[False, True]) \
+                          .head(n)[['viewCount', 'channelTitle', 'title']].reset_index(drop=True)
+
+    def top_authors(self, n=10):
+        table = self.comments['author'].value_counts().rename_axis('author').reset_index(name='count')
+        return table.sort_values(['count', 'author'], ascending=[False, True]) \
+                    .head(n).reset_index(drop=True)
+
+    def top_liked_comments(self, n=5):
+        return self.comments.sort_values(['likeCount', 'commentId'], ascending=[False, True]) \
+                            .head(n)[['likeCount', 'author', 'text']].reset_index(drop=True)
+
+    def reply_threads(self, n=5):
+        if 'parentId' not in self.comments.columns:
+            return None
+        is_reply = self.comments['parentId'].fillna('') != ''
+        replies = self.comments[is_reply]
+        if replies.empty:
+            return len(replies), replies.iloc[0:0]
+
+        threads = replies.groupby('parentId').agg(replies=('commentId', 'size'),
+                                                  participants=('author', 'nunique')).reset_index()
+        parents = self.comments[['commentId', 'author', 'text']].rename(columns={'commentId': 'parentId'})
+        table = threads.merge(parents, on='parentId')
+        table = table.sort_values(['replies', 'parentId'], ascending=[False, True]).head(n)
+        return len(replies), table.reset_index(drop=True)
+
+    def query_stats(self):
+        table = (
+            self.videos.groupby('query', dropna=False)
+                       .agg(nb_videos=('query', 'size'),
+                            total_views=('viewCount', 'sum'),
+                            total_likes=('likeCount', 'sum'))
+                       .reset_index()
+        )
+        return table.sort_values(['nb_videos', 'query'], ascending=[False, True]).reset_index(drop=True)
+
+    def sentiment(self):
+        from sentiment import label_series, score_series
+
+        start = time.perf_counter()
+        scores = score_series(self.comments['text'])
+        labels = label_series(scores)
+        elapsed = time.perf_counter() - start
+
+        scored = pd.DataFrame({
+            'videoId': self.comments['videoId'],
+            'month': self.comments['publishedAt'].str[:7],
+            'sentimentScore': scores,
+            'positive': (labels == 'positive').astype('float64'),
+            'negative': (labels == 'negative').astype('float64'),
+        })
+        # One row per comment; only the per-query table repeats a comment under each of its video's queries
+        scored = scored.merge(self.videos[['videoId', 'channelTitle']].drop_duplicates('videoId'), on='videoId')
+        per_query = scored.merge(self.videos[['videoId', 'query']].drop_duplicates(), on='videoId')
+
+        label_counts = labels.value_counts().rename_axis('sentimentLabel').reset_index(name='count')
+        return {
+            'scored': len(scores),
+            'elapsed': elapsed,
+            'labels': label_counts.sort_values(['count', 'sentimentLabel'], ascending=[False, True])
+                                  .reset_index(drop=True),
+            'by': {key: _aggregate_sentiment(per_query if key == 'query' else scored, key)
+                   for key in SENTIMENT_DIMENSIONS},
+        }
+
+    def sketches(self):
+        from sketches import load_sketches
+
+        # Stored next to the data; rebuilt in one streamed pass when stale
+        return load_sketches(self.data_dir)
+
+    def daily_activity(self):
+        from sentiment import score_series
+
+        videos = self.videos.drop_duplicates(['videoId', 'query'])
+        video_days = videos.assign(date=videos['publishedAt'].str[:10]) \
+                           .groupby(['date', 'query']).size().rename('videos')
+        comments = pd.DataFrame({
+            'videoId': self.comments['videoId'],
+            'date': self.comments['publishedAt'].str[:10],
+            'sentimentScore': score_series(self.comments['text']),
+        }).merge(videos[['videoId', 'query']], on='videoId')
+        comment_days = comments.groupby(['date', 'query']).agg(
+            comments=('sentimentScore', 'size'),
+            sentiment_sum=('sentimentScore', 'sum'),
+        )
+        daily = pd.concat([video_days, comment_days], axis=1).fillna(0).reset_index()
+        daily['sentiment_comments'] = daily['comments']
+        return daily.sort_values(['date', 'query']).reset_index(drop=True)
+
+    def interaction_edges(self):
+        edges = self.comments.groupby(['author', 'videoId']).size().reset_index(name='comments')
+        channels = self.videos.drop_duplicates('videoId').set_index('videoId')['channelTitle']
+        return edges.assign(channelTitle=edges['videoId'].map(channels))
+
+    def topics(self):
+        from text_features import load_topics
+
+        # Always over the full data files, like the stored matrix they come from
+        return load_topics(self.data_dir)
+
+    def duplicates(self):
+        from duplicates import load_duplicates
+
+        return load_duplicates(self.data_dir, self.comments)
+
+    def exclude_duplicates(self, report):
+        self.comments = self.comments[report.keep_mask(self.comments)].reset_index(drop=True)
+        self.duplicates_excluded = True
+
+    def export(self, outputs_dir, formats=EXPORT_FORMATS, merge_summaries=False):
+        columns = COMMENT_EXPORT_COLUMNS + (['parentId'] if 'parentId' in self.comments.columns else [])
+        tables = {
+            TOP_CHANNELS_EXPORT: self.top_channels(),
+            COMMENTS_EXPORT: self.comments[columns],
+        }
+        for fmt in formats:
+            if fmt == 'parquet':
+                try:
+                    import pyarrow  # noqa: F401
+                except ImportError:
+                    print("pyarrow not available - Parquet export skipped")
+                    continue
+            for prefix, table in tables.items():
+                path = f'{outputs_dir}/{prefix}_{self.name}.{fmt}'
+                if fmt == 'csv':
+                    table.to_csv(path, index=False)
+                else:
+                    table.to_parquet(path, index=False)
+
+
+# =============================================================================
+# SPARK ENGINE
+# =============================================================================
+
+class SparkEngine(AnalysisEngine):
+    """Distributed engine (PySpark) for inputs that do not fit comfortably in memory."""
+
+    name = 'pyspark'
+    label = 'PySpark'
+
+    def __init__(self, data_dir):
+        from pyspark.sql import SparkSession
+        from pyspark.sql.functions import col
+
+        self.data_dir = data_dir
+        self.spark = SparkSession.builder \
+            .appName("YouTubeGazaAnalysis") \
+            .config("spark.driver.memory", "2g") \
+            .getOrCreate()
+        self.spark.sparkContext.setLogLevel("WARN")
+
+        try:
+            reader = self.spark.read.option("multiLine", True)
+            self.df_videos = reader.json(f'{data_dir}/youtube_videos.json') \
+                .withColumn("viewCount", col("viewCount").cast("long")) \
+                .withColumn("likeCount", col("likeCount").cast("long")) \
+                .withColumn("commentCount", col("commentCount").cast("long"))
+            self.df_comments = reader.json(f'{data_dir}/youtube_comments.json') \
+                .withColumn("likeCount", col("likeCount").cast("long"))
+        except Exception:
+            self.spark.stop()
+            raise
+
+        self.df_videos.createOrReplaceTempView("videos")
+        self.df_comments.createOrReplaceTempView("comments")
+
+    def general_stats(self):
+        from pyspark.sql.functions import mean
+
+        stats = self.df_videos.select(
+            mean("viewCount").alias("avg_views"),
+            mean("likeCount").alias("avg_likes"),
+            mean("commentCount").alias("avg_comments")
+        ).first()
+        return {
+            'video_count': self.df_videos.count(),
+            'comment_count': self.df_comments.count(),
+            'avg_views': stats['avg_views'],
+            'avg_likes': stats['avg_likes'],
+            'avg_comments': stats['avg_comments'],
+        }
+
+    def _top_channels(self, n):
+        return self.spark.sql(f"""
+            SELECT channelTitle,
+                   COUNT(*) as nb_videos,
+                   SUM(viewCount) as total_views,
+                   SUM(likeCount) as total_likes
+            FROM videos
+            GROUP BY channelTitle
+            ORDER BY nb_videos DESC, channelTitle ASC
+            LIMIT {int(n)}
+        """)
+
+    def top_channels(self, n=10):
+        return self._top_channels(n).toPandas()
+
+    def timeline(self, n=10):
+        from pyspark.sql.functions import col, count, to_date
+
+        return self.df_videos.withColumn("published_date", to_date(col("publishedAt"))) \
+                             .groupBy("published_date") \
+                             .agg(count("*").alias("video_count")) \
+                             .orderBy(col("published_date").desc()) \
+                             .limit(n) \
+                             .toPandas()
+
+    def keyword_counts(self, n=15):
+        from pyspark.sql.functions import col, count, explode
+
+        videos = with_spark_keywords(self.df_videos)
+        return videos.select(explode(col("keywords")).alias("keyword")) \
+                     .groupBy("keyword") \
+                     .agg(count("*").alias("count")) \
+                     .orderBy(col("count").desc(), col("keyword")) \
+                     .limit(n) \
+                     .toPandas()
+
+    def top_videos(self, n=10):
+        from pyspark.sql.functions import col
+
+        return self.df_videos.orderBy(col("viewCount").desc(), col("videoId")) \
+                             .select("viewCount", "channelTitle", "title") \
+                             .limit(n) \
+                             .toPandas()
+
+    def top_authors(self, n=10):
+        return self.spark.sql(f"""
+            SELECT author, COUNT(*) as count
+            FROM comments
+            GROUP BY author
+            ORDER BY count DESC, author ASC
+            LIMIT {int(n)}
+        """).toPandas()
+
+    def top_liked_comments(self, n=5):
+        from pyspark.sql.functions import col
+
+        return self.df_comments.orderBy(col("likeCount").desc(), col("commentId")) \
+                               .select("likeCount", "author", "text") \
+                               .limit(n) \
+                               .toPandas()
+
+    def reply_threads(self, n=5):
+        from pyspark.sql.functions import col, count, countDistinct
+
+        if 'parentId' not in self.df_comments.columns:
+            return None
+        replies = self.df_comments.filter(col("parentId").isNotNull() & (col("parentId") != ""))
+        reply_count = replies.count()
+
+        parents = self.df_comments.select(col("commentId").alias("parentId"), "author", "text")
+        table = replies.groupBy("parentId") \
+                       .agg(count("*").alias("replies"),
+                            countDistinct("author").alias("participants")) \
+                       .join(parents, "parentId") \
+                       .orderBy(col("replies").desc(), col("parentId")) \
+                       .limit(n) \
+                       .toPandas()
+        return reply_count, table
+
+    def query_stats(self):
+        from pyspark.sql.functions import count, sum as spark_sum
+
+        return self.df_videos.groupBy("query") \
+                             .agg(count("*").alias("nb_videos"),
+                                  spark_sum("viewCount").alias("total_views"),
+                                  spark_sum("likeCount").alias("total_likes")) \
+                             .orderBy(["nb_videos", "query"], ascending=[False, True]) \
+                             .toPandas()
+
+    def sentiment(self):
+        from pyspark.sql.functions import col, count, mean, pandas_udf, substring, when
+        from pyspark.sql.types import DoubleType
+
+        @pandas_udf(DoubleType())
+        def sentiment_score_udf(texts: pd.Series) -> pd.Series:
+            """Score a batch of comment texts with the offline lexicon."""
+            from sentiment import score_series
+            return score_series(texts)
+
+        start = time.perf_counter()
+        scored = self.df_comments.select("videoId", "publishedAt", "text") \
+            .withColumn("sentimentScore", sentiment_score_udf(col("text"))) \
+            .withColumn("sentimentLabel",
+                        when(col("sentimentScore") >= 0.05, "positive")
+                        .when(col("sentimentScore") <= -0.05, "negative")
+                        .otherwise("neutral")) \
+            .cache()
+        scored_count = scored.count()
+        elapsed = time.perf_counter() - start
+
+        # One row per comment; only the per-query table repeats a comment under each of its video's queries
+        context = scored.join(
+            self.df_videos.select("videoId", "channelTitle").dropDuplicates(["videoId"]), "videoId"
+        ).withColumn("month", substring(col("publishedAt"), 1, 7)) \
+         .withColumn("positive", (col("sentimentLabel") == "positive").cast("double")) \
+         .withColumn("negative", (col("sentimentLabel") == "negative").cast("double"))
+        per_query = context.join(self.df_videos.select("videoId", "query").dropDuplicates(), "videoId")
+
+        by = {}
+        for key in SENTIMENT_DIMENSIONS:
+            table = (per_query if key == 'query' else context).groupBy(key).agg(
+                count("*").alias("comments"),
+                mean("sentimentScore").alias("mean_score"),
+                mean("positive").alias("positive_share"),
+                mean("negative").alias("negative_share")
+            ).toPandas()
+            by[key] = table.sort_values([key], kind='mergesort').reset_index(drop=True)
+
+        labels = scored.groupBy("sentimentLabel").count().toPandas()
+        scored.unpersist()
+        return {
+            'scored': scored_count,
+            'elapsed': elapsed,
+            'labels': labels.sort_values(['count', 'sentimentLabel'], ascending=[False, True])
+                            .reset_index(drop=True),
+            'by': by,
+        }
+
+    def sketches(self):
+        from arrow_store import source_version
+        from sketches import VIDEO_GROUPS, EngagementSketches, save_sketches
+
+        def sketch_videos(groups):
+            def sketch(rows):
+                sketches = EngagementSketches()
+                for row in rows:
+                    sketches.add_video(row.asDict(), groups)
+                yield sketches
+            return sketch
+
+        def sketch_comments(groups):
+            def sketch(rows):
+                sketches = EngagementSketches()
+                for row in rows:
+                    comment = row.asDict()
+                    sketches.add_comment(comment, comment, groups)  # joined with its video's channel/query
+                yield sketches
+            return sketch
+
+        # A video listed under several queries counts once per query for 'query', once elsewhere
+        videos = self.df_videos.select("videoId", "channelTitle", "query", "publishedAt", "viewCount", "likeCount")
+        comments = self.df_comments.select("videoId", "commentId", "author", "likeCount", "publishedAt") \
+                                   .dropDuplicates(["commentId", "videoId"])
+        other_groups = tuple(g for g in VIDEO_GROUPS if g != 'query')
+        parts = [
+            (videos.dropDuplicates(["videoId"]), sketch_videos(other_groups)),
+            (videos.dropDuplicates(["videoId", "query"]), sketch_videos(('query',))),
+            (comments.join(videos.select("videoId", "channelTitle").dropDuplicates(["videoId"]), "videoId"),
+             sketch_comments(('video',) + other_groups)),
+            (comments.join(videos.select("videoId", "query").dropDuplicates(), "videoId"),
+             sketch_comments(('query',))),
+        ]
+
+        # One pass per partition on the executors, partial sketches merged pairwise
+        rdd = None
+        for df, sketch in parts:
+            partial = df.rdd.mapPartitions(sketch)
+            rdd = partial if rdd is None else rdd.union(partial)
+        sketches = rdd.treeReduce(lambda a, b: a.merge(b))
+        save_sketches(sketches, self.data_dir, source_version(f'{self.data_dir}/youtube_videos.json'))
+        return sketches
+
+    def daily_activity(self):
+        from pyspark.sql.functions import col, count, pandas_udf, substring, sum as sum_
+        from pyspark.sql.types import DoubleType
+
+        @pandas_udf(DoubleType())
+        def sentiment_score_udf(texts: pd.Series) -> pd.Series:
+            """Score a batch of comment texts with the offline lexicon."""
+            from sentiment import score_series
+            return score_series(texts)
+
+        # One small row per (day, query) reaches the driver
+        videos = self.df_videos.select("videoId", "query", "publishedAt").dropDuplicates(["videoId", "query"])
+        video_days = videos.groupBy(substring(col("publishedAt"), 1, 10).alias("date"), "query") \
+                           .agg(count("*").alias("videos"))
+        comment_days = self.df_comments.select("videoId", "publishedAt", "text") \
+            .withColumn("sentimentScore", sentiment_score_udf(col("text"))) \
+            .join(videos.select("videoId", "query"), "videoId") \
+            .groupBy(substring(col("publishedAt"), 1, 10).alias("date"), "query") \
+            .agg(count("*").alias("comments"), sum_("sentimentScore").alias("sentiment_sum"))
+        daily = video_days.join(comment_days, ["date", "query"], "outer").toPandas().fillna(0)
+        daily['sentiment_comments'] = daily['comments']
+        return daily.sort_values(['date', 'query']).reset_index(drop=True)
+
+    def interaction_edges(self):
+        # Aggregated on the executors; only the distinct author–video edges are collected
+        return self.df_comments.filter("author IS NOT NULL") \
+                               .groupBy("author", "videoId") \
+                               .count() \
+                               .withColumnRenamed("count", "comments") \
+                               .join(self.df_videos.select("videoId", "channelTitle").dropDuplicates(["videoId"]),
+                                     "videoId", "left") \
+                               .toPandas()
+
+    def topics(self):
+        from pyspark.sql.functions import coalesce, col, concat, lit, substring, when
+        from text_features import DocumentTermMatrix, fit_topics, save_topics, sources_version, tokenize_batch
+
+        version = sources_version(self.data_dir)
+        matrix = DocumentTermMatrix(self.data_dir)
+        if matrix.version != version:
+            videos = self.df_videos.dropDuplicates(["videoId", "query"])
+            tokens = when(col("tokensVersion") == NORMALIZER_VERSION, col("titleTokens")) \
+                if 'titleTokens' in videos.columns else lit(None).cast("array<string>")
+            query = coalesce(col("query"), lit(""))
+            titles = videos.select(concat(lit("v:"), col("videoId"), lit(":"), query).alias("key"),
+                                   lit("title").alias("kind"), query.alias("query"),
+                                   substring(col("publishedAt"), 1, 7).alias("month"),
+                                   tokens.alias("tokens"), col("title").alias("text"))
+            comments = self.df_comments.dropDuplicates(["commentId", "videoId"]) \
+                .join(videos.dropDuplicates(["videoId"]).select("videoId", "query"), "videoId", "left") \
+                .select(concat(lit("c:"), col("commentId"), lit(":"), col("videoId")).alias("key"),
+                        lit("comment").alias("kind"), query.alias("query"),
+                        substring(col("publishedAt"), 1, 7).alias("month"),
+                        lit(None).cast("array<string>").alias("tokens"),
+                        coalesce(col("text"), lit("")).alias("text"))
+            docs = titles.unionByName(comments)
+
+            removed = matrix.retain(row.key for row in docs.select("key").toLocalIterator())
+            known = self.spark.createDataFrame([(key,) for key in matrix.docs['key']], "key string")
+            # One count block per partition; the driver receives non-zeros only
+            blocks = docs.join(known, "key", "left_anti") \
+                         .select("key", "kind", "query", "month", "tokens", "text") \
+                         .rdd.mapPartitions(lambda rows: [tokenize_batch([tuple(row) for row in rows])]) \
+                         .collect()
+            added = sum(len(block[0]) for block in blocks)
+            matrix.append(blocks)
+            matrix.version = version
+            matrix.save()
+            print(f"   Text features: +{added} / -{removed} documents ({matrix.counts.nnz:,} non-zeros)")
+
+        topics = fit_topics(matrix)
+        save_topics(topics, self.data_dir, version)
+        return topics
+
+    def duplicates(self):
+        from pyspark.sql.functions import col
+        from arrow_store import source_version
+        from duplicates import (DuplicateReport, band_keys, bucket_edges, cluster_labels,
+                                save_duplicates, signature_batch)
+
+        comments = self.df_comments.select("videoId", "commentId", "author", "text") \
+                                   .dropDuplicates(["commentId", "videoId"])
+
+        # Signatures per partition, then one group per LSH bucket; only accepted pairs reach the driver
+        edges = comments.rdd.mapPartitions(lambda rows: signature_batch((r.commentId, r.text or '') for r in rows)) \
+                            .flatMap(lambda signed: [(key, signed) for key in band_keys(signed[1])]) \
+                            .groupByKey() \
+                            .flatMap(lambda bucket: bucket_edges(list(bucket[1]))) \
+                            .distinct() \
+                            .collect()
+        labels = self.spark.createDataFrame(list(cluster_labels(edges).items()), "commentId string, cluster string")
+
+        members = comments.join(labels, "commentId").dropDuplicates(["commentId"])
+        author_counts = comments.groupBy("author").count() \
+                                .join(members.select("author").distinct(), "author") \
+                                .toPandas()
+        report = DuplicateReport.from_members(
+            members.select("videoId", "commentId", "author", "text", "cluster").toPandas(),
+            author_counts.set_index("author")["count"]
+        )
+        save_duplicates(report, self.data_dir, source_version(f'{self.data_dir}/youtube_comments.json'))
+        return report
+
+    def exclude_duplicates(self, report):
+        from pyspark.sql.functions import col
+
+        labels = self.spark.createDataFrame(list(report.labels.items()), "commentId string, cluster string")
+        suspicious = list(report.suspicious_authors['author'])
+        self.df_comments = self.df_comments.join(labels, "commentId", "left") \
+            .filter(col("cluster").isNull() | (col("cluster") == col("commentId"))) \
+            .filter(col("author").isNull() | ~col("author").isin(suspicious)) \
+            .drop("cluster")
+        self.df_comments.createOrReplaceTempView("comments")
+        self.duplicates_excluded = True
+
+    @staticmethod
+    def _writer(df, fmt):
+        writer = df.write.mode("overwrite").format(fmt)
+        if fmt == 'csv':
+            # Quote-escape like pandas so texts with commas/newlines read back intact
+            writer = writer.option("header", True).option("escape", '"')
+        return writer
+
+    def _write_single(self, df, path, fmt):
+        """Write a small DataFrame as one file (single partition, then renamed)."""
+        tmp_dir = f'{path}.tmp'
+        self._writer(df.coalesce(1), fmt).save(tmp_dir)
+        part = next(name for name in sorted(os.listdir(tmp_dir)) if name.startswith('part-'))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(os.path.join(tmp_dir, part), path)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def export(self, outputs_dir, formats=EXPORT_FORMATS, merge_summaries=False):
+        # Executors write their partitions directly; nothing is collected to the driver
+        columns = COMMENT_EXPORT_COLUMNS + (['parentId'] if 'parentId' in self.df_comments.columns else [])
+        comments = self.df_comments.select(*columns)
+        channels = self._top_channels(10)
+
+        for fmt in formats:
+            self._writer(comments, fmt).save(f'{outputs_dir}/{COMMENTS_EXPORT}_{self.name}_{fmt}')
+            if merge_summaries:
+                self._write_single(channels, f'{outputs_dir}/{TOP_CHANNELS_EXPORT}_{self.name}.{fmt}', fmt)
+            else:
+                self._writer(channels, fmt).save(f'{outputs_dir}/{TOP_CHANNELS_EXPORT}_{self.name}_{fmt}')
+
+    def stop(self):
+        self.spark.stop()
+
+
+# =============================================================================
+# SELECTION
+# =============================================================================
+
+ENGINES = {
+    'pandas': PandasEngine,
+    'spark': SparkEngine,
+}
+
+
+def input_size(data_dir):
+    """Total size in bytes of the analyzer inputs."""
+    return sum(
+        os.path.getsize(path)
+        for path in (f'{data_dir}/youtube_videos.json', f'{data_dir}/youtube_comments.json')
+        if os.path.exists(path)
+    )
+
+
+def select_engine(data_dir, name=None, threshold_bytes=SPARK_THRESHOLD_BYTES):
+    """Create the engine for the data, by name or automatically by input size.
+
+    The ANALYSIS_ENGINE environment variable (`pandas` or `spark`) overrides
+    the automatic choice; Spark falls back to pandas when not installed.
+    """
+    name = name or os.environ.get('ANALYSIS_ENGINE')
+    if not name:
+        name = 'spark' if input_size(data_dir) > threshold_bytes else 'pandas'
+
+    if name == 'spark':
+        try:
+            import pyspark  # noqa: F401
+        except ImportError:
+            print("pyspark not available - using the pandas engine")
+            name = 'pandas'
+
+    return ENGINES[name](data_dir)
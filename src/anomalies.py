@@ -0,0 +1,201 @@
+"""Spike detection on daily activity per query, with incremental statistics.
+
+Each (query, metric) pair is a daily series: videos published, comments
+posted, and mean comment sentiment. An exponentially weighted mean and
+variance is kept per series and updated in O(1) per day. A day is
+flagged when it is more than THRESHOLD deviations away from the
+statistics of the days before it.
+
+The detector state is stored in `data/anomalies.json`, together with
+the daily values it has seen. When the data changes, a series resumes
+from its stored state if only days after its last processed day
+changed. It is replayed from the start if an earlier day changed. The
+covered date range is stored as well, so charts take their range from
+the data.
+"""
+
+import json
+import math
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir
+
+ANOMALIES_FILE = 'anomalies.json'
+
+METRICS = ('videos', 'comments', 'sentiment')
+COUNT_METRICS = ('videos', 'comments')
+
+ALPHA = 0.1                 # EWMA weight of the newest day (~ 2 / (span + 1), span of 19 days)
+THRESHOLD = 3.0             # deviations from the expected value that make a spike
+WARMUP_DAYS = 14            # days observed before a series can flag anything
+MIN_SENTIMENT_COMMENTS = 5  # days with fewer scored comments have no sentiment value
+SENTIMENT_MIN_STD = 0.05    # floor of the sentiment deviation (scores are in [-1, 1])
+
+ANOMALY_COLUMNS = ['date', 'query', 'metric', 'value', 'expected', 'zscore']
+
+
+class EWMStats:
+    """Exponentially weighted mean and variance, updated in O(1) per value."""
+
+    def __init__(self, alpha=ALPHA, mean=0.0, var=0.0, count=0):
+        self.alpha = alpha
+        self.mean = mean
+        self.var = var
+        self.count = count
+
+    def zscore(self, value, min_std=0.0):
+        """Deviations of `value` from the current statistics."""
+        std = max(math.sqrt(self.var), min_std)
+        return (value - self.mean) / std if std else 0.0
+
+    def update(self, value):
+        if not self.count:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+
+    def to_json(self):
+        return {'mean': self.mean, 'var': self.var, 'count': self.count}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(mean=data['mean'], var=data['var'], count=data['count'])
+
+
+def daily_values(daily):
+    """Per (query, metric) series of {date: value} from a daily activity table.
+
+    `daily` has date, query, videos, comments, sentiment_sum and
+    sentiment_comments columns (see `AnalysisEngine.daily_activity`).
+    """
+    series = {}
+    daily = daily.dropna(subset=['date', 'query'])
+    for row in daily.itertuples(index=False):
+        date, query = str(row.date)[:10], row.query
+        for metric in COUNT_METRICS:
+            if getattr(row, metric):
+                series.setdefault((query, metric), {})[date] = int(getattr(row, metric))
+        if row.sentiment_comments >= MIN_SENTIMENT_COMMENTS:
+            series.setdefault((query, 'sentiment'), {})[date] = \
+                float(row.sentiment_sum) / int(row.sentiment_comments)
+    return series
+
+
+def days_between(first, last):
+    return [d.strftime('%Y-%m-%d') for d in pd.date_range(first, last, freq='D')]
+
+
+class AnomalyDetector:
+    """EWMA spike detector over the daily series of every query."""
+
+    def __init__(self, data_dir=None):
+        self.path = os.path.join(data_dir or get_data_dir(), ANOMALIES_FILE)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        self.version = stored.get('version')
+        self.first_day = stored.get('first_day')
+        self.last_day = stored.get('last_day')
+        # "query\tmetric" -> {values, stats, last, anomalies}
+        self.series = stored.get('series', {})
+
+    def _replay(self, key, metric, values, start, end):
+        """Feed the days from `start` to `end` (inclusive) to one series."""
+        entry = self.series[key]
+        stats = EWMStats.from_json(entry['stats'])
+        # Count series have a value (zero if absent) every day; sentiment only on scored days
+        days = days_between(start, end) if metric in COUNT_METRICS else \
+            sorted(d for d in values if start <= d <= end)
+        for day in days:
+            value = values.get(day, 0)
+            expected = stats.mean
+            if metric in COUNT_METRICS:
+                # Poisson-like floor: rare events (mean well below 1) are not all spikes
+                z = stats.zscore(value, min_std=math.sqrt(max(stats.mean, 1.0)))
+                spike = z > THRESHOLD
+            else:
+                z = stats.zscore(value, min_std=SENTIMENT_MIN_STD)
+                spike = abs(z) > THRESHOLD
+            if spike and stats.count >= WARMUP_DAYS:
+                entry['anomalies'].append([day, value, expected, z])
+            stats.update(value)
+        entry['stats'] = stats.to_json()
+        entry['last'] = end
+
+    def sync(self, daily, version=None):
+        """Bring every series up to date with a daily activity table.
+
+        Returns the number of series resumed and replayed from the start.
+        """
+        series = daily_values(daily)
+        days = sorted(day for values in series.values() for day in values)
+        self.first_day, self.last_day = (days[0], days[-1]) if days else (None, None)
+
+        resumed = replayed = 0
+        for key in set(self.series) - {f'{q}\t{m}' for q, m in series}:
+            del self.series[key]
+        for (query, metric), values in series.items():
+            key = f'{query}\t{metric}'
+            entry = self.series.get(key)
+            if entry:
+                # Resume only if nothing up to the last processed day changed
+                seen = {d: v for d, v in values.items() if d <= entry['last']}
+                if seen == entry['values'] and entry['last'] <= self.last_day:
+                    entry['values'] = values
+                    if entry['last'] < self.last_day:
+                        start = (pd.Timestamp(entry['last']) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+                        self._replay(key, metric, values, start, self.last_day)
+                        resumed += 1
+                    continue
+            self.series[key] = {'values': values, 'stats': EWMStats().to_json(), 'last': None,
+                                'anomalies': []}
+            self._replay(key, metric, values, min(values), self.last_day)
+            replayed += 1
+
+        self.version = version
+        return resumed, replayed
+
+    def save(self):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version,
+                'first_day': self.first_day,
+                'last_day': self.last_day,
+                'series': self.series,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def anomalies(self, query=None, metric=None, start=None, end=None):
+        """Flagged days, most recent first, optionally filtered by query, metric and date range."""
+        rows = []
+        for key, entry in self.series.items():
+            series_query, series_metric = key.split('\t')
+            if (query and series_query != query) or (metric and series_metric != metric):
+                continue
+            for day, value, expected, z in entry['anomalies']:
+                if (start and day < start) or (end and day > end):
+                    continue
+                rows.append((day, series_query, series_metric, value, expected, z))
+        table = pd.DataFrame(rows, columns=ANOMALY_COLUMNS)
+        return table.sort_values(['date', 'query', 'metric'], ascending=[False, True, True]) \
+                    .reset_index(drop=True)
+
+    def queries(self):
+        return sorted({key.split('\t')[0] for key in self.series})
+
+
+def load_anomalies(data_dir=None):
+    """Stored detector (for readers such as the GUI, without recomputing)."""
+    return AnomalyDetector(data_dir)
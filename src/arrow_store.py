@@ -0,0 +1,137 @@
+"""Arrow IPC cache of the collected data, shared by the pipeline stages.
+
+The JSON exports are converted once per data version to one Arrow IPC
+file per table (`data/arrow_cache/videos.arrow`, `comments.arrow`). The
+analyzer, the visualizer and the GUI then memory-map these files instead
+of reparsing the JSON: reads are zero-copy and only the columns a stage
+selects are ever paged in. Each file records the size and mtime of its
+source in the schema metadata and is rebuilt when the source changes.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir, iter_row_batches
+
+# pyarrow is optional: without it every stage reads the JSON directly
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+CACHE_DIR = 'arrow_cache'
+
+SOURCES = {
+    'videos': 'youtube_videos.json',
+    'comments': 'youtube_comments.json',
+}
+
+# Row kind of each table (nested comments of the videos file are skipped)
+ROW_KINDS = {'videos': 'video', 'comments': 'comment'}
+
+NUMERIC_COLUMNS = ('viewCount', 'likeCount', 'commentCount', 'commentsCount', 'totalReplyCount')
+
+VERSION_KEY = b'source_version'
+
+
+def source_version(path):
+    """Version stamp of a source file (size and modification time)."""
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def read_source(path, name):
+    """Stream a JSON/NDJSON export into a flat DataFrame with numeric counts."""
+    kind = ROW_KINDS[name]
+    frames = [pd.DataFrame(rows) for _, rows in iter_row_batches(path, kinds=(kind,))]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    return df
+
+
+class ArrowStore:
+    """Memory-mapped Arrow tables of the collected videos and comments."""
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or get_data_dir()
+        self.cache_dir = os.path.join(self.data_dir, CACHE_DIR)
+
+    def _source(self, name):
+        return os.path.join(self.data_dir, SOURCES[name])
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, f'{name}.arrow')
+
+    def _open(self, name):
+        """Memory-map a cached table (zero-copy; columns load on access)."""
+        with pa.memory_map(self._path(name), 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def is_current(self, name):
+        """Check whether the cached table matches its source file."""
+        try:
+            with pa.memory_map(self._path(name), 'r') as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            return False
+        return metadata.get(VERSION_KEY, b'').decode() == source_version(self._source(name))
+
+    def build(self, name):
+        """Convert a JSON source to its Arrow IPC file."""
+        source = self._source(name)
+        version = source_version(source)
+        table = pa.Table.from_pandas(read_source(source, name), preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[VERSION_KEY] = version.encode()
+        table = table.replace_schema_metadata(metadata)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def ensure(self):
+        """Rebuild every stale table; returns the names that were rebuilt."""
+        rebuilt = []
+        for name in SOURCES:
+            if os.path.exists(self._source(name)) and not self.is_current(name):
+                self.build(name)
+                rebuilt.append(name)
+        return rebuilt
+
+    def table(self, name, columns=None):
+        """Arrow table of `videos` or `comments`, restricted to `columns`."""
+        if not self.is_current(name):
+            self.build(name)
+        table = self._open(name)
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        return table
+
+
+def load_frame(name, columns=None, data_dir=None):
+    """DataFrame of `videos` or `comments`, from the Arrow cache when available."""
+    data_dir = data_dir or get_data_dir()
+    if PYARROW_AVAILABLE:
+        df = ArrowStore(data_dir).table(name, columns).to_pandas()
+    else:
+        df = read_source(os.path.join(data_dir, SOURCES[name]), name)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+
+    # Arrow turns nullable integers with gaps into floats
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('Int64')
+    return df
@@ -0,0 +1,254 @@
+"""Headless pipeline runner driven by configuration files.
+
+Each configuration (a JSON object; a file may hold one or a list) names
+its queries, date windows, videos per query, stages and output location:
+
+    {
+        "name": "gaza-2024",
+        "queries": ["Gaza war", "Palestine news"],
+        "windows": [{"start_date": "2024-01-01", "end_date": "2024-06-30"},
+                    {"start_date": "2024-07-01", "end_date": "2024-12-31"}],
+        "videos_per_query": 50,
+        "targets": {"Gaza war": 100},
+        "max_comments": 30,
+        "concurrency": 2,
+        "stages": ["collect", "analyze", "visualize"],
+        "output_dir": "runs/gaza-2024"
+    }
+
+`start_date` / `end_date` can replace `windows`. A configuration gets
+`data/`, `outputs/` and `logs/` under its output directory; `data_dir`
+points the analysis at existing data instead. `offline`,
+`reply_threshold` and `analyzer_args` (extra analyzer options) are
+optional.
+
+Configurations run in parallel processes, and each stage sees only its
+own directories (through YOUTUBE_DATA_DIR / YOUTUBE_OUTPUTS_DIR). Charts
+are drawn with the Agg backend, so no display is needed. Collection
+stages share the project's quota ledger and response cache, since the
+quota belongs to the API key. They therefore take turns, and each one
+runs its query jobs on `concurrency` threads. Every configuration
+writes `run_summary.json` to its output directory, and the runner prints
+one JSON summary per configuration.
+
+    python src/batch_runner.py configs/*.json --parallel 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from multiprocessing import Manager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import DATA_DIR_ENV, OUTPUTS_DIR_ENV, get_project_root
+
+STAGES = ('collect', 'analyze', 'visualize')
+STAGE_SCRIPTS = {
+    'analyze': 'data_analyzer.py',
+    'visualize': 'data_visualizer.py',
+}
+SUMMARY_FILE = 'run_summary.json'
+RUNS_DIR = 'runs'
+
+DEFAULTS = {
+    'videos_per_query': 100,
+    'max_comments': 30,
+    'concurrency': 1,
+    'stages': list(STAGES),
+    'offline': False,
+    'reply_threshold': None,
+    'analyzer_args': [],
+}
+
+
+def load_configs(paths, stages=None):
+    """Configurations of the given files, with defaults and a unique name each.
+
+    `stages` replaces the stages of every configuration.
+    """
+    configs = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        for i, config in enumerate(content if isinstance(content, list) else [content]):
+            config = dict(DEFAULTS, **config)
+            config.setdefault('name', Path(path).stem + (f'-{i + 1}' if isinstance(content, list) else ''))
+            if stages:
+                config['stages'] = list(stages)
+            if 'windows' not in config:
+                config['windows'] = [{'start_date': config['start_date'], 'end_date': config['end_date']}]
+            unknown = set(config['stages']) - set(STAGES)
+            if unknown:
+                raise ValueError(f"{config['name']}: unknown stages {sorted(unknown)}")
+            configs.append(config)
+
+    names = [config['name'] for config in configs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Configuration names must be unique: {duplicates}")
+    return configs
+
+
+def run_directories(config):
+    """Output, data, outputs and logs directories of a configuration."""
+    root = get_project_root()
+    output_dir = root / (config.get('output_dir') or os.path.join(RUNS_DIR, config['name']))
+    dirs = {
+        'output': output_dir,
+        'data': root / config['data_dir'] if config.get('data_dir') else output_dir / 'data',
+        'outputs': output_dir / 'outputs',
+        'logs': output_dir / 'logs',
+    }
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    return {name: str(path) for name, path in dirs.items()}
+
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+def collect(config, data_dir):
+    """Collect the configuration's query jobs into `data_dir`; returns collection counts."""
+    from data_collector import YouTubeCollector, build_query_jobs, run_query_jobs
+    from http_cache import ResponseCache
+    from quota import LEDGER_FILE, QuotaLedger, QuotaScheduler
+
+    try:
+        import config as api_config
+        api_key = api_config.API_KEY
+    except ImportError:
+        if not config['offline']:
+            raise RuntimeError("config.py missing. Create it with your API_KEY.")
+        api_key = None
+
+    # Quota and cached responses belong to the API key, not to the configuration
+    shared_dir = get_project_root() / 'data'
+    ledger = QuotaLedger(str(shared_dir / LEDGER_FILE))
+    cache = ResponseCache(str(shared_dir / 'http_cache'))
+    scheduler = QuotaScheduler(ledger, scope=config['name'])
+    collector = YouTubeCollector(api_key, ledger=ledger, cache=cache, offline=config['offline'])
+
+    jobs = []
+    for window in config['windows']:
+        window_jobs = build_query_jobs(dict(config, **window), max_comments=config['max_comments'])
+        if len(config['windows']) > 1:
+            for job in window_jobs:
+                job['name'] += f"@{window['start_date']}..{window['end_date']}"
+        jobs.extend(window_jobs)
+
+    print(f"Collecting {len(jobs)} jobs ({ledger.remaining()} quota units left today)")
+    videos, deferred = run_query_jobs(collector, scheduler, jobs, max_workers=config['concurrency'])
+
+    # Overlapping windows can return a video twice for the same query
+    seen = set()
+    videos = [v for v in videos if not ((v['videoId'], v['query']) in seen or seen.add((v['videoId'], v['query'])))]
+    if not videos:
+        raise RuntimeError(f"No videos collected ({len(deferred)} jobs deferred)")
+    # Deferred jobs resume on later days: add to the configuration's data, do not replace it
+    collector.save_to_files(videos, output_dir=data_dir, merge=True)
+
+    usage = ledger.run_summary(collector.run_id)
+    return {
+        'videos': len(videos),
+        'comments': sum(len(v.get('comments', [])) for v in videos),
+        'quota_units': usage['total'],
+        'deferred_jobs': [job['name'] for job in deferred],
+    }
+
+
+def run_script(stage, config, log_path, env):
+    """Run the analyzer or visualizer on the configuration's directories."""
+    script = os.path.join(str(get_project_root()), 'src', STAGE_SCRIPTS[stage])
+    # No one waits for a headless run's gallery: render the 300-dpi charts before returning
+    args = config['analyzer_args'] if stage == 'analyze' else ['--hires', 'now']
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, script] + list(args), cwd=str(get_project_root()),
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode:
+        raise RuntimeError(f"{STAGE_SCRIPTS[stage]} exited with status {result.returncode}")
+
+
+def run_config(config, collect_lock):
+    """Run the stages of one configuration; returns its run summary."""
+    dirs = run_directories(config)
+    env = dict(os.environ, **{DATA_DIR_ENV: dirs['data'], OUTPUTS_DIR_ENV: dirs['outputs'],
+                              'MPLBACKEND': 'Agg'})
+    os.environ.update(env)
+
+    summary = {
+        'name': config['name'],
+        'status': 'ok',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'data_dir': dirs['data'],
+        'outputs_dir': dirs['outputs'],
+        'stages': [],
+    }
+    for stage in [s for s in STAGES if s in config['stages']]:
+        log_path = os.path.join(dirs['logs'], f'{stage}.log')
+        record = {'stage': stage, 'status': 'ok', 'log': log_path}
+        start = time.perf_counter()
+        try:
+            if stage == 'collect':
+                with collect_lock, open(log_path, 'w', encoding='utf-8') as log, redirect_stdout(log):
+                    record['result'] = collect(config, dirs['data'])
+            else:
+                run_script(stage, config, log_path, env)
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = f"{type(e).__name__}: {e}"
+        record['seconds'] = round(time.perf_counter() - start, 2)
+        summary['stages'].append(record)
+        if record['status'] != 'ok':
+            summary['status'] = 'failed'
+            break
+
+    summary['outputs'] = sorted(os.listdir(dirs['outputs']))
+    summary['finished_at'] = datetime.now(timezone.utc).isoformat()
+    path = os.path.join(dirs['output'], SUMMARY_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return summary
+
+
+def run_batch(configs, parallel=1):
+    """Run configurations in parallel processes; summaries come back in configuration order."""
+    with Manager() as manager:
+        collect_lock = manager.Lock()
+        with ProcessPoolExecutor(max_workers=max(parallel, 1)) as pool:
+            futures = [pool.submit(run_config, config, collect_lock) for config in configs]
+            return [future.result() for future in futures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline headless from configuration files")
+    parser.add_argument('configs', nargs='+', help="JSON configuration files")
+    parser.add_argument('--parallel', type=int, default=1, metavar='N',
+                        help="configurations run at the same time")
+    parser.add_argument('--stages', help="comma-separated stages overriding every configuration's")
+    parser.add_argument('--summary', metavar='PATH', help="also write all run summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()] if args.stages else None
+    configs = load_configs(args.configs, stages)
+
+    summaries = run_batch(configs, parallel=args.parallel)
+    for summary in summaries:
+        print(json.dumps(summary, ensure_ascii=False))
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+    return 0 if all(summary['status'] == 'ok' for summary in summaries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Progressive chart output: screen resolution first, print quality in the background.
+
+The visualizer saves every chart at SCREEN_DPI into `outputs/`, which is
+all the gallery needs for display, and pickles the figure into
+`outputs/hires/.pending/`. A detached process started at the end of the
+run (`python src/chart_output.py <outputs_dir>`) renders the pending
+figures at PRINT_DPI into `outputs/hires/`. The visualizer therefore
+returns as soon as the screen versions exist. The gallery opens the
+high-resolution copy only to zoom or export, and renders it on the spot
+(in a subprocess, so no figure is unpickled under the GUI's backend) if
+the background process has not reached it yet.
+"""
+
+import os
+import pickle
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_outputs_dir
+
+SCREEN_DPI = 100
+PRINT_DPI = 300
+HIRES_DIR = 'hires'
+PENDING_DIR = '.pending'
+
+
+def hires_dirs(outputs_dir=None):
+    hires = os.path.join(outputs_dir or get_outputs_dir(), HIRES_DIR)
+    return hires, os.path.join(hires, PENDING_DIR)
+
+
+def save_chart(name, outputs_dir=None, fig=None):
+    """Save the current (or given) figure at screen resolution and queue its print version."""
+    import matplotlib.pyplot as plt
+
+    outputs_dir = outputs_dir or get_outputs_dir()
+    fig = fig or plt.gcf()
+    hires, pending = hires_dirs(outputs_dir)
+    os.makedirs(pending, exist_ok=True)
+
+    fig.savefig(os.path.join(outputs_dir, name), dpi=SCREEN_DPI, bbox_inches='tight')
+
+    # A print copy of an earlier run no longer matches the screen version
+    try:
+        os.remove(os.path.join(hires, name))
+    except FileNotFoundError:
+        pass
+    path = os.path.join(pending, f'{name}.pickle')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(fig, f)
+    os.replace(tmp_path, path)
+
+
+def render_chart(pickle_path, hires):
+    """Render one pending figure at print resolution; returns the image path (None if taken)."""
+    import matplotlib.pyplot as plt
+
+    name = os.path.basename(pickle_path)[:-len('.pickle')]
+    try:
+        with open(pickle_path, 'rb') as f:
+            fig = pickle.load(f)
+    except FileNotFoundError:
+        return None  # rendered meanwhile by another process
+    path = os.path.join(hires, name)
+    tmp_path = os.path.join(hires, f'.{name}.{os.getpid()}.tmp.png')
+    fig.savefig(tmp_path, dpi=PRINT_DPI, bbox_inches='tight')
+    plt.close(fig)
+    os.replace(tmp_path, path)
+    try:
+        os.remove(pickle_path)
+    except FileNotFoundError:
+        pass
+    return path
+
+
+def render_pending(outputs_dir=None, names=None, workers=None):
+    """Render the pending figures (all, or the given chart names), several at a time."""
+    hires, pending = hires_dirs(outputs_dir)
+    if not os.path.isdir(pending):
+        return []
+    paths = sorted(os.path.join(pending, name) for name in os.listdir(pending)
+                   if name.endswith('.pickle') and (not names or name[:-len('.pickle')] in names))
+    if len(paths) <= 1 or workers == 1:
+        return [p for p in (render_chart(path, hires) for path in paths) if p]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [p for p in pool.map(render_chart, paths, [hires] * len(paths)) if p]
+
+
+def renderer_command(outputs_dir, names=()):
+    return [sys.executable, os.path.abspath(__file__), outputs_dir] + list(names)
+
+
+def renderer_env():
+    return dict(os.environ, MPLBACKEND='Agg')
+
+
+def start_background_render(outputs_dir=None):
+    """Render the pending figures in a detached process that outlives the caller."""
+    return subprocess.Popen(renderer_command(outputs_dir or get_outputs_dir()), env=renderer_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def hires_copy(image_path, render=True):
+    """Print-resolution copy of a chart, rendered now if still pending.
+
+    Falls back to the screen version for images without a queued copy.
+    """
+    outputs_dir, name = os.path.split(image_path)
+    hires, pending = hires_dirs(outputs_dir)
+    path = os.path.join(hires, name)
+    if os.path.exists(path):
+        return path
+    if render and os.path.exists(os.path.join(pending, f'{name}.pickle')):
+        subprocess.run(renderer_command(outputs_dir, [name]), env=renderer_env())
+        if os.path.exists(path):
+            return path
+    return image_path
+
+
+if __name__ == "__main__":
+    render_pending(sys.argv[1] if len(sys.argv) > 1 else None, names=sys.argv[2:])
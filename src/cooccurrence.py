@@ -0,0 +1,119 @@
+"""Keyword co-occurrence counts and PMI from the sparse document-term matrix.
+
+Documents (titles and comments) are reduced to a binary incidence matrix
+B over the weighted terms of `text_features`. B^T B then holds, for every
+pair of keywords, the number of documents containing both, in a single
+sparse product rather than a loop over the pairs of each title. Pointwise
+mutual information, log(P(a, b) / (P(a) P(b))), ranks pairs by how much
+more often they meet than chance, and a top-k cutoff per keyword keeps
+the graph readable.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir
+
+MIN_PAIR_COUNT = 3      # pairs seen in fewer documents are noise (and have inflated PMI)
+TOP_K = 5               # strongest pairs kept per keyword
+PAIR_GROUPS = ('query', 'month')
+
+PAIR_COLUMNS = ['source', 'target', 'count', 'pmi']
+
+
+def top_k_per_node(pairs, k=TOP_K):
+    """Pairs among the k strongest (PMI, then count) of either of their keywords."""
+    ends = pd.concat([
+        pairs[['source', 'pmi', 'count']].rename(columns={'source': 'node'}),
+        pairs[['target', 'pmi', 'count']].rename(columns={'target': 'node'}),
+    ]).reset_index()
+    ends = ends.sort_values(['node', 'pmi', 'count', 'index'], ascending=[True, False, False, True])
+    kept = ends[ends.groupby('node').cumcount() < k]['index'].unique()
+    return pairs.loc[sorted(kept)]
+
+
+def cooccurrence(matrix, rows=None, min_count=MIN_PAIR_COUNT, top_k=TOP_K):
+    """Positively associated keyword pairs (count, PMI) of the documents of `matrix`.
+
+    `rows` optionally selects documents (boolean mask); pairs come most
+    frequent first.
+    """
+    kept, _ = matrix.kept_terms()
+    counts = matrix.counts[rows] if rows is not None else matrix.counts
+    incidence = (counts[:, kept] > 0).astype(np.int32)
+    n_docs = incidence.shape[0]
+    df = np.asarray(incidence.sum(axis=0)).ravel()
+
+    # Documents per keyword pair: upper triangle of B^T B (diagonal = document frequency)
+    pair_counts = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+    frequent = pair_counts.data >= min_count
+    i, j, count = pair_counts.row[frequent], pair_counts.col[frequent], pair_counts.data[frequent]
+
+    terms = np.array(matrix.terms, dtype=object)[kept]
+    pairs = pd.DataFrame({
+        'source': terms[i],
+        'target': terms[j],
+        'count': count.astype('int64'),
+        'pmi': np.log(count * n_docs / (df[i].astype(np.float64) * df[j])),
+    }, columns=PAIR_COLUMNS)
+    if top_k:
+        pairs = top_k_per_node(pairs, top_k)
+    # Strongest first: PMI alone favors pairs seen only a few times, together
+    pairs = pairs[pairs['pmi'] > 0]
+    return pairs.sort_values(['count', 'pmi', 'source', 'target'], ascending=[False, False, True, True]) \
+                .reset_index(drop=True)
+
+
+def cooccurrence_by(matrix, group, **kwargs):
+    """Keyword pairs within each query or month."""
+    frames = [pd.DataFrame(columns=[group] + PAIR_COLUMNS)]
+    for key in sorted(matrix.docs[group].dropna().unique()):
+        pairs = cooccurrence(matrix, (matrix.docs[group] == key).to_numpy(), **kwargs)
+        frames.append(pairs.assign(**{group: key})[[group] + PAIR_COLUMNS])
+    return pd.concat(frames, ignore_index=True)
+
+
+def keyword_pairs(data_dir=None, **kwargs):
+    """Overall and per-group keyword pairs of the current data."""
+    from text_features import load_matrix
+
+    matrix = load_matrix(data_dir or get_data_dir())
+    return {
+        'all': cooccurrence(matrix, **kwargs),
+        'by': {group: cooccurrence_by(matrix, group, **kwargs) for group in PAIR_GROUPS},
+    }
+
+
+def spring_layout(pairs, iterations=300, seed=0, gravity=2.0):
+    """Force-directed positions of the keywords of `pairs` (Fruchterman-Reingold), in [-1, 1]."""
+    nodes = list(dict.fromkeys(list(pairs['source']) + list(pairs['target'])))
+    index = {node: i for i, node in enumerate(nodes)}
+    ends = np.array([[index[a], index[b]] for a, b in zip(pairs['source'], pairs['target'])]).reshape(-1, 2)
+    weights = np.asarray(pairs['count'], dtype=np.float64)
+    weights = weights / weights.max() if len(weights) else weights
+
+    rng = np.random.RandomState(seed)
+    pos = rng.rand(len(nodes), 2) * 2 - 1
+    k = 1.5 / np.sqrt(max(len(nodes), 1))
+    temperature = 0.1
+    for _ in range(iterations):
+        delta = pos[:, None, :] - pos[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=-1), 1e-3)
+        force = (delta / distance[..., None] * (k * k / distance)[..., None]).sum(axis=1)  # repulsion
+        pull = pos[ends[:, 0]] - pos[ends[:, 1]]
+        length = np.maximum(np.linalg.norm(pull, axis=1), 1e-3)
+        attraction = pull * (length / k * (1 + weights))[:, None]
+        np.add.at(force, ends[:, 0], -attraction)
+        np.add.at(force, ends[:, 1], attraction)
+        force -= gravity * pos                  # keeps separate components near each other
+        step = np.linalg.norm(force, axis=1, keepdims=True)
+        pos += force / np.maximum(step, 1e-9) * np.minimum(step, temperature)
+        temperature *= 0.99
+    pos -= pos.mean(axis=0)
+    pos /= np.abs(pos).max() or 1
+    return {node: tuple(p) for node, p in zip(nodes, pos)}
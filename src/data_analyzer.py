@@ -1,49 +1,138 @@
-"""PySpark-based YouTube data analyzer for big data processing."""
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import (
-    col, count, sum as spark_sum, mean, to_date,
-    explode, udf
-)
-from pyspark.sql.types import StringType, ArrayType
+"""YouTube data analyzer on a pluggable engine (pandas or PySpark).
+
+The engine is chosen from the input size (see analysis_engines.py);
+set ANALYSIS_ENGINE=pandas or ANALYSIS_ENGINE=spark to force one.
+"""
+
+import argparse
 import os
 import sys
+import time
 from pathlib import Path
 
+import pandas as pd
+
 # Add src directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 from utils import get_data_dir, get_outputs_dir
-import re
+from analysis_engines import EXPORT_FORMATS, select_engine
+from cooccurrence import keyword_pairs
+from interaction_graph import analyze as analyze_network, save_results as save_network
+from sampling import DEFAULT_FRACTION
+
+parser = argparse.ArgumentParser(description="Analyze collected YouTube data")
+parser.add_argument('--formats', default=','.join(EXPORT_FORMATS),
+                    help="Comma-separated export formats (csv, parquet)")
+parser.add_argument('--merge', action='store_true',
+                    help="Also merge summary tables into one file each (Spark writes part files)")
+parser.add_argument('--without-duplicates', action='store_true',
+                    help="Drop near-duplicate copies and suspicious authors' comments before analyzing")
+parser.add_argument('--preview', action='store_true',
+                    help="Quick estimates with 95%% confidence intervals from a stratified "
+                         "(query x month) sample; nothing is exported")
+parser.add_argument('--fraction', type=float, default=DEFAULT_FRACTION,
+                    help="Share of the videos of each stratum sampled by --preview")
+args = parser.parse_args()
 
-# Initialize Spark
-spark = SparkSession.builder \
-    .appName("YouTubeGazaAnalysis") \
-    .config("spark.driver.memory", "2g") \
-    .getOrCreate()
-spark.sparkContext.setLogLevel("WARN")
 
-print("=== ANALYSE DES VIDÉOS YOUTUBE SUR GAZA (PySpark) ===\n")
+# =============================================================================
+# PREVIEW (STRATIFIED SAMPLE)
+# =============================================================================
+
+if args.preview:
+    import numpy as np
+    from arrow_store import load_frame
+    from analysis_engines import keywords_from_tokens
+    from sampling import StratifiedSample
+    from sentiment import label_series, score_series
+    from utils import title_token_column
+
+    start = time.perf_counter()
+    try:
+        videos = load_frame('videos', ['videoId', 'title', 'channelTitle', 'query', 'publishedAt',
+                                       'viewCount', 'likeCount', 'commentCount'], get_data_dir())
+    except Exception as e:
+        print(f"ERROR: {e}")
+        print("Run data_collector.py first!")
+        sys.exit(1)
+    sample = StratifiedSample(videos, args.fraction)
+    comments = sample.comments_of(load_frame('comments', ['videoId', 'author', 'text'], get_data_dir()))
+    ones = np.ones(len(comments))
+    comment_counts = sample.per_row(ones, comments)
+
+    print(f"=== APERÇU DES VIDÉOS YOUTUBE SUR GAZA (échantillon {args.fraction:.0%}) ===\n")
+    print(f"Échantillon: {len(sample.videos)} vidéos sur {sample.population_size} "
+          f"({len(sample.population)} strates requête × mois), {comments['comment'].nunique()} commentaires")
+    print("Estimations avec intervalle de confiance à 95% [bas ; haut]\n")
+
+    print("1. STATISTIQUES GÉNÉRALES")
+    print(f"   - Vidéos: {sample.population_size} (exact)")
+    print(f"   - Commentaires: {sample.total(comment_counts).format()}")
+    for column, label in (('viewCount', 'Vues moyennes'), ('likeCount', 'Likes moyens'),
+                          ('commentCount', 'Commentaires moyens')):
+        print(f"   - {label}: {sample.mean(sample.videos[column].fillna(0)).format()}")
+
+    print("\n2. TOP 10 DES CHAÎNES (vidéos estimées)")
+    channels = {channel: sample.total(sample.videos['channelTitle'] == channel)
+                for channel in sample.videos['channelTitle'].dropna().unique()}
+    for channel, estimate in sorted(channels.items(), key=lambda item: (-item[1].value, item[0]))[:10]:
+        print(f"   {channel}: {estimate.format()}")
+
+    print("\n3. ÉVOLUTION TEMPORELLE (vidéos par mois, exact)")
+    for month, count in sample.exact_counts('month').sort_index(ascending=False).head(10).items():
+        print(f"  {month}: {count} vidéos")
+
+    print("\n4. MOTS-CLÉS DANS LES TITRES (titres contenant le mot, estimés)")
+    keywords = [set(keywords_from_tokens(tokens)) for tokens in title_token_column(sample.videos['title'])]
+    candidates = pd.Series([k for ks in keywords for k in ks], dtype=object).value_counts().head(15).index
+    for keyword in candidates:
+        print(f"   {keyword}: {sample.total([keyword in ks for ks in keywords]).format()}")
+
+    print("\n7. ANALYSE PAR MOT-CLÉ DE RECHERCHE")
+    for query, count in sample.exact_counts('query').items():
+        in_query = (sample.videos['query'] == query).to_numpy()
+        views = sample.videos['viewCount'].fillna(0).to_numpy(dtype=np.float64)
+        likes = sample.videos['likeCount'].fillna(0).to_numpy(dtype=np.float64)
+        print(f"   {query}: {count} vidéos (exact), vues moyennes "
+              f"{sample.ratio(views * in_query, in_query).format()}, likes moyens "
+              f"{sample.ratio(likes * in_query, in_query).format()}")
+
+    print("\n8. ANALYSE DE SENTIMENT DES COMMENTAIRES")
+    scores = score_series(comments['text'])
+    labels = label_series(scores)
+    print(f"   - Score moyen: {sample.ratio(sample.per_row(scores, comments), comment_counts).format('+.3f')}")
+    for label in ('positive', 'neutral', 'negative'):
+        share = sample.ratio(sample.per_row(labels == label, comments), comment_counts)
+        print(f"     {label}: {share.format('.1%')}")
+    print("   - Auteurs les plus actifs (commentaires estimés):")
+    for author in comments['author'].value_counts().head(5).index:
+        estimate = sample.total(sample.per_row(comments['author'] == author, comments))
+        print(f"     {author}: {estimate.format()}")
+
+    print(f"\n✓ Aperçu terminé en {time.perf_counter() - start:.2f}s (relancer sans --preview pour l'analyse complète)")
+    sys.exit(0)
 
 # =============================================================================
 # DATA LOADING
 # =============================================================================
 
 try:
-    import pandas as pd_loader
-    data_dir = get_data_dir()
-    pd_videos = pd_loader.read_json(f'{data_dir}/youtube_videos.json')
-    pd_comments = pd_loader.read_json(f'{data_dir}/youtube_comments.json')
-    
-    df_videos = spark.createDataFrame(pd_videos)
-    df_comments = spark.createDataFrame(pd_comments)
-    
-    print("✓ Data loaded successfully\n")
-    
+    engine = select_engine(get_data_dir())
 except Exception as e:
     print(f"ERROR: {e}")
     print("Run data_collector.py first!")
-    spark.stop()
-    exit()
+    sys.exit(1)
+
+print(f"=== ANALYSE DES VIDÉOS YOUTUBE SUR GAZA ({engine.label}) ===\n")
+print("✓ Data loaded successfully")
+
+# Near-duplicate comments (MinHash LSH), reported in section 6
+duplicates = engine.duplicates()
+if args.without_duplicates:
+    engine.exclude_duplicates(duplicates)
+    print(f"✓ Quasi-doublons exclus: {duplicates.duplicate_count} copies, "
+          f"{len(duplicates.suspicious_authors)} auteurs suspects")
+print()
 
 
 # =============================================================================
@@ -52,47 +141,23 @@ except Exception as e:
 
 print("1. STATISTIQUES GÉNÉRALES")
 
-video_count = df_videos.count()
-comment_count = df_comments.count()
+stats = engine.general_stats()
+video_count = stats['video_count']
+comment_count = stats['comment_count']
 print(f"   - Vidéos: {video_count}")
 print(f"   - Commentaires: {comment_count}")
-
-# Calculate means
-df_videos = df_videos.withColumn("viewCount", col("viewCount").cast("long")) \
-                     .withColumn("likeCount", col("likeCount").cast("long")) \
-                     .withColumn("commentCount", col("commentCount").cast("long"))
-
-stats = df_videos.select(
-    mean("viewCount").alias("avg_views"),
-    mean("likeCount").alias("avg_likes"),
-    mean("commentCount").alias("avg_comments")
-).first()
-
 print(f"   - Vues moyennes: {stats['avg_views']:.0f}")
 print(f"   - Likes moyens: {stats['avg_likes']:.0f}")
 print(f"   - Commentaires moyens: {stats['avg_comments']:.0f}")
 
 
 # =============================================================================
-# 2. TOP CHANNELS (Spark SQL)
+# 2. TOP CHANNELS
 # =============================================================================
 
 print("\n2. TOP 10 DES CHAÎNES")
 
-df_videos.createOrReplaceTempView("videos")
-
-top_channels = spark.sql("""
-    SELECT channelTitle,
-           COUNT(*) as nb_videos,
-           SUM(viewCount) as total_views,
-           SUM(likeCount) as total_likes
-    FROM videos
-    GROUP BY channelTitle
-    ORDER BY nb_videos DESC
-    LIMIT 10
-""")
-
-print(top_channels.toPandas().to_string(index=False))
+print(engine.top_channels(10).to_string(index=False))
 
 
 # =============================================================================
@@ -101,82 +166,30 @@ print(top_channels.toPandas().to_string(index=False))
 
 print("\n3. ÉVOLUTION TEMPORELLE")
 
-timeline = df_videos.withColumn("published_date", to_date(col("publishedAt"))) \
-                    .groupBy("published_date") \
-                    .agg(count("*").alias("video_count")) \
-                    .orderBy(col("published_date").desc()) \
-                    .limit(10)
-
 print("Dernières 10 dates:")
-for row in timeline.collect():
-    print(f"  {row['published_date']}: {row['video_count']} vidéos")
+for row in engine.timeline(10).itertuples(index=False):
+    print(f"  {row.published_date}: {row.video_count} vidéos")
+
+# Spike days of the daily videos / comments / sentiment series (EWMA z-scores)
+detector = engine.anomalies()
+spikes = detector.anomalies()
+print(f"Pics détectés ({detector.first_day} → {detector.last_day}): {len(spikes)} jours")
+for metric, count in spikes['metric'].value_counts().sort_index().items():
+    print(f"   - {metric}: {count}")
+print("Derniers pics:")
+for row in spikes.head(10).itertuples(index=False):
+    print(f"  {row.date} {row.query} [{row.metric}]: {row.value:.2f} (attendu {row.expected:.2f}, z = {row.zscore:+.1f})")
 
 
-# =============================================================================  
+# =============================================================================
 # 4. KEYWORD EXTRACTION
 # =============================================================================
 
 print("\n4. MOTS-CLÉS DANS LES TITRES (Normalisés)")
 
-def extract_keywords(title):
-    """Extract keywords from title - using utils for consistency."""
-    if not title:
-        return []
-    
-    import re
-    
-    # Stop words
-    stops = {
-        'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i',
-        'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at',
-        'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her',
-        'or', 'an', 'will', 'my', 'one', 'all', 'would', 'there', 'their',
-        'what', 'so', 'up', 'out', 'if', 'about', 'who', 'get', 'which',
-        'me', 'when', 'make', 'can', 'like', 'time', 'no', 'just', 'him',
-        'know', 'take', 'people', 'into', 'year', 'your', 'good', 'some',
-        'video', 'news', 'latest', 'live', 'watch', 'full', 'today'
-    }
-    
-    # Clean title
-    title = re.sub(r'#\w+', '', title)  # Remove hashtags
-    words = re.findall(r'\b\w+\b', title.lower())
-    
-    # Filter and normalize using utils
-    from utils import normalize_keyword
-    
-    keywords = []
-    for word in words:
-        # Filter short words and stop words
-        if len(word) <= 2 or word in stops:
-            continue
-        
-        normalized = normalize_keyword(word)
-        if normalized and len(normalized) > 2 and normalized not in stops:
-            keywords.append(normalized)
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_keywords = []
-    for kw in keywords:
-        if kw not in seen:
-            seen.add(kw)
-            unique_keywords.append(kw)
-    
-    return unique_keywords
-
-# Apply UDF
-extract_keywords_udf = udf(extract_keywords, ArrayType(StringType()))
-
-keyword_counts = df_videos.withColumn("keywords", extract_keywords_udf(col("title"))) \
-                         .select(explode(col("keywords")).alias("keyword")) \
-                         .groupBy("keyword") \
-                         .agg(count("*").alias("count")) \
-                         .orderBy(col("count").desc()) \
-                         .limit(15)
-
 print("Mots les plus fréquents:")
-for row in keyword_counts.collect():
-    print(f"   {row['keyword']}: {row['count']}")
+for row in engine.keyword_counts(15).itertuples(index=False):
+    print(f"   {row.keyword}: {row.count}")
 
 
 # =============================================================================
@@ -185,13 +198,9 @@ for row in keyword_counts.collect():
 
 print("\n5. TOP 10 VIDÉOS LES PLUS VUES")
 
-top_videos = df_videos.select("viewCount", "channelTitle", "title") \
-                      .orderBy(col("viewCount").desc()) \
-                      .limit(10)
-
-for video in top_videos.collect():
-    title_preview = video['title'][:70] + "..." if len(video['title']) > 70 else video['title']
-    print(f"   {video['viewCount']:,} vues - {video['channelTitle']}: {title_preview}")
+for video in engine.top_videos(10).itertuples(index=False):
+    title_preview = video.title[:70] + "..." if len(video.title) > 70 else video.title
+    print(f"   {video.viewCount:,} vues - {video.channelTitle}: {title_preview}")
 
 
 # =============================================================================
@@ -201,27 +210,36 @@ for video in top_videos.collect():
 print("\n6. ANALYSE DES COMMENTAIRES")
 print(f"   - Total: {comment_count}")
 
-# Top authors
-df_comments.createOrReplaceTempView("comments")
-top_authors = spark.sql("""
-    SELECT author, COUNT(*) as count
-    FROM comments
-    GROUP BY author
-    ORDER BY count DESC
-    LIMIT 10
-""")
-
 print("   - Auteurs les plus actifs:")
-for row in top_authors.collect():
-    print(f"     {row['author']}: {row['count']} commentaires")
-
-# Most liked
-top_liked = df_comments.orderBy(col("likeCount").desc()).limit(5)
+for row in engine.top_authors(10).itertuples(index=False):
+    print(f"     {row.author}: {row.count} commentaires")
 
 print("   - Commentaires les plus likés:")
-for row in top_liked.collect():
-    text_preview = (row['text'][:80] + "...") if row['text'] and len(row['text']) > 80 else row['text']
-    print(f"     {row['likeCount']:,} likes - @{row['author']}: {text_preview}")
+for row in engine.top_liked_comments(5).itertuples(index=False):
+    text_preview = (row.text[:80] + "...") if row.text and len(row.text) > 80 else row.text
+    print(f"     {row.likeCount:,} likes - @{row.author}: {text_preview}")
+
+print(f"   - Quasi-doublons: {duplicates.duplicate_count} copies dans {len(duplicates.clusters)} groupes "
+      f"({'exclus' if args.without_duplicates else 'inclus'})")
+for row in duplicates.clusters.head(5).itertuples(index=False):
+    text_preview = (row.text[:60] + "...") if row.text and len(row.text) > 60 else row.text
+    print(f"     {row.size} commentaires ({row.authors} auteurs, {row.videos} vidéos): {text_preview}")
+if len(duplicates.suspicious_authors):
+    print("   - Auteurs suspects (majorité de commentaires copiés):")
+    for row in duplicates.suspicious_authors.head(10).itertuples(index=False):
+        print(f"     {row.author}: {row.duplicate_comments}/{row.comments} copiés")
+
+# Reply threads (present when replies were expanded during collection)
+threads = engine.reply_threads(5)
+if threads is not None:
+    reply_count, top_threads = threads
+    print(f"   - Réponses: {reply_count} / commentaires principaux: {comment_count - reply_count}")
+
+    if reply_count:
+        print("   - Fils de discussion les plus actifs:")
+        for row in top_threads.itertuples(index=False):
+            text_preview = (row.text[:60] + "...") if row.text and len(row.text) > 60 else row.text
+            print(f"     {row.replies} réponses ({row.participants} participants) - @{row.author}: {text_preview}")
 
 
 # =============================================================================
@@ -230,30 +248,133 @@ for row in top_liked.collect():
 
 print("\n7. ANALYSE PAR MOT-CLÉ DE RECHERCHE")
 
-query_stats = df_videos.groupBy("query") \
-                       .agg(
-                           count("*").alias("nb_videos"),
-                           spark_sum("viewCount").alias("total_views"),
-                           spark_sum("likeCount").alias("total_likes")
-                       ) \
-                       .orderBy("nb_videos", ascending=False)
+print(engine.query_stats().to_string(index=False))
+
+
+# =============================================================================
+# 8. SENTIMENT ANALYSIS
+# =============================================================================
+
+print("\n8. ANALYSE DE SENTIMENT DES COMMENTAIRES")
+
+sentiment = engine.sentiment()
+scored_count = sentiment['scored']
+sentiment_elapsed = sentiment['elapsed']
+print(f"   - {scored_count} commentaires notés en {sentiment_elapsed:.2f}s "
+      f"({scored_count / max(sentiment_elapsed, 1e-9):,.0f} commentaires/s)")
 
-print(query_stats.toPandas().to_string(index=False))
+for row in sentiment['labels'].itertuples(index=False):
+    print(f"     {row.sentimentLabel}: {row.count}")
+
+by = sentiment['by']
+print("   - Par requête:")
+print(by['query'].sort_values('comments', ascending=False, kind='mergesort').to_string(index=False))
+print("   - Par mois:")
+print(by['month'].to_string(index=False))
+print("   - Chaînes les plus commentées:")
+print(by['channelTitle'].sort_values('comments', ascending=False, kind='mergesort')
+      .head(10).to_string(index=False))
+print("   - Vidéos au ton le plus négatif (≥ 10 commentaires):")
+print(by['videoId'][by['videoId']['comments'] >= 10]
+      .sort_values('mean_score', kind='mergesort').head(5).to_string(index=False))
+
+
+# =============================================================================
+# 9. ENGAGEMENT PERCENTILES (SKETCHES)
+# =============================================================================
+
+print("\n9. PERCENTILES D'ENGAGEMENT (HyperLogLog / KLL)")
+
+sketches = engine.sketches()
+percentile_columns = ['distinct_commenters', 'views_p50', 'views_p90', 'views_p99',
+                      'comment_likes_p50', 'comment_likes_p90', 'comment_likes_p99']
+print("   - Par requête:")
+print(pd.DataFrame(sketches.summary('query'))[['query'] + percentile_columns].to_string(index=False))
+print("   - Par mois:")
+print(pd.DataFrame(sketches.summary('month'))[['month'] + percentile_columns].to_string(index=False))
+channels = pd.DataFrame(sketches.summary('channel'))
+print("   - Chaînes avec le plus de commentateurs distincts:")
+print(channels.sort_values(['distinct_commenters', 'channel'], ascending=[False, True])
+      .head(10)[['channel'] + percentile_columns].to_string(index=False))
+
+
+# =============================================================================
+# 10. TOPICS (TF-IDF / NMF)
+# =============================================================================
+
+print("\n10. THÈMES DES TITRES ET COMMENTAIRES (TF-IDF / NMF)")
+
+topics = engine.topics()
+for row in topics['topics'].itertuples(index=False):
+    print(f"   Thème {row.topic}: {', '.join(row.terms)}")
+for group, title in (('query', 'Par requête'), ('month', 'Par mois')):
+    table = topics['by'][group]
+    shares = table[topics['topics']['label']]
+    # Most over-represented topic, relative to its share over all documents
+    lift = shares / shares.mul(table['documents'], axis=0).sum().div(table['documents'].sum())
+    print(f"   - {title} (thème le plus distinctif):")
+    for i, label in lift.idxmax(axis=1).items():
+        print(f"     {table.at[i, group]}: {label} ({shares.at[i, label]:.0%} de {table.at[i, 'documents']} documents)")
+
+
+# =============================================================================
+# 11. KEYWORD CO-OCCURRENCE (SPARSE B^T B / PMI)
+# =============================================================================
+
+print("\n11. CO-OCCURRENCES DE MOTS-CLÉS (PMI)")
+
+# Reads the document-term matrix synced by the topic stage above
+pairs = keyword_pairs(get_data_dir())
+print("   - Paires les plus fréquentes:")
+for row in pairs['all'].head(10).itertuples(index=False):
+    print(f"     {row.source} + {row.target}: {row.count} documents (PMI {row.pmi:.2f})")
+print("   - Par requête:")
+for query, table in pairs['by']['query'].groupby('query', sort=True):
+    print(f"     {query}: " + ", ".join(f"{r.source} + {r.target} ({r.count})"
+                                      for r in table.head(3).itertuples(index=False)))
+print("   - Par mois (paire la plus fréquente):")
+for row in pairs['by']['month'].groupby('month', sort=True).head(1).itertuples(index=False):
+    print(f"     {row.month}: {row.source} + {row.target} ({row.count} documents, PMI {row.pmi:.2f})")
+
+
+# =============================================================================
+# 12. AUTHOR–VIDEO INTERACTION NETWORK
+# =============================================================================
+
+print("\n12. RÉSEAU AUTEURS–VIDÉOS")
+
+network = analyze_network(engine.interaction_edges())
+summary = network['summary']
+print(f"   - {summary['authors']} auteurs, {summary['videos']} vidéos, {summary['edges']} liens")
+print(f"   - Projections: {summary['author_edges']} liens auteur–auteur, "
+      f"{summary['video_edges']} liens vidéo–vidéo")
+print(f"   - Composantes connexes: {summary['bipartite_components']} "
+      f"(la plus grande: {summary['largest_component_share']:.0%} des nœuds)")
+print(f"   - Communautés d'auteurs: {summary['author_communities']} "
+      f"(modularité {summary['author_modularity']:.2f})")
+print(f"   - Communautés de vidéos: {summary['video_communities']} "
+      f"(modularité {summary['video_modularity']:.2f})")
+print("   - Auteurs par nombre de vidéos commentées:")
+for row in network['degrees']['author_videos'].head(5).itertuples(index=False):
+    print(f"     {row.degree} vidéo(s): {row.nodes} auteurs")
+print("   - Plus grandes communautés de vidéos:")
+for row in network['video_communities'].head(5).itertuples(index=False):
+    print(f"     #{row.community}: {row.size} vidéos - {row.top_channels}")
+print("   - Plus grandes communautés d'auteurs:")
+for row in network['author_communities'].head(5).itertuples(index=False):
+    print(f"     #{row.community}: {row.size} auteurs ({row.top_members})")
 
 
 # =============================================================================
 # SAVE RESULTS
 # =============================================================================
 
-print("\n✓ Analyse PySpark terminée avec succès!")
-print("✓ Fichiers sauvegardés dans outputs/")
+engine.export(get_outputs_dir(),
+              formats=[fmt.strip() for fmt in args.formats.split(',') if fmt.strip()],
+              merge_summaries=args.merge)
+save_network(network, get_outputs_dir())
 
-# Convert to pandas for CSV compatibility
-outputs_dir = get_outputs_dir()
-top_channels.toPandas().to_csv(f'{outputs_dir}/analysis_videos_pyspark.csv', index=False)
-df_comments.select("videoId", "commentId", "author", "text", "likeCount", "publishedAt") \
-          .toPandas() \
-          .to_csv(f'{outputs_dir}/analysis_comments_pyspark.csv', index=False)
+print(f"\n✓ Analyse {engine.label} terminée avec succès!")
+print("✓ Fichiers sauvegardés dans outputs/")
 
-# Stop Spark
-spark.stop()
+engine.stop()
@@ -1,18 +1,85 @@
 import requests
+import argparse
 import json
+import math
+import os
+import threading
 import time
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import rollups
+import search_index
+import sentiment
 import utils
 from utils import get_data_dir
+from arrow_store import source_version
+from http_cache import ResponseCache
+from metrics_store import TIMESERIES_FILE, MetricsTimeSeries, utc_timestamp
+from records import Comment, Video, as_dict, to_columns
+from stream_analyzer import stream_paths, write_drop
+from quota import (
+    QUOTA_COSTS, QuotaExceededError, QuotaLedger, estimate_channel_crawl_cost,
+    estimate_query_cost, is_quota_error
+)
 
 class YouTubeCollector:
-    def __init__(self, api_key):
+    def __init__(self, api_key, ledger=None, run_id=None, cache=None, offline=False):
         self.api_key = api_key
         self.base_url = "https://www.googleapis.com/youtube/v3"
+        self.ledger = ledger
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        # Offline replay serves everything from the cache, so it needs one
+        self.cache = cache if cache is not None or not offline else ResponseCache()
+        self.offline = offline
+        self._local = threading.local()
+
+    def _get(self, endpoint, params):
+        """GET an API endpoint through the response cache and quota ledger"""
+        entry = self.cache.get(endpoint, params) if self.cache else None
+        self._local.from_cache = True
+        
+        if entry and (self.offline or self.cache.is_fresh(entry)):
+            return entry['body']
+        if self.offline:
+            # Same shape as an API error so callers stop paging gracefully
+            return {'error': {
+                'code': 504,
+                'message': f"Offline replay: no cached response for '{endpoint}'",
+                'errors': [{'reason': 'offlineCacheMiss'}]
+            }}
         
-    def search_videos(self, query, max_results=50, published_after=None, published_before=None):
-        """Search videos by keyword with strict constraints"""
+        units = QUOTA_COSTS.get(endpoint, 1)
+        if self.ledger and not self.ledger.can_afford(units):
+            raise QuotaExceededError(f"Daily budget exhausted before '{endpoint}' call")
+
+        headers = {'If-None-Match': entry['etag']} if entry and entry.get('etag') else None
+        response = requests.get(f"{self.base_url}/{endpoint}", params=params, headers=headers)
+        self._local.from_cache = False
+        if self.ledger:
+            self.ledger.record(endpoint, self.run_id, units)
+
+        if response.status_code == 304 and entry:
+            self.cache.revalidated(endpoint, params, entry)
+            return entry['body']
+
+        data = response.json()
+        if is_quota_error(data):
+            if self.ledger:
+                self.ledger.mark_exhausted()
+            raise QuotaExceededError(f"API refused '{endpoint}' call: quota exceeded")
+        
+        if self.cache and response.ok and 'error' not in data:
+            self.cache.put(endpoint, params, data, response.headers.get('ETag') or data.get('etag'))
+        return data
+
+    def pause(self, seconds):
+        """Rate-limit sleep, skipped when the last response came from the cache"""
+        if not getattr(self._local, 'from_cache', False):
+            time.sleep(seconds)
+        
+    def search_videos(self, query, max_results=50, published_after=None, published_before=None, exclude=()):
+        """Search videos by keyword with strict constraints (skipping the `exclude` IDs)"""
         videos = []
         next_page_token = None
         
@@ -22,8 +89,6 @@ class YouTubeCollector:
         
         print(f"   Targeting {target_results} videos for query '{query}'...")
 
-        url = f"{self.base_url}/search"
-        
         while len(videos) < target_results:
             params = {
                 'part': 'snippet',
@@ -42,8 +107,7 @@ class YouTubeCollector:
                 params['pageToken'] = next_page_token
                 
             try:
-                response = requests.get(url, params=params)
-                data = response.json()
+                data = self._get('search', params)
                 
                 if 'items' not in data:
                     print(f"   No items found or API error: {data}")
@@ -51,6 +115,8 @@ class YouTubeCollector:
                     
                 for item in data['items']:
                     video_id = item['id']['videoId']
+                    if video_id in exclude:
+                        continue
                     
                     # Get detailed stats to check duration (filter shorts)
                     stats = self.get_video_details(video_id)
@@ -65,16 +131,16 @@ class YouTubeCollector:
                         # print(f"     [Debug] Discarded Short: {video_id} ({duration_str})") # Commented out to reduce noise, enable if needed
                         continue
                         
-                    video_data = {
+                    video_data = Video({
                         'videoId': video_id,
                         'title': item['snippet']['title'],
                         'description': item['snippet']['description'],
                         'publishedAt': item['snippet']['publishedAt'],
                         'channelTitle': item['snippet']['channelTitle'],
+                        'channelId': item['snippet'].get('channelId'),
                         'query': query,
                         'durationVal': duration_seconds # Keep for debugging
-                    }
-                    video_data.update(stats)
+                    }, **stats)
                     videos.append(video_data)
                     
                     if len(videos) >= target_results:
@@ -82,10 +148,12 @@ class YouTubeCollector:
                 
                 if 'nextPageToken' in data and len(videos) < target_results:
                     next_page_token = data['nextPageToken']
-                    time.sleep(0.2) # API rate limit safety
+                    self.pause(0.2) # API rate limit safety
                 else:
                     break
                     
+            except QuotaExceededError:
+                raise
             except Exception as e:
                 print(f"Error during search: {e}")
                 break
@@ -97,7 +165,6 @@ class YouTubeCollector:
     
     def get_video_details(self, video_id):
         """Get video statistics and content details (for duration)"""
-        url = f"{self.base_url}/videos"
         params = {
             'part': 'statistics,snippet,contentDetails',
             'id': video_id,
@@ -105,28 +172,148 @@ class YouTubeCollector:
         }
         
         try:
-            response = requests.get(url, params=params)
-            data = response.json()
+            data = self._get('videos', params)
             
             if 'items' in data and len(data['items']) > 0:
-                item = data['items'][0]
-                return {
-                    'viewCount': item['statistics'].get('viewCount', 0),
-                    'likeCount': item['statistics'].get('likeCount', 0),
-                    'commentCount': item['statistics'].get('commentCount', 0),
-                    'tags': item['snippet'].get('tags', []),
-                    'duration': item['contentDetails'].get('duration', ''),
-                    'definition': item['contentDetails'].get('definition', '')
-                }
+                return self._details_from_item(data['items'][0])
+        except QuotaExceededError:
+            raise
         except Exception as e:
             print(f"Error getting video stats {video_id}: {e}")
             
         return None
     
+    @staticmethod
+    def _details_from_item(item):
+        """Extract the stats/contentDetails fields kept for each video"""
+        return {
+            'viewCount': item['statistics'].get('viewCount', 0),
+            'likeCount': item['statistics'].get('likeCount', 0),
+            'commentCount': item['statistics'].get('commentCount', 0),
+            'tags': item['snippet'].get('tags', []),
+            'duration': item['contentDetails'].get('duration', ''),
+            'definition': item['contentDetails'].get('definition', '')
+        }
+    
+    def get_videos_details(self, video_ids):
+        """Get snippet and details for many videos, 50 IDs (1 unit) per call"""
+        details = {}
+        for start in range(0, len(video_ids), 50):
+            params = {
+                'part': 'statistics,snippet,contentDetails',
+                'id': ','.join(video_ids[start:start + 50]),
+                'key': self.api_key
+            }
+            try:
+                data = self._get('videos', params)
+                for item in data.get('items', []):
+                    snippet = item['snippet']
+                    video = Video({
+                        'videoId': item['id'],
+                        'title': snippet.get('title', ''),
+                        'description': snippet.get('description', ''),
+                        'publishedAt': snippet.get('publishedAt'),
+                        'channelTitle': snippet.get('channelTitle'),
+                        'channelId': snippet.get('channelId')
+                    }, **self._details_from_item(item))
+                    details[item['id']] = video
+            except QuotaExceededError:
+                raise
+            except Exception as e:
+                print(f"Error getting video details batch: {e}")
+        return details
+    
+    def get_statistics(self, video_ids):
+        """Get current statistics only, 50 IDs (1 unit) per call"""
+        stats = {}
+        for start in range(0, len(video_ids), 50):
+            params = {
+                'part': 'statistics',
+                'id': ','.join(video_ids[start:start + 50]),
+                'key': self.api_key
+            }
+            try:
+                data = self._get('videos', params)
+                for item in data.get('items', []):
+                    stats[item['id']] = {
+                        'viewCount': item['statistics'].get('viewCount', 0),
+                        'likeCount': item['statistics'].get('likeCount', 0),
+                        'commentCount': item['statistics'].get('commentCount', 0)
+                    }
+            except QuotaExceededError:
+                raise
+            except Exception as e:
+                print(f"Error getting statistics batch: {e}")
+            self.pause(0.1)
+        return stats
+    
+    def get_uploads_playlists(self, channel_ids):
+        """Map channel IDs to their uploads playlist, 50 channels per call"""
+        playlists = {}
+        for start in range(0, len(channel_ids), 50):
+            params = {
+                'part': 'contentDetails',
+                'id': ','.join(channel_ids[start:start + 50]),
+                'key': self.api_key
+            }
+            try:
+                data = self._get('channels', params)
+                for item in data.get('items', []):
+                    uploads = item['contentDetails'].get('relatedPlaylists', {}).get('uploads')
+                    if uploads:
+                        playlists[item['id']] = uploads
+            except QuotaExceededError:
+                raise
+            except Exception as e:
+                print(f"Error getting channel playlists: {e}")
+        return playlists
+    
+    def crawl_uploads(self, playlist_id, published_after=None, published_before=None, max_pages=20):
+        """Page an uploads playlist (newest first) within a date window.
+        
+        Items newer than `published_before` are skipped, and paging stops
+        at the first page lying entirely before `published_after`.
+        """
+        video_ids = []
+        params = {
+            'part': 'contentDetails',
+            'playlistId': playlist_id,
+            'maxResults': 50,
+            'key': self.api_key
+        }
+        
+        try:
+            for _ in range(max_pages):
+                data = self._get('playlistItems', params)
+                if 'items' not in data:
+                    break
+                
+                older_than_window = 0
+                for item in data['items']:
+                    video_id = item['contentDetails']['videoId']
+                    published = item['contentDetails'].get('videoPublishedAt', '')
+                    if published_before and published > published_before:
+                        continue
+                    if published_after and published < published_after:
+                        older_than_window += 1
+                        continue
+                    video_ids.append(video_id)
+                
+                if older_than_window == len(data['items']) or 'nextPageToken' not in data:
+                    break
+                params['pageToken'] = data['nextPageToken']
+                self.pause(0.1)
+                
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            print(f"Error crawling playlist {playlist_id}: {e}")
+            
+        return video_ids
+    
     def get_comments(self, video_id, max_comments=100):
         """Get video comments with English filtering"""
         comments = []
-        url = f"{self.base_url}/commentThreads"
         params = {
             'part': 'snippet',
             'videoId': video_id,
@@ -137,12 +324,12 @@ class YouTubeCollector:
         
         try:
             while len(comments) < max_comments:
-                response = requests.get(url, params=params)
-                data = response.json()
+                data = self._get('commentThreads', params)
                 
                 if 'items' not in data:
                     break
                     
+                page_start = len(comments)
                 for item in data['items']:
                     comment_snip = item['snippet']['topLevelComment']['snippet']
                     text = comment_snip['textDisplay']
@@ -151,70 +338,123 @@ class YouTubeCollector:
                     if not utils.is_english(text):
                         continue
                         
-                    comments.append({
-                        'videoId': video_id,
-                        'commentId': item['id'],
-                        'author': comment_snip['authorDisplayName'],
-                        'text': text,
-                        'likeCount': comment_snip['likeCount'],
-                        'publishedAt': comment_snip['publishedAt'],
-                        'sentiment': 'neutral'
-                    })
+                    comments.append(Comment(
+                        videoId=video_id,
+                        commentId=item['id'],
+                        author=comment_snip['authorDisplayName'],
+                        text=text,
+                        likeCount=comment_snip['likeCount'],
+                        publishedAt=comment_snip['publishedAt'],
+                        parentId=None,
+                        totalReplyCount=item['snippet'].get('totalReplyCount', 0)
+                    ))
+                
+                # Score the page as one batch
+                sentiment.score_comments(comments[page_start:])
                 
                 if 'nextPageToken' in data and len(comments) < max_comments:
                     params['pageToken'] = data['nextPageToken']
                 else:
                     break
                     
-                time.sleep(0.1)
+                self.pause(0.1)
                 
+        except QuotaExceededError:
+            raise
         except Exception as e:
             print(f"Error getting comments {video_id}: {e}")
             
         return comments
 
-    def save_to_files(self, videos_data, output_dir=None):
-        """Save data to JSON and CSV files"""
+    def get_replies(self, video_id, parent_id, max_replies=100, sink=None):
+        """Get English replies of a comment thread (comments.list by parentId).
+        
+        Each reply is passed to `sink` as soon as its page arrives.
+        """
+        replies = []
+        params = {
+            'part': 'snippet',
+            'parentId': parent_id,
+            'maxResults': min(max_replies, 100),
+            'key': self.api_key
+        }
+        
+        try:
+            while len(replies) < max_replies:
+                data = self._get('comments', params)
+                
+                if 'items' not in data:
+                    break
+                
+                page = []
+                for item in data['items']:
+                    snip = item['snippet']
+                    if not utils.is_english(snip['textDisplay']):
+                        continue
+                    
+                    page.append(Comment(
+                        videoId=video_id,
+                        commentId=item['id'],
+                        author=snip['authorDisplayName'],
+                        text=snip['textDisplay'],
+                        likeCount=snip['likeCount'],
+                        publishedAt=snip['publishedAt'],
+                        parentId=parent_id,
+                        totalReplyCount=0
+                    ))
+                
+                sentiment.score_comments(page)
+                replies.extend(page)
+                if sink:
+                    for reply in page:
+                        sink(reply)
+                
+                if 'nextPageToken' in data and len(replies) < max_replies:
+                    params['pageToken'] = data['nextPageToken']
+                else:
+                    break
+                
+                self.pause(0.1)
+                
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            print(f"Error getting replies {parent_id}: {e}")
+        
+        return replies
+
+    def save_to_files(self, videos_data, output_dir=None, merge=False):
+        """Save data to JSON and CSV files
+        
+        With `merge`, the videos already saved in `output_dir` are kept and
+        the new ones replace them by (videoId, query), so collections that
+        resume on a later quota day add to the dataset instead of replacing it.
+        """
         if output_dir is None:
             output_dir = get_data_dir()
         
         if not videos_data:
             print("No data to save.")
             return
+        if merge:
+            videos_data = merge_saved_videos(videos_data, output_dir)
 
-        # Save videos
-        with open(f'{output_dir}/youtube_videos.json', 'w', encoding='utf-8') as f:
-            json.dump(videos_data, f, ensure_ascii=False, indent=2)
-        
-        # Save to CSV
-        df_videos = pd.DataFrame(videos_data)
-        # Drop complex objects for CSV if needed, but pandas usually handles basic dicts as strings
-        df_videos.to_csv(f'{output_dir}/youtube_videos.csv', index=False, encoding='utf-8')
-        
-        # Save all comments
-        all_comments = []
+        # Tokenize titles once here; later stages read `titleTokens`
         for video in videos_data:
-            all_comments.extend(video.get('comments', []))
+            utils.add_title_tokens(video)
         
-        with open(f'{output_dir}/youtube_comments.json', 'w', encoding='utf-8') as f:
-            json.dump(all_comments, f, ensure_ascii=False, indent=2)
+        # Records (Video/Comment) become plain dicts only for serialization
+        videos_dicts = [as_dict(video) for video in videos_data]
         
-        if all_comments:
-            df_comments = pd.DataFrame(all_comments)
-            df_comments.to_csv(f'{output_dir}/youtube_comments.csv', index=False, encoding='utf-8')
-        """Save data to JSON and CSV files"""
-        if not videos_data:
-            print("No data to save.")
-            return
-
         # Save videos
         with open(f'{output_dir}/youtube_videos.json', 'w', encoding='utf-8') as f:
-            json.dump(videos_data, f, ensure_ascii=False, indent=2)
+            json.dump(videos_dicts, f, ensure_ascii=False, indent=2)
         
         # Save to CSV
-        df_videos = pd.DataFrame(videos_data)
+        df_videos = pd.DataFrame(videos_dicts)
         # Drop complex objects for CSV if needed, but pandas usually handles basic dicts as strings
         df_videos.to_csv(f'{output_dir}/youtube_videos.csv', index=False, encoding='utf-8')
+        del videos_dicts, df_videos
         
         # Save all comments
         all_comments = []
@@ -222,11 +462,36 @@ class YouTubeCollector:
             all_comments.extend(video.get('comments', []))
         
         with open(f'{output_dir}/youtube_comments.json', 'w', encoding='utf-8') as f:
-            json.dump(all_comments, f, ensure_ascii=False, indent=2)
+            json.dump([as_dict(c) for c in all_comments], f, ensure_ascii=False, indent=2)
         
         if all_comments:
-            df_comments = pd.DataFrame(all_comments)
+            df_comments = pd.DataFrame(to_columns(all_comments))
             df_comments.to_csv(f'{output_dir}/youtube_comments.csv', index=False, encoding='utf-8')
+        
+        # Keep the period/query/channel rollups in step with the saved videos
+        try:
+            rollups.update_rollups(videos_data, output_dir,
+                                   source_version(f'{output_dir}/youtube_videos.json'))
+        except Exception as e:
+            print(f"Could not update rollups: {e}")
+        
+        # Make the new records searchable
+        try:
+            search_index.update_index(videos_data, os.path.join(output_dir, search_index.INDEX_DIR))
+        except Exception as e:
+            print(f"Could not update search index: {e}")
+
+
+def merge_saved_videos(videos, data_dir):
+    """Videos saved in `data_dir` with `videos` added, replacing saved ones by (videoId, query)."""
+    path = f'{data_dir}/youtube_videos.json'
+    if not os.path.exists(path):
+        return list(videos)
+    new = {(v['videoId'], v.get('query')): v for v in videos}
+    merged = [new.pop((v['videoId'], v.get('query')), v) for v in utils.iter_json_records(path)]
+    print(f"   Merged with {len(merged)} saved videos")
+    return merged + list(new.values())
+
 
 def collect_videos_split_window(collector, query, target=100):
     """Collect videos using split-window strategy for timeline coverage."""
@@ -263,15 +528,456 @@ def collect_videos_split_window(collector, query, target=100):
     return videos[:target]  # Ensure max limit
 
 
-def main():
+def fetch_comments(collector, videos, max_comments=30, reply_threshold=None):
+    """Fetch the comments (and popular reply threads) of newly found videos.
+    
+    If the quota runs out, the error carries the videos whose comments
+    were fetched as `partial`, so the caller keeps what was paid for.
+    """
+    done = []
+    try:
+        for video in videos:
+            video['comments'] = collector.get_comments(video['videoId'], max_comments=max_comments)
+            video['commentsCount'] = len(video['comments'])
+            done.append(video)
+            collector.pause(0.3)
+        
+        if reply_threshold:
+            expand_replies(collector, videos, min_replies=reply_threshold)
+    except QuotaExceededError as e:
+        e.partial = done
+        raise
+    return videos
+
+
+def collect_query(collector, query, target, published_after=None, published_before=None, max_comments=30,
+                  reply_threshold=None, exclude=None):
+    """Collect up to `target` videos (with comments) for one query.
+    
+    `exclude` maps the IDs of videos an interrupted run already collected
+    to their query; they count towards `target` and are not fetched again.
+    """
+    exclude = exclude or {}
+    target -= len(exclude)
+    videos = collector.search_videos(
+        query,
+        max_results=target,
+        published_after=published_after,
+        published_before=published_before,
+        exclude=exclude
+    )
+    
+    # Deduplicate and limit to target
+    seen = set()
+    videos = [v for v in videos if not (v['videoId'] in seen or seen.add(v['videoId']))][:target]
+    
+    return fetch_comments(collector, videos, max_comments, reply_threshold)
+
+
+def seed_channels_from_data(collector, data_dir=None, top_n=10):
+    """Return channel IDs of the top-N channels (by video count) already collected.
+    
+    Older data files have no `channelId`, so those channels are resolved
+    from one of their videos with a batched `videos` call. Without
+    collected data there is nothing to seed from, and the list is empty.
+    """
+    data_dir = data_dir or get_data_dir()
+    videos_path = f'{data_dir}/youtube_videos.json'
+    if not os.path.exists(videos_path):
+        print(f"No collected videos in {data_dir}: run a search collection before seeding channels")
+        return []
+    with open(videos_path, 'r', encoding='utf-8') as f:
+        videos = json.load(f)
+    
+    top_channels = pd.Series([v.get('channelTitle') for v in videos]).value_counts().head(top_n).index
+    channel_ids = {}
+    sample_videos = {}
+    for video in videos:
+        title = video.get('channelTitle')
+        if title not in top_channels:
+            continue
+        if video.get('channelId'):
+            channel_ids[title] = video['channelId']
+        else:
+            sample_videos.setdefault(title, video['videoId'])
+    
+    missing = [vid for title, vid in sample_videos.items() if title not in channel_ids]
+    for details in collector.get_videos_details(missing).values():
+        channel_ids.setdefault(details['channelTitle'], details['channelId'])
+    
+    return list(dict.fromkeys(channel_ids.values()))
+
+
+def crawl_channels(collector, channel_ids, published_after=None, published_before=None,
+                   max_pages=20, max_workers=4):
+    """Page the uploads playlists of several channels in parallel."""
+    playlists = collector.get_uploads_playlists(channel_ids)
+    video_ids = []
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(collector.crawl_uploads, playlist_id, published_after, published_before, max_pages): channel_id
+            for channel_id, playlist_id in playlists.items()
+        }
+        for future in as_completed(futures):
+            ids = future.result()
+            print(f"   Channel {futures[future]}: {len(ids)} videos in window")
+            video_ids.extend(ids)
+    
+    return list(dict.fromkeys(video_ids))
+
+
+def match_query(video, query_keywords):
+    """Return the first query whose keywords all appear in the video text."""
+    text_keywords = set(utils.extract_keywords(f"{video.get('title', '')} {video.get('description', '')}"))
+    for query, keywords in query_keywords.items():
+        if keywords and keywords <= text_keywords:
+            return query
+    return None
+
+
+def collect_channels(collector, channel_ids, queries, target, published_after=None,
+                     published_before=None, max_comments=30, max_pages=20, max_workers=4,
+                     reply_threshold=None, exclude=None):
+    """Collect videos from channel uploads instead of search.
+    
+    Videos are assigned to the first query they match and capped at
+    `target` per query, then go through the same Shorts filter and
+    comment collection as searched videos. Videos in `exclude` (ID to
+    query, from an interrupted run) count towards the caps.
+    """
+    exclude = exclude or {}
+    video_ids = [vid for vid in crawl_channels(collector, channel_ids, published_after, published_before,
+                                               max_pages, max_workers) if vid not in exclude]
+    details = collector.get_videos_details(video_ids)
+    
+    query_keywords = {q: set(utils.extract_keywords(q)) for q in queries}
+    per_query = {q: sum(1 for vq in exclude.values() if vq == q) for q in queries}
+    videos = []
+    
+    for video_id in video_ids:
+        video = details.get(video_id)
+        if not video:
+            continue
+        
+        # Filter Shorts: Duration must be >= 60 seconds
+        duration_seconds = utils.parse_duration(video.get('duration', ''))
+        if duration_seconds < 60:
+            continue
+        
+        query = match_query(video, query_keywords)
+        if query is None or per_query[query] >= target:
+            continue
+        
+        video['query'] = query
+        video['durationVal'] = duration_seconds
+        per_query[query] += 1
+        videos.append(video)
+    
+    print(f"   Matched videos per query: {per_query}")
+    
+    return fetch_comments(collector, videos, max_comments, reply_threshold)
+
+
+def expand_replies(collector, videos, min_replies=5, max_replies=100,
+                   per_video_limit=2, global_limit=8, sink=None):
+    """Fetch reply threads of popular comments in parallel.
+    
+    Threads with at least `min_replies` replies are expanded with at most
+    `global_limit` requests in flight overall and `per_video_limit` per
+    video. Replies stream into `sink(video, reply)`, by default the
+    video's own comment list, with `parentId` pointing at the thread.
+    """
+    lock = threading.Lock()
+    
+    def append_to_video(video, reply):
+        with lock:
+            video['comments'].append(reply)
+            video['commentsCount'] = len(video['comments'])
+    
+    sink = sink or append_to_video
+    
+    # Round-robin across videos so workers rarely wait on a per-video slot
+    per_video_tasks = []
+    for video in videos:
+        threads = [c for c in video.get('comments', [])
+                   if c.get('parentId') is None and c.get('totalReplyCount', 0) >= min_replies]
+        if threads:
+            per_video_tasks.append((video, threads))
+    
+    tasks = []
+    for i in range(max((len(t) for _, t in per_video_tasks), default=0)):
+        tasks.extend((video, threads[i]) for video, threads in per_video_tasks if i < len(threads))
+    
+    slots = {video['videoId']: threading.BoundedSemaphore(per_video_limit) for video, _ in per_video_tasks}
+    
+    def expand(video, thread):
+        with slots[video['videoId']]:
+            return collector.get_replies(
+                video['videoId'], thread['commentId'], max_replies=max_replies,
+                sink=lambda reply: sink(video, reply)
+            )
+    
+    total = 0
+    with ThreadPoolExecutor(max_workers=global_limit) as pool:
+        for future in as_completed([pool.submit(expand, v, t) for v, t in tasks]):
+            total += len(future.result())
+    
+    print(f"   Expanded {len(tasks)} threads: {total} replies")
+    return total
+
+
+def channel_share(videos_per_query, n_channels):
+    """Videos per query taken from each of `n_channels` seed channels."""
+    return math.ceil(videos_per_query / max(n_channels, 1))
+
+
+def build_channel_jobs(config, channel_ids, max_comments=30, max_pages=20):
+    """One job per seed channel, each taking its share of the videos of every query.
+    
+    Running out of quota then only interrupts the channel being crawled.
+    """
+    target = channel_share(config['videos_per_query'], len(channel_ids))
+    cost = sum(estimate_channel_crawl_cost(
+        1, len(config['queries']) * target, max_comments=max_comments, max_pages=max_pages,
+        reply_threshold=config.get('reply_threshold')
+    ).values())
+    return [{
+        'name': f"channel:{channel_id}",
+        'kind': 'channels',
+        'priority': priority,
+        'cost': cost,
+        'payload': {
+            'channel_ids': [channel_id],
+            'queries': config['queries'],
+            'target': target,
+            'published_after': config['start_date'] + 'T00:00:00Z',
+            'published_before': config['end_date'] + 'T23:59:59Z',
+            'max_comments': max_comments,
+            'max_pages': max_pages,
+            'reply_threshold': config.get('reply_threshold')
+        }
+    } for priority, channel_id in enumerate(channel_ids)]
+
+
+def build_query_jobs(config, max_comments=30):
+    """Turn a GUI configuration into prioritized, cost-estimated query jobs.
+    
+    `config['targets']` optionally overrides `videos_per_query` per query.
+    """
+    jobs = []
+    for priority, query in enumerate(config['queries']):
+        target = config.get('targets', {}).get(query, config['videos_per_query'])
+        cost = sum(estimate_query_cost(target, max_comments, config.get('reply_threshold')).values())
+        jobs.append({
+            'name': f"query:{query}",
+            'priority': priority,
+            'cost': cost,
+            'payload': {
+                'query': query,
+                'target': target,
+                'published_after': config['start_date'] + 'T00:00:00Z',
+                'published_before': config['end_date'] + 'T23:59:59Z',
+                'max_comments': max_comments,
+                'reply_threshold': config.get('reply_threshold')
+            }
+        })
+    return jobs
+
+
+def remaining_job(job, videos):
+    """What is left of a job the quota interrupted after collecting `videos`, or None.
+    
+    The payload is kept as is (so a rerun's rebuilt job is recognized as
+    the same job); the videos already collected go to `collected` and the
+    cost shrinks to the part still missing.
+    """
+    collected = dict(job.get('collected', {}), **{v['videoId']: v['query'] for v in videos})
+    payload = job['payload']
+    if job.get('kind', 'query') == 'query':
+        missing = payload['target'] - len(collected)
+        cost = estimate_query_cost(missing, payload['max_comments'], payload.get('reply_threshold'))
+    else:
+        missing = sum(max(payload['target'] - list(collected.values()).count(q), 0)
+                      for q in payload['queries'])
+        cost = estimate_channel_crawl_cost(len(payload['channel_ids']), missing,
+                                           max_comments=payload['max_comments'],
+                                           max_pages=payload['max_pages'],
+                                           reply_threshold=payload.get('reply_threshold'))
+    if missing <= 0:
+        return None
+    return dict(job, collected=collected, cost=sum(cost.values()))
+
+
+def run_query_jobs(collector, scheduler, jobs, progress_callback=None, stream_dir=None, max_workers=1):
+    """Run the jobs that fit today's budget and defer the rest.
+    
+    With `stream_dir`, each job's videos are also dropped there as an
+    NDJSON micro-batch for the streaming analyzer. With `max_workers`
+    above 1, jobs run concurrently on one thread-safe collector.
+    A job interrupted by the quota keeps the videos it fully collected,
+    and only its remainder (see `remaining_job`) is deferred.
+    Returns the collected videos and the list of deferred jobs.
+    """
+    if collector.offline:
+        # Replay costs nothing, so nothing needs scheduling
+        runnable, deferred = list(jobs), []
+    else:
+        runnable, deferred = scheduler.plan(jobs)
+    
+    for job in deferred:
+        print(f"   Deferred to {job['not_before']}: {job['name']} (~{job['cost']} units)")
+    
+    def run_job(job, i):
+        if progress_callback:
+            progress_callback(job, i, len(runnable))
+        runner = JOB_RUNNERS[job.get('kind', 'query')]
+        try:
+            videos = runner(collector, exclude=job.get('collected'), **job['payload'])
+        except QuotaExceededError as e:
+            print(f"   Quota exhausted during {job['name']}: {e} ({len(e.partial)} videos kept)")
+            videos, remainder = list(e.partial), remaining_job(job, e.partial)
+        else:
+            remainder = None
+        if stream_dir:
+            write_drop(videos, stream_dir, name=job.get('kind', 'query'))
+        return videos, remainder
+    
+    all_videos = []
+    exhausted = []
+    if max_workers > 1:
+        # Results are kept in job order
+        results = [None] * len(runnable)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(run_job, job, i): i for i, job in enumerate(runnable)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        for videos, remainder in results:
+            all_videos.extend(videos)
+            if remainder:
+                exhausted.append(remainder)
+    else:
+        for i, job in enumerate(runnable):
+            videos, remainder = run_job(job, i)
+            all_videos.extend(videos)
+            if remainder:
+                # The budget is gone: the jobs not started yet wait as well
+                exhausted = [remainder] + runnable[i + 1:]
+                break
+    if exhausted:
+        scheduler.defer(exhausted)
+        deferred.extend(exhausted)
+    
+    scheduler.ledger.save()
+    return all_videos, deferred
+
+
+def parse_args(argv=None):
+    """Command-line options for the collector."""
+    parser = argparse.ArgumentParser(description="YouTube data collection")
+    parser.add_argument('--offline', action='store_true',
+                        help="replay cached API responses only, with no network calls")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="bypass the on-disk response cache")
+    parser.add_argument('--channels', type=int, metavar='N', default=0,
+                        help="discover videos from the uploads of the top N collected channels "
+                             "instead of search")
+    parser.add_argument('--replies', type=int, metavar='N', default=0,
+                        help="also fetch replies of comment threads with at least N replies")
+    parser.add_argument('--refresh', action='store_true',
+                        help="re-poll statistics of already collected videos into "
+                             "data/metrics_timeseries.ndjson instead of collecting new ones")
+    parser.add_argument('--stream', action='store_true',
+                        help="drop each query's videos into data/stream/incoming for "
+                             "stream_analyzer.py while collecting")
+    return parser.parse_args(argv)
+
+
+def refresh_engagement(collector, data_dir=None, max_comments=30):
+    """Re-poll statistics of tracked videos and record them as a time series.
+    
+    Only videos whose commentCount differs from the stored one get their
+    comments re-fetched; new comments are merged into the stored ones by
+    commentId. If the quota runs out while re-fetching, the statistics
+    refreshed so far are still saved. The videos still waiting keep
+    their stored commentCount, so the next refresh re-fetches them.
+    """
+    data_dir = data_dir or get_data_dir()
+    videos_path = f'{data_dir}/youtube_videos.json'
+    with open(videos_path, 'r', encoding='utf-8') as f:
+        videos = json.load(f)
+    
+    series = MetricsTimeSeries(os.path.join(data_dir, TIMESERIES_FILE))
+    
+    # Videos collected before tracking started get their stored values as baseline
+    untracked = [v for v in videos if v['videoId'] not in series.latest()]
+    if untracked:
+        collected_at = datetime.fromtimestamp(os.path.getmtime(videos_path), timezone.utc)
+        series.append(untracked, timestamp=utc_timestamp(collected_at))
+    
+    stats = collector.get_statistics([v['videoId'] for v in videos])
+    changed = set(series.append([dict(s, videoId=vid) for vid, s in stats.items()]))
+    
+    refetched = 0
+    new_comments = 0
+    quota_error = None
+    for video in videos:
+        video_stats = stats.get(video['videoId'])
+        if not video_stats:
+            continue
+        
+        if int(video_stats['commentCount'] or 0) != int(video.get('commentCount') or 0):
+            known = {c['commentId'] for c in video.get('comments', [])}
+            fresh = None
+            if not quota_error:
+                try:
+                    fresh = [c for c in collector.get_comments(video['videoId'], max_comments=max_comments)
+                             if c['commentId'] not in known]
+                except QuotaExceededError as e:
+                    quota_error = e
+            if fresh is None:
+                # Keep the stored count: the next refresh re-fetches this video
+                video.update({k: v for k, v in video_stats.items() if k != 'commentCount'})
+                continue
+            video['comments'] = video.get('comments', []) + fresh
+            video['commentsCount'] = len(video['comments'])
+            refetched += 1
+            new_comments += len(fresh)
+        video.update(video_stats)
+    
+    collector.save_to_files(videos, output_dir=data_dir)
+    
+    summary = {
+        'videos_polled': len(stats),
+        'videos_changed': len(changed),
+        'comments_refetched_for': refetched,
+        'new_comments': new_comments
+    }
+    print(f"   Refresh: {summary}")
+    if quota_error:
+        raise quota_error
+    return summary
+
+
+JOB_RUNNERS = {
+    'query': collect_query,
+    'channels': collect_channels,
+}
+
+
+def main(argv=None):
     """Main data collection pipeline."""
-    # Load API key
+    args = parse_args(argv)
+    
+    # Load API key (not needed when replaying from the cache)
     try:
         import config
         API_KEY = config.API_KEY
     except ImportError:
-        print("ERROR: config.py missing. Create it with your API_KEY.")
-        return
+        if not args.offline:
+            print("ERROR: config.py missing. Create it with your API_KEY.")
+            return
+        API_KEY = None
     
     # Configuration
     queries = [
@@ -282,41 +988,92 @@ def main():
         "Israel Hamas war"
     ]
     
-    collector = YouTubeCollector(API_KEY)
+    ledger = QuotaLedger()
+    cache = None if args.no_cache else ResponseCache()
+    collector = YouTubeCollector(API_KEY, ledger=ledger, cache=cache, offline=args.offline)
     all_videos = []
     
     print("=== YOUTUBE DATA COLLECTION ===")
+    if args.offline:
+        print("Mode: offline replay from data/http_cache")
     print(f"Period: 2023-10-06 to 2025-10-11")
-    print(f"Target: 100 long-form videos per query\n")
+    print(f"Target: 100 long-form videos per query")
+    print(f"Quota remaining today: {ledger.remaining()} units\n")
+    
+    if args.refresh:
+        try:
+            refresh_engagement(collector)
+        except QuotaExceededError as e:
+            print(f"\n⚠ Refresh stopped: {e}")
+        finally:
+            ledger.save()
+        usage = ledger.run_summary(collector.run_id)
+        print(f"   - Quota used: {usage['total']} units {usage['endpoints']}")
+        return
     
     # Collect videos for each query
-    for i, query in enumerate(queries, 1):
-        print(f"\n[{i}/{len(queries)}] {query}")
-        
-        videos = collect_videos_split_window(collector, query, target=100)
+    try:
+        if args.channels:
+            channel_ids = seed_channels_from_data(collector, top_n=args.channels)
+            if not channel_ids:
+                return
+            print(f"Crawling uploads of {len(channel_ids)} seed channels")
+            # One channel at a time, so the quota running out keeps the channels already done
+            for channel_id in channel_ids:
+                try:
+                    videos = collect_channels(
+                        collector, [channel_id], queries, target=channel_share(100, len(channel_ids)),
+                        published_after="2023-10-06T00:00:00Z",
+                        published_before="2025-10-11T23:59:59Z",
+                        reply_threshold=args.replies
+                    )
+                except QuotaExceededError as e:
+                    all_videos.extend(e.partial)
+                    raise
+                all_videos.extend(videos)
+                if args.stream:
+                    write_drop(videos, stream_paths()['incoming'], name='channels')
+            queries = []
         
-        # Fetch comments
-        for j, video in enumerate(videos, 1):
-            title_preview = video['title'][:50] + "..." if len(video['title']) > 50 else video['title']
-            print(f"   [{j}/{len(videos)}] {title_preview}")
+        for i, query in enumerate(queries, 1):
+            print(f"\n[{i}/{len(queries)}] {query}")
             
-            video['comments'] = collector.get_comments(video['videoId'], max_comments=30)
-            video['commentsCount'] = len(video['comments'])
+            videos = collect_videos_split_window(collector, query, target=100)
             
-            all_videos.append(video)
-            time.sleep(0.5)
-        
-        time.sleep(1)
+            # Fetch comments
+            for j, video in enumerate(videos, 1):
+                title_preview = video['title'][:50] + "..." if len(video['title']) > 50 else video['title']
+                print(f"   [{j}/{len(videos)}] {title_preview}")
+                
+                video['comments'] = collector.get_comments(video['videoId'], max_comments=30)
+                video['commentsCount'] = len(video['comments'])
+                
+                all_videos.append(video)
+                collector.pause(0.5)
+            
+            if args.replies:
+                expand_replies(collector, videos, min_replies=args.replies)
+            if args.stream:
+                write_drop(videos, stream_paths()['incoming'], name=f'query{i}')
+            
+            collector.pause(1)
+    except QuotaExceededError as e:
+        print(f"\n⚠ Stopping early: {e}")
+    finally:
+        ledger.save()
     
     # Save
     print(f"\n💾 Saving data...")
-    collector.save_to_files(all_videos, output_dir="data")
+    # A crawl adds to the data its seed channels came from
+    collector.save_to_files(all_videos, output_dir=get_data_dir(), merge=bool(args.channels))
     
     # Summary
     total_comments = sum(len(v.get('comments', [])) for v in all_videos)
+    usage = ledger.run_summary(collector.run_id)
     print(f"\n✓ Collection completed!")
     print(f"   - Videos: {len(all_videos)}")
     print(f"   - Comments: {total_comments}")
+    print(f"   - Quota used: {usage['total']} units {usage['endpoints']}")
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import json
@@ -14,27 +15,179 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent))
 import utils
 from utils import get_data_dir, get_outputs_dir
+from arrow_store import PYARROW_AVAILABLE, ArrowStore, load_frame, source_version
+from rollups import RollupCube
+from anomalies import load_anomalies
+from sketches import load_sketches
+from text_features import load_topics
+from cooccurrence import keyword_pairs, spring_layout
+from sampling import DEFAULT_FRACTION
+from chart_output import SCREEN_DPI, render_pending, save_chart, start_background_render
 import json
 
+parser = argparse.ArgumentParser(description="Create charts from collected YouTube data")
+parser.add_argument('--preview', action='store_true',
+                    help="Quick screen-resolution charts with 95%% confidence intervals from a "
+                         "stratified (query x month) sample, written to outputs/preview/")
+parser.add_argument('--fraction', type=float, default=DEFAULT_FRACTION,
+                    help="Share of the videos of each stratum sampled by --preview")
+parser.add_argument('--hires', choices=('background', 'now', 'off'), default='background',
+                    help="When to render the 300-dpi copies in outputs/hires/ (charts in outputs/ "
+                         "are saved at screen resolution; 'off' leaves them to the gallery)")
+args = parser.parse_args()
+
 # Chart configuration
 plt.style.use('default')
 
+
+# =========================
+# PREVIEW (STRATIFIED SAMPLE)
+# =========================
+if args.preview:
+    import numpy as np
+    from sampling import StratifiedSample
+
+    def error_bars(estimates):
+        """Asymmetric error bars (below, above) of a list of estimates."""
+        return [[e.value - e.low for e in estimates], [e.high - e.value for e in estimates]]
+
+    sample = StratifiedSample(load_frame('videos', ['videoId', 'title', 'channelTitle', 'query', 'publishedAt',
+                                                    'viewCount', 'likeCount'],
+                                         get_data_dir()),
+                              args.fraction)
+    preview_dir = os.path.join(get_outputs_dir(), 'preview')
+    os.makedirs(preview_dir, exist_ok=True)
+    note = f"{args.fraction:.0%} stratified sample, 95% CI"
+    print(f" CREATING PREVIEW CHARTS ({len(sample.videos)} of {sample.population_size} videos)...")
+
+    # 1. Top channels (estimated video counts)
+    channels = {c: sample.total(sample.videos['channelTitle'] == c)
+                for c in sample.videos['channelTitle'].dropna().unique()}
+    channels = sorted(channels.items(), key=lambda item: (-item[1].value, item[0]))[:10]
+    plt.figure(figsize=(12, 6))
+    if channels:
+        plt.barh(range(len(channels)), [e.value for _, e in channels], xerr=error_bars([e for _, e in channels]),
+                 capsize=3)
+        plt.yticks(range(len(channels)), [c for c, _ in channels])
+    plt.title(f'Top 10 Channels by Video Count ({note})')
+    plt.xlabel('Estimated Number of Videos')
+    plt.tight_layout()
+    plt.savefig(f'{preview_dir}/top_channels.png', dpi=SCREEN_DPI)
+    plt.close()
+
+    # 2. Keywords (estimated titles containing each keyword)
+    # Full stop list checked on the raw words, as in the keyword chart below
+    stop_words = utils.get_stop_words()
+    keywords = [{k for k in utils.tokenize_title(title, stop_words, min_length=4) if k not in stop_words}
+                for title in sample.videos['title']]
+    candidates = [k for k, _ in Counter(k for ks in keywords for k in ks).most_common(15)]
+    top_words = sorted(((k, sample.total([k in ks for ks in keywords])) for k in candidates),
+                       key=lambda item: (-item[1].value, item[0]))
+    estimates = [e for _, e in top_words]
+    plt.figure(figsize=(12, 6))
+    if top_words:
+        plt.barh(range(len(top_words)), [e.value for e in estimates], xerr=error_bars(estimates), capsize=3)
+        plt.yticks(range(len(top_words)), [k for k, _ in top_words])
+    plt.title(f'Top 15 Keywords in Titles ({note})')
+    plt.xlabel('Estimated Titles')
+    plt.tight_layout()
+    plt.savefig(f'{preview_dir}/top_words.png', dpi=SCREEN_DPI)
+    plt.close()
+
+    # 3. Mean views and likes per query
+    queries = list(sample.exact_counts('query').index)
+    fig, axes = plt.subplots(1, 2, figsize=(15, 6))
+    for ax, column, label in ((axes[0], 'viewCount', 'Mean Views'), (axes[1], 'likeCount', 'Mean Likes')):
+        values = sample.videos[column].fillna(0).to_numpy(dtype=np.float64)
+        estimates = []
+        for query in queries:
+            in_query = (sample.videos['query'] == query).to_numpy()
+            estimates.append(sample.ratio(values * in_query, in_query))
+        ax.bar(range(len(queries)), [e.value for e in estimates], yerr=error_bars(estimates), capsize=3)
+        ax.set_xticks(range(len(queries)))
+        ax.set_xticklabels(queries, rotation=45, ha='right')
+        ax.set_title(f'{label} by Keyword')
+    fig.suptitle(note)
+    plt.tight_layout()
+    plt.savefig(f'{preview_dir}/query_performance.png', dpi=SCREEN_DPI)
+    plt.close()
+
+    # 5. Timeline and 6. query distribution: strata sizes are exact
+    months = sample.exact_counts('month').sort_index()
+    months = months[months.index != '']
+    if len(months):
+        months.index = pd.PeriodIndex(months.index, freq='M')
+        months = months.reindex(pd.period_range(months.index.min(), months.index.max(), freq='M'), fill_value=0)
+    plt.figure(figsize=(14, 6))
+    plt.plot([str(m) for m in months.index], months.values, marker='o', linewidth=2, markersize=4)
+    plt.title('Evolution of Published Videos Over Time (exact)', fontsize=14, fontweight='bold')
+    plt.ylabel('Number of Videos')
+    plt.xticks(rotation=45, ha='right')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    plt.savefig(f'{preview_dir}/timeline.png', dpi=SCREEN_DPI)
+    plt.close()
+
+    query_counts = sample.exact_counts('query').sort_values(ascending=False)
+    plt.figure(figsize=(10, 8))
+    plt.pie(query_counts.values, labels=query_counts.index, autopct='%1.1f%%', startangle=90)
+    plt.title('Distribution of Search Keywords (exact)')
+    plt.tight_layout()
+    plt.savefig(f'{preview_dir}/query_distribution.png', dpi=SCREEN_DPI)
+    plt.close()
+
+    print(f" 5 preview charts saved in outputs/preview/")
+    sys.exit(0)
+
 # =========================
 # DATA LOADING
 # =========================
+# Only the fields plotted below are loaded (no descriptions or nested comments)
+VIDEO_COLUMNS = ['channelTitle', 'title', 'query', 'viewCount', 'likeCount', 'publishedAt']
+
+
+def compact_videos(df):
+    """Cast the plotted fields to compact dtypes."""
+    df = df[VIDEO_COLUMNS].copy()
+    for column in ('channelTitle', 'query'):
+        # Categories in order of appearance keep count ties ordered as before
+        df[column] = pd.Categorical(df[column], categories=df[column].dropna().unique())
+    df['title'] = df['title'].fillna('').astype(str)
+    for column in ('viewCount', 'likeCount'):
+        df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype('int64')
+    df['publishedAt'] = pd.to_datetime(df['publishedAt'], utc=True).dt.tz_localize(None)
+    return df
+
+
+def stream_videos(path):
+    """Read the plotted fields video by video, so memory does not grow with comments."""
+    frames = [pd.DataFrame(columns=VIDEO_COLUMNS)]
+    for _, rows in utils.iter_row_batches(path, kinds=('video',), fields={'video': VIDEO_COLUMNS}):
+        frames.append(compact_videos(pd.DataFrame(rows, columns=VIDEO_COLUMNS)))
+    return compact_videos(pd.concat(frames, ignore_index=True))
+
+
 # Load CSV data (supports both JSON and CSV)
 data_dir = get_data_dir()
 
 if os.path.exists(f'{data_dir}/youtube_videos.json'):
-    with open(f'{data_dir}/youtube_videos.json', 'r', encoding='utf-8') as f:
-        videos_data = json.load(f)
-    df_videos = pd.DataFrame(videos_data)
+    if PYARROW_AVAILABLE and ArrowStore(data_dir).is_current('videos'):
+        # Memory-mapped Arrow cache already built for this data version
+        df_videos = compact_videos(load_frame('videos', VIDEO_COLUMNS, data_dir))
+    else:
+        df_videos = stream_videos(f'{data_dir}/youtube_videos.json')
 else:
-    df_videos = pd.read_csv(f'{data_dir}/youtube_videos.csv')
+    df_videos = compact_videos(pd.read_csv(f'{data_dir}/youtube_videos.csv', usecols=VIDEO_COLUMNS))
 
-# Convert numeric columns
-df_videos['viewCount'] = pd.to_numeric(df_videos['viewCount'], errors='coerce')
-df_videos['likeCount'] = pd.to_numeric(df_videos['likeCount'], errors='coerce')
+# Pre-aggregated period/query/channel cells (rebuilt once if the videos file changed)
+cube = RollupCube(data_dir)
+if os.path.exists(f'{data_dir}/youtube_videos.json'):
+    videos_version = source_version(f'{data_dir}/youtube_videos.json')
+    if not cube.is_current(videos_version):
+        cube.sync((row for _, row in utils.iter_flat_rows(f'{data_dir}/youtube_videos.json', kinds=('video',))),
+                  videos_version)
+else:
+    cube.sync(pd.read_csv(f'{data_dir}/youtube_videos.csv').to_dict('records'))
 
 print(" CREATING VISUALIZATIONS...")
 
@@ -45,14 +198,16 @@ outputs_dir = get_outputs_dir()
 # 1. TOP CHANNELS
 # =========================
 plt.figure(figsize=(12, 6))
-top_channels = df_videos['channelTitle'].value_counts().head(10)
+top_channels = cube.totals('channelTitle') \
+                   .sort_values(['count', 'channelTitle'], ascending=[False, True]) \
+                   .set_index('channelTitle')['count'].head(10)
 if not top_channels.empty:
     plt.barh(range(len(top_channels)), top_channels.values)
     plt.yticks(range(len(top_channels)), top_channels.index)
     plt.title('Top 10 Channels by Video Count')
     plt.xlabel('Number of Videos')
     plt.tight_layout()
-    plt.savefig(f'{outputs_dir}/top_channels.png', dpi=300, bbox_inches='tight')
+    save_chart('top_channels.png', outputs_dir)
 plt.close()
 print(" Chart 1: Top channels created")
 
@@ -61,19 +216,14 @@ print(" Chart 1: Top channels created")
 # =========================
 plt.figure(figsize=(12, 6))
 
-# Keyword extraction using utils for consistent stemming
-all_titles = ' '.join(df_videos['title']).lower()
-all_titles = re.sub(r'#\w+', '', all_titles)  # Remove hashtags
-
-all_words = re.findall(r'\b\w+\b', all_titles)
+# Keyword extraction using utils for consistent stemming. The full stop list is
+# checked on the raw words, which the stored (analyzer) title tokens cannot redo.
 stop_words = utils.get_stop_words()
 
-normalized_words = []
-for word in all_words:
-    if len(word) > 3 and word not in stop_words:
-        norm_word = utils.normalize_keyword(word)
-        if norm_word and len(norm_word) > 3 and norm_word not in stop_words:
-            normalized_words.append(norm_word)
+normalized_words = [
+    token for title in df_videos['title'] for token in utils.tokenize_title(title, stop_words, min_length=4)
+    if token not in stop_words
+]
 
 word_counts = Counter(normalized_words)
 top_words = dict(word_counts.most_common(15))
@@ -84,17 +234,15 @@ if top_words:
     plt.title('Top 15 Keywords in Titles (Normalized)')
     plt.xlabel('Frequency')
     plt.tight_layout()
-    plt.savefig(f'{outputs_dir}/top_words.png', dpi=300, bbox_inches='tight')
+    save_chart('top_words.png', outputs_dir)
 plt.close()
 print(" Chart 2: Top keywords created")
 
 # =========================
 # 3. PERFORMANCE BY KEYWORD
 # =========================
-query_stats = df_videos.groupby('query').agg({
-    'viewCount': 'sum',
-    'likeCount': 'sum'
-})
+query_stats = cube.totals('query').set_index('query') \
+                 .rename(columns={'views': 'viewCount', 'likes': 'likeCount'})
 
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
@@ -111,7 +259,7 @@ ax2.set_xticklabels(query_stats.index, rotation=45)
 ax2.set_ylabel('Likes')
 
 plt.tight_layout()
-plt.savefig(f'{outputs_dir}/query_performance.png', dpi=300, bbox_inches='tight')
+save_chart('query_performance.png', outputs_dir)
 plt.close()
 print(" Chart 3: Performance by keyword created")
 
@@ -121,7 +269,7 @@ print(" Chart 3: Performance by keyword created")
 plt.figure(figsize=(12, 8))
 top_videos = df_videos.nlargest(8, 'viewCount')[['title', 'viewCount', 'channelTitle']]
 top_videos['short_title'] = (
-    top_videos['channelTitle'] + ': ' + top_videos['title'].str[:25] + '...'
+    top_videos['channelTitle'].astype(str) + ': ' + top_videos['title'].str[:25] + '...'
 )
 
 if not top_videos.empty:
@@ -130,7 +278,7 @@ if not top_videos.empty:
     plt.title('Top 8 Most Viewed Videos')
     plt.xlabel('Views')
     plt.tight_layout()
-    plt.savefig(f'{outputs_dir}/top_videos.png', dpi=300, bbox_inches='tight')
+    save_chart('top_videos.png', outputs_dir)
 plt.close()
 print(" Chart 4: Top videos created")
 
@@ -138,15 +286,17 @@ print(" Chart 4: Top videos created")
 # 5. TIMELINE EVOLUTION
 # =========================
 plt.figure(figsize=(14, 6))
-df_videos['published_date'] = pd.to_datetime(df_videos['publishedAt'])
+# Monthly video counts straight from the rollups
+timeline = cube.frame('month', by=()).set_index('period')['count']
+timeline.index = pd.PeriodIndex(timeline.index, freq='M')
 
-# Group by year-month for better visualization over 2-year range
-df_videos['year_month'] = df_videos['published_date'].dt.to_period('M')
-timeline = df_videos.groupby('year_month').size()
+# Complete monthly range of the data (months without videos at zero)
+if len(timeline):
+    full_range = pd.period_range(start=timeline.index.min(), end=timeline.index.max(), freq='M')
+    timeline = timeline.reindex(full_range, fill_value=0)
 
-# Create complete range from Oct 2023 to Oct 2025
-full_range = pd.period_range(start='2023-10', end='2025-10', freq='M')
-timeline = timeline.reindex(full_range, fill_value=0)
+# Months holding video spike days (stored by the analyzer's anomaly detector)
+spike_months = set(load_anomalies(data_dir).anomalies(metric='videos')['date'].str[:7])
 
 # Convert period index to strings for plotting
 timeline_dates = [str(period) for period in timeline.index]
@@ -160,6 +310,11 @@ if len(timeline_dates) > 0:
         linewidth=2,
         markersize=4
     )
+    spikes = [i for i, month in enumerate(timeline_dates) if month in spike_months]
+    if spikes:
+        plt.scatter([timeline_dates[i] for i in spikes], timeline_values[spikes],
+                    color='#CE1126', zorder=3, s=40, label='Month with video spike days')
+        plt.legend()
 
     plt.title('Evolution of Published Videos Over Time', fontsize=14, fontweight='bold')
     plt.xlabel('Month', fontsize=12)
@@ -167,7 +322,7 @@ if len(timeline_dates) > 0:
     plt.xticks(rotation=45, ha='right')
     plt.grid(True, alpha=0.3, linestyle='--')
     plt.tight_layout()
-    plt.savefig(f'{outputs_dir}/timeline.png', dpi=300, bbox_inches='tight')
+    save_chart('timeline.png', outputs_dir)
 plt.close()
 print(" Chart 5: Timeline created")
 
@@ -184,10 +339,89 @@ plt.pie(
 )
 plt.title('Distribution of Search Keywords')
 plt.tight_layout()
-plt.savefig(f'{outputs_dir}/query_distribution.png', dpi=300, bbox_inches='tight')
+save_chart('query_distribution.png', outputs_dir)
 plt.close()
 print(" Chart 6: Keyword distribution created")
 
+# =========================
+# 7. ENGAGEMENT PERCENTILES
+# =========================
+# Medians and tails from the stored sketches: means hide how heavy-tailed views are
+query_sketches = pd.DataFrame(load_sketches(data_dir).summary('query')).set_index('query')
+percentile_labels = ['p50', 'p90', 'p99']
+
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+width = 0.8 / len(percentile_labels)
+positions = range(len(query_sketches))
+
+for i, label in enumerate(percentile_labels):
+    offsets = [p + (i - 1) * width for p in positions]
+    ax1.bar(offsets, query_sketches[f'views_{label}'], width, label=label)
+    ax2.bar(offsets, query_sketches[f'comment_likes_{label}'], width, label=label)
+
+ax1.set_title('View Percentiles by Keyword')
+ax1.set_ylabel('Views (log scale)')
+ax2.set_title('Comment Like Percentiles by Keyword')
+ax2.set_ylabel('Likes per comment (log scale)')
+for ax in (ax1, ax2):
+    ax.set_yscale('symlog')
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(query_sketches.index, rotation=45)
+    ax.legend()
+
+plt.tight_layout()
+save_chart('percentiles.png', outputs_dir)
+plt.close()
+print(" Chart 7: Engagement percentiles created")
+
+# =========================
+# 8. TOPICS BY KEYWORD
+# =========================
+# NMF topics of titles and comments (stored with the sparse TF-IDF matrix)
+topics = load_topics(data_dir)
+topic_shares = topics['by']['query'].set_index('query')[topics['topics']['label']]
+
+plt.figure(figsize=(14, 6))
+sns.heatmap(topic_shares, annot=True, fmt='.0%', cmap='YlOrRd', cbar_kws={'label': 'Mean topic share'})
+plt.title('Comment and Title Topics by Search Keyword (TF-IDF / NMF)', fontsize=14, fontweight='bold')
+plt.xlabel('Topic (top terms)')
+plt.ylabel('Search keyword')
+plt.xticks(rotation=30, ha='right')
+plt.tight_layout()
+save_chart('topics.png', outputs_dir)
+plt.close()
+print(" Chart 8: Topics by keyword created")
+
+# =========================
+# 9. KEYWORD CO-OCCURRENCE NETWORK
+# =========================
+# Strongest keyword pairs (top-k per keyword, from the sparse co-occurrence matrix)
+edges = keyword_pairs(data_dir)['all'].head(40)
+positions = spring_layout(edges)
+
+fig, ax = plt.subplots(figsize=(12, 12))
+cmap = plt.cm.viridis
+pmi_range = (edges['pmi'].min(), edges['pmi'].max()) if not edges.empty else (0, 1)
+for row in edges.itertuples(index=False):
+    (x1, y1), (x2, y2) = positions[row.source], positions[row.target]
+    shade = (row.pmi - pmi_range[0]) / ((pmi_range[1] - pmi_range[0]) or 1)
+    ax.plot([x1, x2], [y1, y2], color=cmap(shade), linewidth=0.5 + 4 * row.count / edges['count'].max(), alpha=0.7)
+degree = pd.concat([edges['source'], edges['target']]).value_counts()
+for node, (x, y) in positions.items():
+    ax.scatter(x, y, s=80 + 60 * degree[node], color='steelblue', zorder=3)
+    ax.annotate(node, (x, y), xytext=(6, 6), textcoords='offset points', fontsize=10)
+sm = plt.cm.ScalarMappable(cmap=cmap, norm=plt.Normalize(*pmi_range))
+fig.colorbar(sm, ax=ax, shrink=0.6, label='PMI')
+ax.set_title('Keyword Co-occurrence Network (line width = documents, color = PMI)',
+             fontsize=14, fontweight='bold')
+ax.set_xlim(-1.15, 1.25)
+ax.set_ylim(-1.15, 1.15)
+ax.axis('off')
+plt.tight_layout()
+save_chart('keyword_network.png', outputs_dir)
+plt.close()
+print(" Chart 9: Keyword co-occurrence network created")
+
 # =========================
 # FINAL REPORT
 # =========================
@@ -200,5 +434,13 @@ print(f"   • Most popular keyword: '{df_videos['query'].value_counts().index[0
 print(f"   • Most active channel: '{df_videos['channelTitle'].value_counts().index[0] if not df_videos.empty else 'N/A'}'")
 print(f"   • Most frequent word: '{word_counts.most_common(1)[0][0] if word_counts else 'N/A'}'")
 
-print("\n 6 charts created successfully!")
-print(" All charts are saved in outputs/")
\ No newline at end of file
+print("\n 9 charts created successfully!")
+print(" All charts are saved in outputs/")
+
+# Print-quality copies: the screen versions above are all the gallery needs for display
+if args.hires == 'now':
+    render_pending(outputs_dir)
+    print(" 300-dpi copies saved in outputs/hires/")
+elif args.hires == 'background':
+    start_background_render(outputs_dir)
+    print(" 300-dpi copies are being rendered in the background into outputs/hires/")
\ No newline at end of file
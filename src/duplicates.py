@@ -0,0 +1,295 @@
+"""Near-duplicate and spam comment detection with MinHash LSH.
+
+Every comment text is reduced to a set of character shingles and then to
+a MinHash signature (NUM_PERM minimum hashes). Signatures are cut into
+LSH bands, and comments sharing any band fall in the same bucket, so
+likely near-duplicates meet without comparing every pair. Each bucket
+member is checked against the bucket's first comment by signature
+agreement (estimated Jaccard), and accepted pairs are merged into
+clusters with union-find. The work per comment is constant, so it runs
+over millions of comments in a local process pool or as a Spark job
+(see `SparkEngine.duplicates`).
+
+Results go to `data/duplicates.json`, stamped with the comments file
+version: cluster labels per comment, the clusters, and suspicious
+authors (most of whose comments are copies). Analyses can then drop
+copies and suspicious authors, or keep them.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir, get_outputs_dir
+
+DUPLICATES_FILE = 'duplicates.json'
+
+SHINGLE_SIZE = 5            # character shingles
+NUM_PERM = 128              # MinHash signature length
+BANDS = 32                  # LSH bands of NUM_PERM // BANDS rows: ~0.42 Jaccard threshold
+SIMILARITY_THRESHOLD = 0.6  # estimated Jaccard to accept a candidate pair
+MIN_TEXT_LENGTH = 10        # shorter texts ("😢", "Amen") are too short to be evidence
+
+# Suspicious author: enough comments, and most of them copies
+MIN_AUTHOR_COMMENTS = 3
+SUSPICIOUS_SHARE = 0.5
+
+BATCH_SIZE = 5000
+
+# Fixed hash family, so signatures agree across processes and Spark executors
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(42)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+
+# =============================================================================
+# SIGNATURES
+# =============================================================================
+
+def normalize_comment(text):
+    """Lowercased comment text without HTML, URLs, mentions and repeated spaces."""
+    text = html.unescape(text or '')
+    text = re.sub(r'<[^>]+>', ' ', text)
+    text = re.sub(r'https?://\S+|@\S+', ' ', text)
+    return ' '.join(text.lower().split())
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    """Character k-gram hashes of a normalized text."""
+    grams = {text[i:i + k] for i in range(max(len(text) - k + 1, 1))}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text):
+    """MinHash signature of a normalized text, or None if it is too short."""
+    if len(text) < MIN_TEXT_LENGTH:
+        return None
+    hashes = shingles(text)
+    # (a * x + b) mod p for every permutation and shingle, minimum per permutation
+    permuted = (np.outer(hashes, _A) + _B) % _MERSENNE_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    """LSH bucket key of each band of a signature."""
+    rows = NUM_PERM // BANDS
+    return [
+        band.to_bytes(1, 'big') + hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                                  digest_size=8).digest()
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def signature_batch(rows):
+    """(commentId, signature) of a batch of (commentId, text) rows; short texts are skipped."""
+    signed = []
+    for comment_id, text in rows:
+        signature = minhash(normalize_comment(text))
+        if signature is not None:
+            signed.append((comment_id, signature))
+    return signed
+
+
+def bucket_edges(members):
+    """Accepted (commentId, representative) pairs of one LSH bucket.
+
+    `members` are (commentId, signature) pairs; the representative is the
+    smallest commentId, so every partition picks the same one.
+    """
+    if len(members) < 2:
+        return []
+    members = sorted(members, key=lambda m: m[0])
+    rep_id, rep_signature = members[0]
+    return [
+        (comment_id, rep_id) for comment_id, signature in members[1:]
+        if similarity(signature, rep_signature) >= SIMILARITY_THRESHOLD
+    ]
+
+
+# =============================================================================
+# CLUSTERS
+# =============================================================================
+
+def cluster_labels(edges):
+    """Union-find over accepted pairs: commentId -> cluster id (smallest member)."""
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent.get(x, x)
+        return root
+
+    for a, b in edges:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # Smallest id becomes the root, so labels do not depend on edge order
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+
+    return {x: find(x) for edge in edges for x in edge}
+
+
+def summarize(members, author_counts):
+    """Cluster and suspicious author tables.
+
+    `members` holds videoId, commentId, author, text and cluster of each
+    labeled comment; `author_counts` maps author -> total comments.
+    """
+    clusters = (
+        members.groupby('cluster')
+               .agg(size=('commentId', 'size'),
+                    authors=('author', 'nunique'),
+                    videos=('videoId', 'nunique'))
+               .reset_index()
+    )
+    texts = members[members['commentId'] == members['cluster']][['cluster', 'text']]
+    clusters = clusters.merge(texts, on='cluster', how='left')
+    clusters = clusters.sort_values(['size', 'cluster'], ascending=[False, True]).reset_index(drop=True)
+
+    copies = members.groupby('author').agg(duplicate_comments=('commentId', 'size'),
+                                           clusters=('cluster', 'nunique')).reset_index()
+    copies['comments'] = copies['author'].map(author_counts).fillna(0).astype(int)
+    copies['duplicate_share'] = copies['duplicate_comments'] / copies['comments'].clip(lower=1)
+    suspicious = copies[(copies['comments'] >= MIN_AUTHOR_COMMENTS) &
+                        (copies['duplicate_share'] >= SUSPICIOUS_SHARE)]
+    suspicious = suspicious.sort_values(['duplicate_comments', 'author'], ascending=[False, True])
+    return clusters, suspicious[['author', 'comments', 'duplicate_comments', 'duplicate_share', 'clusters']] \
+        .reset_index(drop=True)
+
+
+class DuplicateReport:
+    """Labels, clusters and suspicious authors of a comments file."""
+
+    def __init__(self, labels, clusters, suspicious_authors):
+        self.labels = labels
+        self.clusters = clusters
+        self.suspicious_authors = suspicious_authors
+
+    @classmethod
+    def from_members(cls, members, author_counts):
+        clusters, suspicious = summarize(members, author_counts)
+        return cls(dict(zip(members['commentId'], members['cluster'])), clusters, suspicious)
+
+    @property
+    def duplicate_count(self):
+        """Comments that copy another one (cluster members beyond the first)."""
+        return len(self.labels) - len(self.clusters)
+
+    def keep_mask(self, comments):
+        """Boolean mask of comments to keep: first of each cluster, no suspicious author."""
+        cluster = comments['commentId'].map(self.labels)
+        is_copy = cluster.notna() & (cluster != comments['commentId'])
+        return ~is_copy & ~comments['author'].isin(set(self.suspicious_authors['author']))
+
+    def to_json(self):
+        return {
+            'labels': self.labels,
+            'clusters': self.clusters.to_dict(orient='list'),
+            'suspicious_authors': self.suspicious_authors.to_dict(orient='list'),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['labels'], pd.DataFrame(data['clusters']), pd.DataFrame(data['suspicious_authors']))
+
+
+# =============================================================================
+# LOCAL BATCH
+# =============================================================================
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def find_duplicates(comments, workers=None):
+    """Detect near-duplicates in a comments DataFrame with a local process pool."""
+    comments = comments.drop_duplicates(['commentId', 'videoId'])
+    rows = zip(comments['commentId'], comments['text'].fillna(''))
+
+    buckets = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for signed in pool.map(signature_batch, _batches(rows)):
+            for comment_id, signature in signed:
+                for key in band_keys(signature):
+                    buckets.setdefault(key, []).append((comment_id, signature))
+
+    edges = [edge for members in buckets.values() for edge in bucket_edges(members)]
+    labels = cluster_labels(edges)
+
+    members = comments[comments['commentId'].isin(labels.keys())][['videoId', 'commentId', 'author', 'text']]
+    members = members.drop_duplicates('commentId').assign(cluster=lambda df: df['commentId'].map(labels))
+    return DuplicateReport.from_members(members, comments['author'].value_counts())
+
+
+def save_duplicates(report, data_dir=None, version=None):
+    path = os.path.join(data_dir or get_data_dir(), DUPLICATES_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'source_version': version, **report.to_json()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_duplicates(data_dir=None, comments=None):
+    """Stored report, rebuilt when missing or older than the comments file."""
+    from arrow_store import source_version, read_source
+
+    data_dir = data_dir or get_data_dir()
+    source = os.path.join(data_dir, 'youtube_comments.json')
+    version = source_version(source)
+    try:
+        with open(os.path.join(data_dir, DUPLICATES_FILE), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored['source_version'] == version:
+            return DuplicateReport.from_json(stored)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if comments is None:
+        comments = read_source(source, 'comments')
+    report = find_duplicates(comments)
+    save_duplicates(report, data_dir, version)
+    return report
+
+
+def main():
+    """Detect near-duplicate comments and write the clusters and suspicious authors to outputs/."""
+    report = load_duplicates()
+    outputs_dir = get_outputs_dir()
+    report.clusters.to_csv(f'{outputs_dir}/duplicate_clusters.csv', index=False)
+    report.suspicious_authors.to_csv(f'{outputs_dir}/suspicious_authors.csv', index=False)
+
+    print(f"{len(report.clusters)} clusters, {report.duplicate_count} duplicate comments, "
+          f"{len(report.suspicious_authors)} suspicious authors")
+    for row in report.clusters.head(10).itertuples(index=False):
+        print(f"  {row.size:>4} × ({row.authors} authors, {row.videos} videos) {str(row.text)[:70]!r}")
+
+
+if __name__ == "__main__":
+    main()
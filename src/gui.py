@@ -4,7 +4,7 @@ Includes pipeline execution, progress tracking, and image gallery
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 from tkcalendar import DateEntry
 from PIL import Image, ImageTk, ImageEnhance
@@ -13,11 +13,18 @@ import time
 import os
 import sys
 import glob
+import shutil
 from pathlib import Path
 
 # Add src directory to path
 sys.path.insert(0, str(Path(__file__).parent))
-from utils import get_multimedia_file, get_outputs_dir
+from utils import get_data_dir, get_multimedia_file, get_outputs_dir
+from quota import QuotaLedger, estimate_run_cost
+from search_index import open_index
+from arrow_store import PYARROW_AVAILABLE, ArrowStore
+from stream_analyzer import load_snapshot, stream_paths
+from anomalies import load_anomalies
+from chart_output import hires_copy
 
 # Try to import pygame for music (optional)
 try:
@@ -42,6 +49,21 @@ COLORS = {
     'input_bg': '#F8F8F8',
 }
 
+# Number of top channels seeding the uploads crawl
+SEED_CHANNELS = 10
+
+# Minimum replies for a comment thread to be expanded
+REPLY_THRESHOLD = 5
+
+# Hits shown per search
+SEARCH_RESULTS = 20
+
+# Spike days listed per anomaly lookup
+ANOMALY_RESULTS = 50
+
+# Interval between reads of the streaming analyzer's snapshot (ms)
+STREAM_POLL_MS = 3000
+
 # Multimedia files - use get_multimedia_file utility for proper paths
 BACKGROUND_MUSIC = get_multimedia_file('Abu_Ubayda_Mawtini.mp3')
 BACKGROUND_IMAGE = get_multimedia_file('photo_2025-12-31_11-31-41.jpg')
@@ -81,6 +103,7 @@ class PipelineExecutor:
         self.config = config
         self.progress_callback = progress_callback
         self.complete_callback = complete_callback
+        self.deferred = []
         
     def run(self):
         """Run the complete pipeline."""
@@ -91,12 +114,24 @@ class PipelineExecutor:
             
             self.progress_callback("Collecting videos...", 10)
             success = self.run_collector()
+            if not success and self.deferred:
+                # Nothing fit today's budget: the jobs wait for the quota reset, the data is unchanged
+                self.progress_callback("Deferred", 100)
+                self.complete_callback(True, f"No job fits today's quota: {len(self.deferred)} job(s) deferred "
+                                             f"to {self.deferred[0]['not_before']}. They run on the next start "
+                                             f"after the quota resets.")
+                return
             if not success:
                 self.complete_callback(False, "Collection failed")
                 return
             
+            # Convert the JSON once; analyzer and visualizer memory-map the result
+            if PYARROW_AVAILABLE:
+                self.progress_callback("Building columnar cache...", 37)
+                ArrowStore().ensure()
+            
             # Stage 2: Analysis
-            self.progress_callback("Analyzing data with PySpark...", 40)
+            self.progress_callback("Analyzing data...", 40)
             success = self.run_analyzer()
             if not success:
                 self.complete_callback(False, "Analysis failed")
@@ -119,52 +154,64 @@ class PipelineExecutor:
     def run_collector(self):
         """Execute data collector with GUI parameters."""
         try:
-            from data_collector import YouTubeCollector
-            import config as api_config
-            import time as time_module
+            from data_collector import (
+                YouTubeCollector, build_channel_jobs, build_query_jobs, run_query_jobs,
+                seed_channels_from_data
+            )
+            from http_cache import ResponseCache
+            from quota import QuotaLedger, QuotaScheduler
+            
+            offline = self.config.get('offline', False)
+            try:
+                import config as api_config
+                api_key = api_config.API_KEY
+            except ImportError:
+                if not offline:
+                    raise
+                api_key = None
             
-            collector = YouTubeCollector(api_config.API_KEY)
-            all_videos = []
+            ledger = QuotaLedger()
+            scheduler = QuotaScheduler(ledger)
+            collector = YouTubeCollector(api_key, ledger=ledger, cache=ResponseCache(), offline=offline)
             
             queries = self.config['queries']
-            start_date = self.config['start_date'] + 'T00:00:00Z'
-            end_date = self.config['end_date'] + 'T23:59:59Z'
-            videos_per_query = self.config['videos_per_query']
             
             print(f"\n=== COLLECTION PARAMETERS ===")
             print(f"Queries: {queries}")
             print(f"Date range: {self.config['start_date']} to {self.config['end_date']}")
-            print(f"Videos per query: {videos_per_query}")
+            print(f"Videos per query: {self.config['videos_per_query']}")
+            print(f"Quota remaining today: {ledger.remaining()} units")
+            if offline:
+                print("Mode: offline replay from data/http_cache")
             
-            for i, query in enumerate(queries):
-                progress = 10 + (i / len(queries)) * 25
-                self.progress_callback(f"Collecting: {query[:30]}...", progress)
-                
-                # Use search_videos with date parameters
-                videos = []
-                target = videos_per_query
-                
-                # Fetch videos with date range
-                while len(videos) < target:
-                    video_batch = collector.search_videos(
-                        query,
-                        max_results=min(target - len(videos), 50),
-                        published_after=start_date,
-                        published_before=end_date
-                    )
-                    videos.extend(video_batch)
-                    if len(video_batch) < 50:
-                        break
-                
-                videos = videos[:target]  # Limit to target
-                
-                for video in videos:
-                    video['comments'] = collector.get_comments(video['videoId'], max_comments=30)
-                    video['commentsCount'] = len(video['comments'])
-                    all_videos.append(video)
-                    time_module.sleep(0.3)
+            def on_job(job, i, total):
+                progress = 10 + (i / max(total, 1)) * 25
+                self.progress_callback(f"Collecting: {job['payload'].get('query', job['name'])[:30]}...", progress)
+            
+            if self.config.get('seed_channels'):
+                channel_ids = seed_channels_from_data(collector, top_n=self.config['seed_channels'])
+                if not channel_ids:
+                    return False
+                print(f"Seed channels: {len(channel_ids)}")
+                jobs = build_channel_jobs(self.config, channel_ids)
+            else:
+                jobs = build_query_jobs(self.config)
+            # Feed the streaming analyzer when it is running (it creates its incoming directory)
+            incoming = stream_paths()['incoming']
+            stream_dir = incoming if os.path.isdir(incoming) else None
+            all_videos, deferred = run_query_jobs(collector, scheduler, jobs, on_job, stream_dir=stream_dir)
+            self.deferred = deferred
             
-            collector.save_to_files(all_videos, output_dir="data")
+            usage = ledger.run_summary(collector.run_id)
+            print(f"Quota used by this run: {usage['total']} units {usage['endpoints']}")
+            if deferred:
+                print(f"{len(deferred)} job(s) deferred to the next quota day")
+            
+            if not all_videos:
+                return False
+            
+            # Deferred jobs resume on later days: add to the collected data, do not replace it
+            collector.save_to_files(all_videos, output_dir=get_data_dir(), merge=True)
             return True
             
         except Exception as e:
@@ -280,6 +327,35 @@ class ImageGallery(tk.Frame):
         )
         self.next_btn.pack(side='left', padx=10)
         
+        # The 300-dpi copy is only opened for these two
+        self.zoom_btn = tk.Button(
+            nav_frame,
+            text="🔍 Zoom",
+            font=('Arial', 11),
+            bg=COLORS['accent'],
+            fg=COLORS['bg'],
+            relief='flat',
+            padx=20,
+            pady=10,
+            command=self.zoom_image,
+            state='disabled'
+        )
+        self.zoom_btn.pack(side='left', padx=10)
+        
+        self.export_btn = tk.Button(
+            nav_frame,
+            text="💾 Export",
+            font=('Arial', 11),
+            bg=COLORS['accent'],
+            fg=COLORS['bg'],
+            relief='flat',
+            padx=20,
+            pady=10,
+            command=self.export_image,
+            state='disabled'
+        )
+        self.export_btn.pack(side='left', padx=10)
+        
     def load_images(self):
         """Load all images from outputs directory."""
         outputs_dir = get_outputs_dir()
@@ -305,8 +381,8 @@ class ImageGallery(tk.Frame):
         if self.images:
             self.current_index = 0
             self.show_current_image()
-            self.prev_btn.config(state='normal')
-            self.next_btn.config(state='normal')
+            for button in (self.prev_btn, self.next_btn, self.zoom_btn, self.export_btn):
+                button.config(state='normal')
         else:
             self.counter_label.config(text="No images found in outputs/")
         
@@ -333,6 +409,71 @@ class ImageGallery(tk.Frame):
             self.current_index += 1
             self.show_current_image()
     
+    def _with_hires_copy(self, img_data, callback):
+        """Call `callback(path)` with a chart's print copy, rendering it on a worker thread if pending."""
+        path = hires_copy(img_data['path'], render=False)
+        if path != img_data['path']:
+            callback(path)
+            return
+        
+        self.counter_label.config(text=f"Rendering 300-dpi copy of {img_data['name']}...")
+        self.zoom_btn.config(state='disabled')
+        self.export_btn.config(state='disabled')
+        
+        def done(path):
+            self.zoom_btn.config(state='normal')
+            self.export_btn.config(state='normal')
+            self.show_current_image()
+            callback(path)
+        
+        def render():
+            path = hires_copy(img_data['path'])
+            self.after(0, lambda: done(path))
+        
+        threading.Thread(target=render, daemon=True).start()
+    
+    def zoom_image(self):
+        """Show the print-resolution copy of the current chart at full size, scrollable."""
+        if not self.images:
+            return
+        img_data = self.images[self.current_index]
+        self._with_hires_copy(img_data, lambda path: self._show_zoom(img_data, path))
+    
+    def _show_zoom(self, img_data, path):
+        window = tk.Toplevel(self)
+        window.title(f"{img_data['name']} ({'300 dpi' if path != img_data['path'] else 'screen resolution'})")
+        window.geometry("1000x700")
+        canvas = tk.Canvas(window, bg=COLORS['bg'])
+        x_scroll = tk.Scrollbar(window, orient='horizontal', command=canvas.xview)
+        y_scroll = tk.Scrollbar(window, orient='vertical', command=canvas.yview)
+        canvas.configure(xscrollcommand=x_scroll.set, yscrollcommand=y_scroll.set)
+        x_scroll.pack(side='bottom', fill='x')
+        y_scroll.pack(side='right', fill='y')
+        canvas.pack(fill='both', expand=True)
+        
+        window.photo = ImageTk.PhotoImage(Image.open(path))  # kept alive with the window
+        canvas.create_image(0, 0, image=window.photo, anchor='nw')
+        canvas.configure(scrollregion=canvas.bbox('all'))
+        
+    def export_image(self):
+        """Save the print-resolution copy of the current chart."""
+        if not self.images:
+            return
+        img_data = self.images[self.current_index]
+        target = filedialog.asksaveasfilename(
+            initialfile=img_data['name'],
+            defaultextension='.png',
+            filetypes=[('PNG image', '*.png')]
+        )
+        if not target:
+            return
+        
+        def copy(path):
+            shutil.copyfile(path, target)
+            print(f"✓ Exported: {target}")
+        
+        self._with_hires_copy(img_data, copy)
+    
     def _on_left_arrow(self, event):
         """Handle left arrow key press."""
         self.prev_image()
@@ -355,6 +496,7 @@ class YouTubeDataCollectorGUI:
         # State
         self.current_view = 'config'
         self.background_photo = None
+        self.search_index = None  # opened on the first search, reset after a collection
         
         # Initialize music
         if PYGAME_AVAILABLE and os.path.exists(BACKGROUND_MUSIC):
@@ -460,7 +602,7 @@ class YouTubeDataCollectorGUI:
         # Videos per query
         self.create_section_header(main_frame, "Videos per Query", row=5)
         video_frame = tk.Frame(main_frame, bg=COLORS['bg'])
-        video_frame.grid(row=6, column=0, sticky='w', pady=(5, 30))
+        video_frame.grid(row=6, column=0, sticky='w', pady=(5, 15))
         
         tk.Label(video_frame, text="Number of videos:", font=('Arial', 10), bg=COLORS['bg'], fg=COLORS['fg']).grid(row=0, column=0, sticky='w', padx=(0, 10))
         self.videos_per_query_var = tk.IntVar(value=100)
@@ -468,9 +610,22 @@ class YouTubeDataCollectorGUI:
         self.video_spinbox.grid(row=0, column=1)
         tk.Label(video_frame, text="(Max: 100)", font=('Arial', 9, 'italic'), fg='#666666', bg=COLORS['bg']).grid(row=0, column=2, padx=(10, 0))
         
+        # Collection options
+        options_frame = tk.Frame(main_frame, bg=COLORS['bg'])
+        options_frame.grid(row=7, column=0, sticky='w', pady=(0, 15))
+        
+        self.offline_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_frame, text="Offline replay (cached API responses only)", variable=self.offline_var, font=('Arial', 10), bg=COLORS['bg'], fg=COLORS['fg'], activebackground=COLORS['bg']).grid(row=0, column=0, sticky='w')
+        
+        self.channel_crawl_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_frame, text="Crawl uploads of top collected channels (cheaper than search)", variable=self.channel_crawl_var, font=('Arial', 10), bg=COLORS['bg'], fg=COLORS['fg'], activebackground=COLORS['bg']).grid(row=1, column=0, sticky='w')
+        
+        self.replies_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_frame, text=f"Expand reply threads (≥{REPLY_THRESHOLD} replies)", variable=self.replies_var, font=('Arial', 10), bg=COLORS['bg'], fg=COLORS['fg'], activebackground=COLORS['bg']).grid(row=2, column=0, sticky='w')
+        
         # Buttons
         button_frame = tk.Frame(main_frame, bg=COLORS['bg'])
-        button_frame.grid(row=7, column=0, sticky='ew')
+        button_frame.grid(row=8, column=0, sticky='ew')
         
         self.start_button = tk.Button(
             button_frame,
@@ -511,7 +666,7 @@ class YouTubeDataCollectorGUI:
         
         # Center content with semi-transparent background
         center_bg = tk.Frame(self.progress_frame, bg='white', highlightbackground=COLORS['primary'], highlightthickness=2)
-        center_bg.place(relx=0.5, rely=0.5, anchor='center', width=500, height=300)
+        center_bg.place(relx=0.5, rely=0.5, anchor='center', width=500, height=360)
         
         center = tk.Frame(center_bg, bg='white', padx=30, pady=30)
         center.pack(fill='both', expand=True)
@@ -550,6 +705,18 @@ class YouTubeDataCollectorGUI:
         )
         self.progress_percent.pack()
         
+        # Live aggregates from stream_analyzer.py, when it runs alongside the collection
+        self.stream_label = tk.Label(
+            center,
+            text="",
+            font=('Arial', 10),
+            fg=COLORS['accent'],
+            bg='white',
+            justify='left',
+            wraplength=430
+        )
+        self.stream_label.pack(pady=(15, 0))
+        
         # Style the progress bar
         style = ttk.Style()
         style.theme_use('default')
@@ -589,6 +756,38 @@ class YouTubeDataCollectorGUI:
         self.gallery = ImageGallery(gallery_container)
         self.gallery.pack(fill='both', expand=True)
         
+        # Full-text search over collected titles and comments
+        search_frame = tk.Frame(self.gallery_frame, bg='white', padx=10, pady=5)
+        search_frame.pack(fill='x', padx=20)
+        
+        self.search_entry = tk.Entry(search_frame, font=('Arial', 10), bg=COLORS['input_bg'], fg=COLORS['fg'], relief='solid', borderwidth=1)
+        self.search_entry.pack(side='left', fill='x', expand=True, padx=(0, 10))
+        self.search_entry.bind('<Return>', lambda event: self.run_search())
+        
+        tk.Button(
+            search_frame,
+            text="Search",
+            font=('Arial', 10),
+            bg=COLORS['primary'],
+            fg=COLORS['bg'],
+            activebackground='#005A25',
+            relief='flat',
+            padx=15,
+            command=self.run_search
+        ).pack(side='left')
+        
+        tk.Button(
+            search_frame,
+            text="Spikes",
+            font=('Arial', 10),
+            bg=COLORS['secondary'],
+            fg=COLORS['bg'],
+            activebackground='#A50E1F',
+            relief='flat',
+            padx=15,
+            command=self.show_anomalies
+        ).pack(side='left', padx=(10, 0))
+        
         # Back button
         tk.Button(
             self.gallery_frame,
@@ -602,6 +801,82 @@ class YouTubeDataCollectorGUI:
             command=self.stop_music_and_return
         ).pack(pady=10)
     
+    def run_search(self):
+        """Query the search index and show ranked hits in a popup."""
+        query = self.search_entry.get().strip()
+        if not query:
+            return
+        
+        try:
+            start = time.perf_counter()
+            if self.search_index is None:
+                self.search_index = open_index()
+            hits = self.search_index.search(query, k=SEARCH_RESULTS)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            messagebox.showerror("Search", f"Search failed: {e}")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Search: {query}")
+        window.geometry("700x450")
+        window.configure(bg=COLORS['bg'])
+        
+        tk.Label(
+            window,
+            text=f"{len(hits)} results in {elapsed_ms:.1f} ms",
+            font=('Arial', 10, 'italic'),
+            fg='#666666',
+            bg=COLORS['bg']
+        ).pack(anchor='w', padx=10, pady=5)
+        
+        results = tk.Text(window, font=('Arial', 10), wrap='word', bg=COLORS['bg'], fg=COLORS['fg'], relief='flat')
+        results.tag_configure('header', font=('Arial', 10, 'bold'), foreground=COLORS['primary'])
+        results.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        
+        for hit in hits:
+            who = f"@{hit['author']}" if hit['type'] == 'comment' else hit.get('channelTitle', '')
+            results.insert('end', f"[{hit['score']:.2f}] {hit['type']} - {who} - {hit['title'][:60]}\n", 'header')
+            results.insert('end', f"{hit['snippet']}\n\n")
+        if not hits:
+            results.insert('end', "No matches.")
+        results.config(state='disabled')
+    
+    def show_anomalies(self):
+        """List the detected spike days, filtered by the query typed in the search box."""
+        text = self.search_entry.get().strip().lower()
+        detector = load_anomalies()
+        queries = [q for q in detector.queries() if text in q.lower()]
+        spikes = detector.anomalies()
+        spikes = spikes[spikes['query'].isin(queries)].head(ANOMALY_RESULTS)
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Spikes: {text}" if text else "Spikes")
+        window.geometry("700x450")
+        window.configure(bg=COLORS['bg'])
+        
+        tk.Label(
+            window,
+            text=f"{len(spikes)} spike days ({detector.first_day} to {detector.last_day}) - "
+                 f"{', '.join(queries) or 'no matching query'}",
+            font=('Arial', 10, 'italic'),
+            fg='#666666',
+            bg=COLORS['bg'],
+            wraplength=680,
+            justify='left'
+        ).pack(anchor='w', padx=10, pady=5)
+        
+        results = tk.Text(window, font=('Arial', 10), wrap='word', bg=COLORS['bg'], fg=COLORS['fg'], relief='flat')
+        results.tag_configure('header', font=('Arial', 10, 'bold'), foreground=COLORS['secondary'])
+        results.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        
+        for row in spikes.itertuples(index=False):
+            results.insert('end', f"{row.date} - {row.query} [{row.metric}]\n", 'header')
+            results.insert('end', f"{row.value:.2f} (expected {row.expected:.2f}, z = {row.zscore:+.1f})\n\n")
+        if spikes.empty:
+            results.insert('end', "No spikes. Run the analysis first.")
+        results.config(state='disabled')
+    
     def stop_music_and_return(self):
         """Stop music and return to config."""
         if PYGAME_AVAILABLE:
@@ -674,7 +949,10 @@ class YouTubeDataCollectorGUI:
             'queries': queries,
             'start_date': start.strftime('%Y-%m-%d'),
             'end_date': end.strftime('%Y-%m-%d'),
-            'videos_per_query': count
+            'videos_per_query': count,
+            'offline': self.offline_var.get(),
+            'seed_channels': SEED_CHANNELS if self.channel_crawl_var.get() else 0,
+            'reply_threshold': REPLY_THRESHOLD if self.replies_var.get() else None
         }
         
     def start_pipeline(self):
@@ -683,6 +961,15 @@ class YouTubeDataCollectorGUI:
         if not config:
             return
         
+        # Estimate API cost against today's budget
+        estimate = estimate_run_cost(config)
+        remaining = QuotaLedger().remaining()
+        quota_note = ""
+        if config['offline']:
+            estimate['total'] = 0
+        elif estimate['total'] > remaining:
+            quota_note = "Queries that do not fit today will be deferred to the next day.\n\n"
+        
         # Confirm
         confirm = messagebox.askyesno(
             "Start Processing",
@@ -690,7 +977,9 @@ class YouTubeDataCollectorGUI:
             f"• {len(config['queries'])} queries\n"
             f"• {config['start_date']} to {config['end_date']}\n"
             f"• {config['videos_per_query']} videos per query\n"
-            f"• Target: {len(config['queries']) * config['videos_per_query']} videos\n\n"
+            f"• Target: {len(config['queries']) * config['videos_per_query']} videos\n"
+            f"• Estimated quota: ~{estimate['total']} units ({remaining} left today)\n\n"
+            f"{quota_note}"
             f"This may take several minutes. Continue?"
         )
         
@@ -708,6 +997,7 @@ class YouTubeDataCollectorGUI:
         # Show progress view
         self.show_view('progress')
         self.progress_bar['value'] = 0
+        self.poll_stream_snapshot()
         
         # Run pipeline in thread
         executor = PipelineExecutor(
@@ -729,12 +1019,31 @@ class YouTubeDataCollectorGUI:
         self.progress_bar['value'] = percent
         self.progress_percent.config(text=f"{int(percent)}%")
         
+    def poll_stream_snapshot(self):
+        """Show the streaming analyzer's latest snapshot while the progress view is open."""
+        if self.current_view != 'progress':
+            return
+        snapshot = load_snapshot()
+        if snapshot and snapshot['videos']:
+            queries = ", ".join(f"{q['query']}: {q['videos']}" for q in snapshot['queries'][:5])
+            keywords = ", ".join(k['keyword'] for k in snapshot['keywords'][:8])
+            channel = snapshot['channels'][0]['channelTitle'] if snapshot['channels'] else "-"
+            self.stream_label.config(
+                text=f"Live (batch {snapshot['batch_id']}): {snapshot['videos']} videos\n"
+                     f"{queries}\n"
+                     f"Top channel: {channel}\n"
+                     f"Keywords: {keywords}"
+            )
+        self.root.after(STREAM_POLL_MS, self.poll_stream_snapshot)
+        
     def pipeline_complete(self, success, message):
         """Handle pipeline completion (thread-safe)."""
         self.root.after(0, lambda: self._show_completion(success, message))
         
     def _show_completion(self, success, message):
         """Show completion and switch to gallery."""
+        # The collection added documents through its own index instance
+        self.search_index = None
         if success:
             messagebox.showinfo("Success", message)
             self.gallery.load_images()
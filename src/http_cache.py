@@ -0,0 +1,119 @@
+"""On-disk cache of YouTube API responses with ETag revalidation."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils import get_data_dir
+
+# Seconds a cached response is served without revalidation
+CACHE_TTLS = {
+    'search': 6 * 3600,
+    'videos': 3600,
+    'commentThreads': 3600,
+    'comments': 3600,
+    'channels': 24 * 3600,
+    'playlistItems': 3600,
+}
+DEFAULT_TTL = 3600
+
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Parameters that never take part in the cache key
+EXCLUDED_PARAMS = {'key'}
+
+
+def cache_key(endpoint, params):
+    """Stable key for an endpoint and its parameters (API key excluded)."""
+    items = sorted((k, str(v)) for k, v in params.items() if k not in EXCLUDED_PARAMS)
+    raw = json.dumps([endpoint, items], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded response store, one JSON file per request.
+
+    Entries older than their endpoint TTL are revalidated with
+    `If-None-Match`; when the cache grows past `max_bytes` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, ttls=None, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir or os.path.join(get_data_dir(), 'http_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.ttls = dict(CACHE_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def _scan(self):
+        """Yield (path, size, mtime) of every cache entry."""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def get(self, endpoint, params):
+        """Return the cached entry for a request, or None."""
+        path = self._path(cache_key(endpoint, params))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        """Check whether an entry is still within its endpoint TTL."""
+        ttl = self.ttls.get(entry.get('endpoint'), DEFAULT_TTL)
+        return time.time() - entry.get('fetched_at', 0) < ttl
+
+    def put(self, endpoint, params, body, etag=None):
+        """Store a response body and evict old entries if needed."""
+        entry = {
+            'endpoint': endpoint,
+            'params': {k: v for k, v in params.items() if k not in EXCLUDED_PARAMS},
+            'etag': etag,
+            'fetched_at': time.time(),
+            'body': body,
+        }
+        path = self._path(cache_key(endpoint, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path) - old_size
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def revalidated(self, endpoint, params, entry):
+        """Restart the TTL of an entry confirmed by a 304 response."""
+        self.put(endpoint, params, entry['body'], entry.get('etag'))
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of the limit."""
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self._scan(), key=lambda e: e[2]):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
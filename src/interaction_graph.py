@@ -0,0 +1,221 @@
+"""Author–video interaction network: bipartite graph, projections, communities.
+
+An author is linked to every video they commented on. The bipartite
+incidence matrix B (authors × videos) is sparse. Its projections,
+B Bᵀ (authors who commented on the same videos) and Bᵀ B (videos
+sharing commenters), are single sparse products. Connected components
+come from `scipy.sparse.csgraph` and communities from label propagation
+over the weighted projections. Everything is done on CSR matrices, so
+memory follows the number of edges.
+
+In the author projection, each video adds 1 / (commenters - 1) to each
+pair of its commenters (Newman's collaboration weighting), so one busy
+video does not bind all of its commenters together. Videos with more
+than MAX_PROJECTED_DEGREE commenters are left out of it, because their
+pair count grows with the square of their commenters.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_outputs_dir
+
+MAX_PROJECTED_DEGREE = 1000
+LABEL_PROPAGATION_ROUNDS = 20
+SEED = 0
+
+
+# =============================================================================
+# GRAPH
+# =============================================================================
+
+class InteractionGraph:
+    """Bipartite author–video graph built from (author, videoId) comment edges."""
+
+    def __init__(self, edges):
+        edges = edges.dropna(subset=['author', 'videoId'])
+        edges = edges[(edges['author'] != '') & (edges['videoId'] != '')]
+        author_codes, self.authors = pd.factorize(edges['author'], sort=True)
+        video_codes, self.videos = pd.factorize(edges['videoId'], sort=True)
+        ones = np.ones(len(edges), dtype=np.float64)
+        weights = edges['comments'].to_numpy(dtype=np.float64) if 'comments' in edges.columns else ones
+        # Comment counts per (author, video); duplicates are summed
+        self.comments = sparse.csr_matrix((weights, (author_codes, video_codes)),
+                                          shape=(len(self.authors), len(self.videos)))
+        self.incidence = self.comments.copy()
+        self.incidence.data[:] = 1
+
+    @property
+    def edge_count(self):
+        return self.incidence.nnz
+
+    def author_projection(self, max_degree=MAX_PROJECTED_DEGREE):
+        """Author × author weights: shared videos, each worth 1 / (commenters - 1)."""
+        video_degree = np.asarray(self.incidence.sum(axis=0)).ravel()
+        scale = np.where((video_degree > 1) & (video_degree <= max_degree),
+                         1 / np.maximum(video_degree - 1, 1), 0)
+        projection = (self.incidence @ sparse.diags(scale) @ self.incidence.T).tocsr()
+        projection.setdiag(0)
+        projection.eliminate_zeros()
+        return projection
+
+    def video_projection(self):
+        """Video × video weights: number of shared commenters."""
+        projection = (self.incidence.T @ self.incidence).tocsr()
+        projection.setdiag(0)
+        projection.eliminate_zeros()
+        return projection
+
+    def bipartite_components(self):
+        """Component labels of authors and videos in the bipartite graph."""
+        n_authors = len(self.authors)
+        adjacency = sparse.bmat([[None, self.incidence], [self.incidence.T, None]], format='csr')
+        count, labels = csgraph.connected_components(adjacency, directed=False)
+        return count, labels[:n_authors], labels[n_authors:]
+
+
+# =============================================================================
+# ANALYTICS
+# =============================================================================
+
+def degree_distribution(degrees):
+    """Number of nodes per degree."""
+    values, counts = np.unique(np.asarray(degrees).ravel(), return_counts=True)
+    return pd.DataFrame({'degree': values.astype('int64'), 'nodes': counts.astype('int64')})
+
+
+def label_propagation(adjacency, rounds=LABEL_PROPAGATION_ROUNDS, seed=SEED):
+    """Community labels by weighted label propagation on a symmetric sparse graph.
+
+    Each round, half of the nodes (chosen at random) take the label with
+    the largest total edge weight among their neighbors, ties going to the
+    smallest label. Updating half at a time avoids the oscillations of
+    fully synchronous updates on bipartite-like structures.
+    """
+    n = adjacency.shape[0]
+    labels = np.arange(n)
+    rng = np.random.RandomState(seed)
+    coo = adjacency.tocoo()
+    has_neighbors = np.diff(adjacency.indptr) > 0
+
+    for _ in range(rounds):
+        # Weight of each (node, neighbor label) pair, summed
+        votes = pd.DataFrame({'node': coo.row, 'label': labels[coo.col], 'weight': coo.data})
+        votes = votes.groupby(['node', 'label'], as_index=False)['weight'].sum()
+        best = votes.sort_values(['node', 'weight', 'label'], ascending=[True, False, True]) \
+                    .drop_duplicates('node')
+        proposed = labels.copy()
+        proposed[best['node'].to_numpy()] = best['label'].to_numpy()
+
+        if np.array_equal(proposed, labels):
+            break
+        update = (rng.rand(n) < 0.5) & has_neighbors
+        labels = np.where(update, proposed, labels)
+
+    # Renumber communities by decreasing size
+    _, codes, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[codes]
+
+
+def modularity(adjacency, labels):
+    """Newman modularity of a partition of a weighted undirected graph."""
+    total = adjacency.sum()
+    if not total:
+        return 0.0
+    membership = sparse.csr_matrix((np.ones(len(labels)), (np.arange(len(labels)), labels)))
+    within = (membership.T @ adjacency @ membership).diagonal().sum()
+    degree = np.asarray(membership.T @ adjacency.sum(axis=1)).ravel()
+    return float(within / total - ((degree / total) ** 2).sum())
+
+
+def community_table(names, labels, degrees, name):
+    """Community sizes with their best-connected members."""
+    nodes = pd.DataFrame({name: names, 'community': labels,
+                          'degree': np.asarray(degrees).ravel().astype('int64')})
+    nodes = nodes.sort_values(['community', 'degree', name], ascending=[True, False, True])
+    table = nodes.groupby('community').agg(size=(name, 'size'),
+                                           top_members=(name, lambda s: ', '.join(s.head(5))))
+    return nodes, table.reset_index()
+
+
+def analyze(edges):
+    """Degree distributions, components and communities of the interaction network.
+
+    `edges` has one row per (author, videoId), optionally with a
+    `comments` count and the video's `channelTitle`.
+    """
+    graph = InteractionGraph(edges)
+    authors = graph.author_projection()
+    videos = graph.video_projection()
+
+    n_bipartite, author_component, video_component = graph.bipartite_components()
+    n_author_components, _ = csgraph.connected_components(authors, directed=False)
+    n_video_components, _ = csgraph.connected_components(videos, directed=False)
+    component_sizes = np.bincount(np.concatenate([author_component, video_component]))
+
+    author_labels = label_propagation(authors)
+    video_labels = label_propagation(videos)
+    author_nodes, author_communities = community_table(
+        graph.authors, author_labels, graph.incidence.sum(axis=1), 'author')
+    video_nodes, video_communities = community_table(
+        graph.videos, video_labels, graph.incidence.sum(axis=0), 'videoId')
+    if 'channelTitle' in edges.columns:
+        # Video communities read better by their channels than by video ids
+        channels = edges.drop_duplicates('videoId').set_index('videoId')['channelTitle']
+        video_nodes['channelTitle'] = video_nodes['videoId'].map(channels)
+        video_communities['top_channels'] = video_communities['community'].map(
+            video_nodes.groupby('community')['channelTitle']
+                       .agg(lambda s: ', '.join(s.value_counts().head(3).index)))
+
+    summary = {
+        'authors': len(graph.authors),
+        'videos': len(graph.videos),
+        'edges': graph.edge_count,
+        'author_edges': authors.nnz // 2,
+        'video_edges': videos.nnz // 2,
+        'bipartite_components': int(n_bipartite),
+        'largest_component_share': float(component_sizes.max() / component_sizes.sum()) if len(component_sizes) else 0.0,
+        'author_components': int(n_author_components),
+        'video_components': int(n_video_components),
+        'author_communities': int(author_labels.max() + 1) if len(author_labels) else 0,
+        'video_communities': int(video_labels.max() + 1) if len(video_labels) else 0,
+        'author_modularity': modularity(authors, author_labels),
+        'video_modularity': modularity(videos, video_labels),
+    }
+    return {
+        'summary': summary,
+        'degrees': {
+            'author_videos': degree_distribution(graph.incidence.sum(axis=1)),
+            'video_authors': degree_distribution(graph.incidence.sum(axis=0)),
+            'author_projection': degree_distribution(np.diff(authors.indptr)),
+            'video_projection': degree_distribution(np.diff(videos.indptr)),
+        },
+        'author_nodes': author_nodes,
+        'video_nodes': video_nodes,
+        'author_communities': author_communities,
+        'video_communities': video_communities,
+    }
+
+
+def save_results(results, outputs_dir=None):
+    """Write the network summary, degree distributions and communities to outputs/."""
+    outputs_dir = outputs_dir or get_outputs_dir()
+    with open(os.path.join(outputs_dir, 'interaction_network.json'), 'w', encoding='utf-8') as f:
+        json.dump(results['summary'], f, indent=2)
+    degrees = pd.concat([table.assign(distribution=name) for name, table in results['degrees'].items()],
+                        ignore_index=True)
+    degrees[['distribution', 'degree', 'nodes']].to_csv(
+        os.path.join(outputs_dir, 'interaction_degrees.csv'), index=False)
+    results['author_nodes'].to_csv(os.path.join(outputs_dir, 'author_communities.csv'), index=False)
+    results['video_nodes'].to_csv(os.path.join(outputs_dir, 'video_communities.csv'), index=False)
@@ -0,0 +1,91 @@
+"""Append-only, delta-encoded time series of video engagement metrics."""
+
+import json
+import os
+from datetime import datetime, timezone
+
+from utils import get_data_dir
+
+METRICS = ('viewCount', 'likeCount', 'commentCount')
+TIMESERIES_FILE = 'metrics_timeseries.ndjson'
+
+
+def utc_timestamp(dt=None):
+    """ISO-8601 UTC timestamp in the API's format."""
+    dt = dt or datetime.now(timezone.utc)
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class MetricsTimeSeries:
+    """Engagement snapshots keyed by videoId and timestamp.
+
+    Each NDJSON line holds the change of every metric since the previous
+    line of the same video (the first line of a video is its absolute
+    value), so unchanged videos cost nothing and the file is only ever
+    appended to. Absolute values are rebuilt with a cumulative sum.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_data_dir(), TIMESERIES_FILE)
+        self._latest = None
+
+    def _iter_rows(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def latest(self):
+        """Return the current absolute metrics of every tracked video."""
+        if self._latest is None:
+            self._latest = {}
+            for row in self._iter_rows():
+                current = self._latest.setdefault(row['videoId'], dict.fromkeys(METRICS, 0))
+                for metric in METRICS:
+                    current[metric] += row.get(metric, 0)
+                current['ts'] = row['ts']
+        return self._latest
+
+    def append(self, snapshots, timestamp=None):
+        """Append absolute snapshots ({videoId, viewCount, ...}) as deltas.
+
+        Returns the IDs of videos whose metrics changed (or are new).
+        """
+        timestamp = timestamp or utc_timestamp()
+        latest = self.latest()
+        changed = []
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for snap in snapshots:
+                video_id = snap['videoId']
+                previous = latest.get(video_id)
+                values = {m: int(snap.get(m) or 0) for m in METRICS}
+                deltas = {m: values[m] - (previous[m] if previous else 0) for m in METRICS}
+
+                if previous and not any(deltas.values()):
+                    continue
+
+                row = {'videoId': video_id, 'ts': timestamp}
+                row.update({m: d for m, d in deltas.items() if d})
+                f.write(json.dumps(row) + '\n')
+
+                latest[video_id] = dict(values, ts=timestamp)
+                changed.append(video_id)
+
+        return changed
+
+    def history(self, video_id=None):
+        """Return absolute metrics over time as a DataFrame (videoId, ts, metrics)."""
+        import pandas as pd
+
+        rows = [r for r in self._iter_rows() if video_id is None or r['videoId'] == video_id]
+        df = pd.DataFrame(rows, columns=['videoId', 'ts', *METRICS]).fillna(0)
+        if df.empty:
+            return df
+        df[list(METRICS)] = df[list(METRICS)].astype('int64')
+        df[list(METRICS)] = df.groupby('videoId')[list(METRICS)].cumsum()
+        df['ts'] = pd.to_datetime(df['ts'])
+        return df
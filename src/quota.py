@@ -0,0 +1,294 @@
+"""Quota accounting and budget-aware scheduling for the YouTube Data API."""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from utils import get_data_dir
+
+# The API quota resets at midnight Pacific time
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# =============================================================================
+# COST TABLE
+# =============================================================================
+
+# Units charged per request (YouTube Data API v3)
+QUOTA_COSTS = {
+    'search': 100,
+    'videos': 1,
+    'commentThreads': 1,
+    'comments': 1,
+    'channels': 1,
+    'playlistItems': 1,
+}
+
+DAILY_QUOTA = 10000
+LEDGER_FILE = 'quota_ledger.json'
+
+# Share of search results dropped by the Shorts filter (used for estimates)
+SHORTS_RATIO = 0.3
+SEARCH_PAGE_SIZE = 50
+
+# Share of comment threads with at least N replies, taken as REPLY_THREAD_RATIO / N
+# (used to estimate reply expansion)
+REPLY_THREAD_RATIO = 0.2
+
+
+class QuotaExceededError(Exception):
+    """Raised when a request does not fit in the remaining daily budget.
+
+    Job runners attach the videos they had fully collected (and paid for)
+    before the refusal as `partial`.
+    """
+
+    partial = ()
+
+
+def quota_day(now=None):
+    """Return the quota day (YYYY-MM-DD, Pacific time) of a timestamp."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(QUOTA_TZ).strftime('%Y-%m-%d')
+
+
+def next_quota_day(day=None):
+    """Return the quota day following `day` (default: today)."""
+    day = day or quota_day()
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def is_quota_error(data):
+    """Check whether an API response body reports an exhausted quota."""
+    errors = data.get('error', {}).get('errors', []) if isinstance(data, dict) else []
+    return any(e.get('reason') in ('quotaExceeded', 'dailyLimitExceeded') for e in errors)
+
+
+# =============================================================================
+# LEDGER
+# =============================================================================
+
+class QuotaLedger:
+    """Persistent record of API units spent per day, endpoint and run."""
+
+    def __init__(self, path=None, daily_budget=DAILY_QUOTA):
+        self.path = path or os.path.join(get_data_dir(), LEDGER_FILE)
+        self.daily_budget = daily_budget
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        """Load the ledger file, starting empty if missing or unreadable."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('days', {})
+                data.setdefault('runs', {})
+                data.setdefault('deferred', [])
+                data.setdefault('exhausted', [])
+                return data
+            except (OSError, ValueError) as e:
+                print(f"Could not read quota ledger ({e}), starting a new one")
+        return {'days': {}, 'runs': {}, 'deferred': [], 'exhausted': []}
+
+    def save(self):
+        """Write the ledger atomically."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def record(self, endpoint, run_id=None, units=None):
+        """Charge one request to today's totals (and to the run, if given)."""
+        if units is None:
+            units = QUOTA_COSTS.get(endpoint, 1)
+        day = quota_day()
+        with self._lock:
+            day_totals = self.data['days'].setdefault(day, {})
+            day_totals[endpoint] = day_totals.get(endpoint, 0) + units
+            if run_id:
+                run = self.data['runs'].setdefault(run_id, {'day': day, 'endpoints': {}})
+                run['endpoints'][endpoint] = run['endpoints'].get(endpoint, 0) + units
+        return units
+
+    def mark_exhausted(self, day=None):
+        """Flag a day as exhausted after the API refused a request."""
+        day = day or quota_day()
+        with self._lock:
+            if day not in self.data['exhausted']:
+                self.data['exhausted'].append(day)
+
+    def used(self, day=None):
+        """Units spent on a given quota day."""
+        return sum(self.data['days'].get(day or quota_day(), {}).values())
+
+    def remaining(self, day=None):
+        """Units left on a given quota day."""
+        day = day or quota_day()
+        if day in self.data['exhausted']:
+            return 0
+        return max(self.daily_budget - self.used(day), 0)
+
+    def can_afford(self, units):
+        """Check whether `units` still fit in today's budget."""
+        return units <= self.remaining()
+
+    def run_summary(self, run_id):
+        """Return per-endpoint and total units of a run."""
+        endpoints = dict(self.data['runs'].get(run_id, {}).get('endpoints', {}))
+        return {'run_id': run_id, 'endpoints': endpoints, 'total': sum(endpoints.values())}
+
+
+# =============================================================================
+# COST ESTIMATION
+# =============================================================================
+
+def estimate_reply_calls(n_comments, reply_threshold=None, max_replies=100):
+    """Expected `comments` calls of expanding the threads with at least `reply_threshold` replies.
+
+    Each expanded thread is paged 100 replies per call, up to `max_replies`.
+    """
+    if not reply_threshold:
+        return 0
+    threads = math.ceil(n_comments * min(REPLY_THREAD_RATIO / reply_threshold, 1.0))
+    return threads * max(1, math.ceil(max_replies / 100))
+
+
+def estimate_query_cost(videos_target, max_comments=30, reply_threshold=None):
+    """Estimate the units needed to collect one query.
+
+    Each search page costs 100 units plus one `videos` call per result
+    (Shorts are filtered after the details call), and every kept video
+    needs one `commentThreads` page per 100 comments, plus the reply
+    calls of its popular threads when replies are expanded.
+    """
+    kept_per_page = SEARCH_PAGE_SIZE * (1 - SHORTS_RATIO)
+    pages = max(1, math.ceil(videos_target / kept_per_page))
+    comment_pages = max(1, math.ceil(max_comments / 100)) if max_comments else 0
+    return {
+        'search': pages * QUOTA_COSTS['search'],
+        'videos': pages * SEARCH_PAGE_SIZE * QUOTA_COSTS['videos'],
+        'commentThreads': videos_target * comment_pages * QUOTA_COSTS['commentThreads'],
+        'comments': estimate_reply_calls(videos_target * max_comments, reply_threshold)
+                    * QUOTA_COSTS['comments'],
+    }
+
+
+def estimate_channel_crawl_cost(n_channels, videos_target, max_comments=30, max_pages=20,
+                                reply_threshold=None):
+    """Upper-bound the units of a channel-uploads crawl.
+
+    Uploads playlists cost one unit per 50 videos, and video details are
+    fetched 50 IDs per call, so discovery is roughly 100x cheaper than
+    paging `search`.
+    """
+    playlist_pages = n_channels * max_pages
+    comment_pages = max(1, math.ceil(max_comments / 100)) if max_comments else 0
+    return {
+        'channels': math.ceil(n_channels / 50) * QUOTA_COSTS['channels'],
+        'playlistItems': playlist_pages * QUOTA_COSTS['playlistItems'],
+        'videos': playlist_pages * QUOTA_COSTS['videos'],
+        'commentThreads': videos_target * comment_pages * QUOTA_COSTS['commentThreads'],
+        'comments': estimate_reply_calls(videos_target * max_comments, reply_threshold)
+                    * QUOTA_COSTS['comments'],
+    }
+
+
+def estimate_run_cost(config, max_comments=30):
+    """Estimate the cost of a GUI configuration before it starts."""
+    if config.get('seed_channels'):
+        # One crawl job per channel, each taking its share of every query
+        n_channels = config['seed_channels']
+        share = math.ceil(config['videos_per_query'] / n_channels)
+        totals = {endpoint: units * n_channels for endpoint, units in
+                  estimate_channel_crawl_cost(1, len(config['queries']) * share, max_comments,
+                                              reply_threshold=config.get('reply_threshold')).items()}
+        totals['total'] = sum(totals.values())
+        totals['per_query'] = {}
+        return totals
+    
+    per_query = {}
+    totals = {}
+    for query in config['queries']:
+        cost = estimate_query_cost(config['videos_per_query'], max_comments, config.get('reply_threshold'))
+        per_query[query] = sum(cost.values())
+        for endpoint, units in cost.items():
+            totals[endpoint] = totals.get(endpoint, 0) + units
+    totals['total'] = sum(per_query.values())
+    totals['per_query'] = per_query
+    return totals
+
+
+# =============================================================================
+# SCHEDULING
+# =============================================================================
+
+class QuotaScheduler:
+    """Plans jobs by priority within the remaining daily budget.
+
+    A job is a JSON-serializable dict with `name`, `priority` (lower runs
+    first), `cost` (estimated units) and a free-form `payload`. Jobs that
+    do not fit today are deferred to the next quota day instead of failing.
+    A `scope` keeps deferred jobs apart when several pipelines (e.g. batch
+    configurations writing to their own directories) share one ledger.
+    """
+
+    def __init__(self, ledger, scope=None):
+        self.ledger = ledger
+        self.scope = scope
+
+    def due_jobs(self):
+        """Remove and return deferred jobs of this scope whose day has come."""
+        today = quota_day()
+        due = [j for j in self.ledger.data['deferred']
+               if j.get('not_before', today) <= today and j.get('scope') == self.scope]
+        self.ledger.data['deferred'] = [j for j in self.ledger.data['deferred'] if j not in due]
+        return due
+
+    def plan(self, jobs):
+        """Split due deferred jobs plus `jobs` into (runnable, deferred).
+
+        A job rebuilt by a rerun of the configuration that deferred it is
+        planned once, as the deferred copy (which keeps its `deferrals`).
+        """
+        candidates = []
+        seen = set()
+        for job in self.due_jobs() + list(jobs):
+            key = (job['name'], json.dumps(job.get('payload'), sort_keys=True))
+            if key not in seen:
+                seen.add(key)
+                candidates.append(job)
+        candidates.sort(key=lambda j: j.get('priority', 0))
+
+        budget = self.ledger.remaining()
+        runnable, deferred = [], []
+        for job in candidates:
+            if job['cost'] <= budget:
+                runnable.append(job)
+                budget -= job['cost']
+            else:
+                deferred.append(job)
+
+        self.defer(deferred)
+        self.ledger.save()
+        return runnable, deferred
+
+    def defer(self, jobs):
+        """Push jobs to the next quota day and persist them."""
+        if not jobs:
+            return
+        next_day = next_quota_day()
+        for job in jobs:
+            if self.scope:
+                job['scope'] = self.scope
+            job['not_before'] = next_day
+            job['deferrals'] = job.get('deferrals', 0) + 1
+        self.ledger.data['deferred'].extend(jobs)
+        self.ledger.save()
@@ -0,0 +1,117 @@
+"""Compact record types for videos and comments held during collection.
+
+Records use `__slots__` (no per-instance dict) and intern the strings
+repeated across many records, which keeps long collection runs small and
+cheap for the garbage collector. They support the mapping operations the
+pipeline uses on plain dicts (`record['field']`, `get`, `update`, ...),
+so code written for the JSON dicts works on both.
+"""
+
+import sys
+
+_MISSING = object()
+
+
+class Record:
+    """Base of slotted records with a dict-like interface."""
+
+    __slots__ = ()
+    INTERNED = ()
+
+    def __init__(self, fields=None, **kwargs):
+        self.update(fields or {}, **kwargs)
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.__slots__ else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(f"{type(self).__name__} has no field '{key}'")
+        if key in self.INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, fields=(), **kwargs):
+        items = fields.items() if hasattr(fields, 'items') else fields
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def to_dict(self):
+        """Plain dict of the fields that are set."""
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Comment(Record):
+    """A top-level comment or a reply (`parentId` set)."""
+
+    __slots__ = (
+        'videoId', 'commentId', 'author', 'text', 'likeCount', 'publishedAt',
+        'parentId', 'totalReplyCount', 'sentimentScore', 'sentiment'
+    )
+    INTERNED = ('videoId', 'author')
+
+
+class Video(Record):
+    """A collected video; `comments` holds Comment records."""
+
+    __slots__ = (
+        'videoId', 'title', 'description', 'publishedAt', 'channelTitle', 'channelId',
+        'query', 'durationVal', 'viewCount', 'likeCount', 'commentCount', 'tags',
+        'duration', 'definition', 'comments', 'commentsCount', 'titleTokens', 'tokensVersion'
+    )
+    INTERNED = ('channelTitle', 'channelId', 'query')
+
+    def to_dict(self):
+        data = super().to_dict()
+        if 'comments' in data:
+            data['comments'] = [as_dict(c) for c in data['comments']]
+        return data
+
+
+def as_dict(record):
+    """Plain dict of a record; dicts are returned as they are unless they hold records."""
+    if isinstance(record, Record):
+        return record.to_dict()
+    comments = record.get('comments')
+    if comments and any(isinstance(c, Record) for c in comments):
+        return dict(record, comments=[as_dict(c) for c in comments])
+    return record
+
+
+def to_columns(records, fields=None):
+    """Columnar batch (field -> list of values) of records or dicts.
+
+    Without `fields`, columns are the union of the fields set, in first-seen
+    order; missing values are None.
+    """
+    if fields is None:
+        fields = list(dict.fromkeys(key for record in records for key in record.keys()))
+    return {field: [record.get(field) for record in records] for field in fields}
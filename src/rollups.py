@@ -0,0 +1,164 @@
+"""Materialized rollups of video metrics by period, query and channel.
+
+Cells hold count, views, likes and comments per (period, query, channel)
+at day, week and month grain, so charts read a few hundred cells instead
+of re-grouping every video. The contribution of each (video, query) row
+is kept separately, which lets `sync` apply only the rows that changed,
+appeared or disappeared since the last save.
+"""
+
+import json
+import os
+from datetime import date
+
+import pandas as pd
+
+from utils import get_data_dir
+
+ROLLUP_DIR = 'rollups'
+GRAINS = ('day', 'week', 'month')
+MEASURES = ('count', 'views', 'likes', 'comments')
+DIMENSIONS = ('query', 'channelTitle')
+
+
+def period_keys(published_at):
+    """Day, ISO week and month keys of an API timestamp."""
+    day = date.fromisoformat(published_at[:10])
+    year, week, _ = day.isocalendar()
+    return {
+        'day': day.isoformat(),
+        'week': f'{year}-W{week:02d}',
+        'month': day.strftime('%Y-%m'),
+    }
+
+
+def _int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def contributions(videos):
+    """Aggregate video rows into member contributions keyed by (videoId, query)."""
+    members = {}
+    for video in videos:
+        if not video.get('publishedAt'):
+            continue
+        key = f"{video['videoId']}\t{video.get('query') or ''}"
+        values = [_int(video.get('viewCount')), _int(video.get('likeCount')), _int(video.get('commentCount'))]
+        if key in members:
+            member = members[key]
+            member[2] += 1
+            member[3:] = [a + b for a, b in zip(member[3:], values)]
+        else:
+            members[key] = [video['publishedAt'][:10], video.get('channelTitle') or '', 1, *values]
+    return members
+
+
+class RollupCube:
+    """Rollup cells on disk, updated incrementally from saved videos."""
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or get_data_dir()
+        self.rollup_dir = os.path.join(self.data_dir, ROLLUP_DIR)
+        self._cube = None
+
+    def _path(self, name):
+        return os.path.join(self.rollup_dir, f'{name}.json')
+
+    def _load(self, name, default):
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _save(self, name, data):
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        path = self._path(name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = self._load('cube', self._empty())
+        return self._cube
+
+    @staticmethod
+    def _empty():
+        return {'source_version': None, 'generation': 0, 'cells': {g: {} for g in GRAINS}}
+
+    def is_current(self, source_version):
+        """Check whether the cube was built from this version of the videos file."""
+        return self.cube.get('source_version') == source_version
+
+    def _apply(self, member, query, sign):
+        day, channel, *measures = member
+        periods = period_keys(day)
+        for grain in GRAINS:
+            cells = self.cube['cells'][grain]
+            cell_key = f'{periods[grain]}\t{query}\t{channel}'
+            cell = cells.setdefault(cell_key, [0] * len(MEASURES))
+            for i, value in enumerate(measures):
+                cell[i] += sign * value
+            if not cell[0]:
+                del cells[cell_key]
+
+    def sync(self, videos, source_version=None):
+        """Make the cells match `videos`, touching only changed rows.
+
+        Returns the number of (video, query) rows added, updated or removed.
+        """
+        stored = self._load('members', {'generation': 0, 'members': {}})
+        if stored['generation'] != self.cube['generation']:
+            # Interrupted save: cells and members disagree, rebuild from scratch
+            self._cube = self._empty()
+            stored = {'generation': 0, 'members': {}}
+        old_members = stored['members']
+        new_members = contributions(videos)
+        changed = 0
+
+        for key in old_members.keys() | new_members.keys():
+            old, new = old_members.get(key), new_members.get(key)
+            if old == new:
+                continue
+            query = key.split('\t', 1)[1]
+            if old:
+                self._apply(old, query, -1)
+            if new:
+                self._apply(new, query, 1)
+            changed += 1
+
+        # Members first: a crash before the cube is saved leaves mismatched generations
+        self.cube['generation'] += 1
+        self.cube['source_version'] = source_version
+        self._save('members', {'generation': self.cube['generation'], 'members': new_members})
+        self._save('cube', self.cube)
+        return changed
+
+    def frame(self, grain='month', by=DIMENSIONS):
+        """Cells at a grain, rolled up to the `by` dimensions, as a DataFrame."""
+        rows = [
+            [*key.split('\t'), *values]
+            for key, values in self.cube['cells'][grain].items()
+        ]
+        df = pd.DataFrame(rows, columns=['period', *DIMENSIONS, *MEASURES])
+        return df.groupby(['period', *by], as_index=False)[list(MEASURES)].sum()
+
+    def totals(self, by):
+        """Measures over all periods, by one or more dimensions."""
+        by = [by] if isinstance(by, str) else list(by)
+        df = self.frame('month', by)
+        return df.groupby(by, as_index=False)[list(MEASURES)].sum()
+
+
+def update_rollups(videos, data_dir=None, source_version=None):
+    """Sync the rollups of a data directory with the videos just saved."""
+    cube = RollupCube(data_dir)
+    changed = cube.sync(videos, source_version)
+    print(f"   Rollups: {changed} video rows updated")
+    return cube
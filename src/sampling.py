@@ -0,0 +1,140 @@
+"""Stratified samples of the collected videos, with design-based estimates.
+
+Preview runs draw a fixed fraction of the (video, query) rows in every
+query × month stratum. At least two rows are drawn from each stratum that
+has them, so each stratum's variance can be estimated. Comments follow
+their sampled videos (a cluster sample). Counts, means and shares are
+estimated with the usual stratified estimators (a video listed under
+several queries shares its comments equally among its rows, so each
+comment is counted once in the population):
+
+    total   T = Σ_h N_h ȳ_h
+    Var(T)  = Σ_h N_h² (1 - n_h / N_h) s_h² / n_h
+
+Ratios (e.g. the share of negative comments) are estimated as the
+quotient of two totals, with a linearized variance. Every estimate comes
+with a normal 95% confidence interval. Strata sizes N_h are exact, so
+counts per query and per month carry no sampling error.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_FRACTION = 0.1
+STRATA = ('query', 'month')
+Z_95 = 1.96
+
+
+class Estimate(namedtuple('Estimate', ['value', 'low', 'high'])):
+    """Point estimate with its 95% confidence interval."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_variance(cls, value, variance, z=Z_95, non_negative=False):
+        half = z * np.sqrt(max(variance, 0.0))
+        low = max(value - half, 0.0) if non_negative else value - half
+        return cls(float(value), float(low), float(value + half))
+
+    def format(self, spec=',.0f'):
+        return f"{self.value:{spec}} [{self.low:{spec}} ; {self.high:{spec}}]"
+
+
+class StratifiedSample:
+    """Stratified random sample of video rows by query and month."""
+
+    def __init__(self, videos, fraction=DEFAULT_FRACTION, seed=0, strata=STRATA):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"Sampling fraction must be in (0, 1], got {fraction}")
+        self.fraction = fraction
+        self.strata = list(strata)
+        videos = videos.assign(month=videos['publishedAt'].str[:7])
+        videos[self.strata] = videos[self.strata].fillna('')
+
+        self.population = videos.groupby(self.strata).size().rename('N')
+        sizes = np.minimum(self.population, np.maximum(np.round(self.population * fraction), 2)).astype(int)
+
+        rng = np.random.RandomState(seed)
+        # Random order within each stratum; the first n_h rows are the sample
+        order = videos.assign(_key=rng.rand(len(videos))).sort_values(self.strata + ['_key'])
+        rank = order.groupby(self.strata).cumcount()
+        n_h = order.set_index(self.strata).index.map(sizes)
+        self.videos = order[rank.to_numpy() < np.asarray(n_h)].drop(columns='_key').reset_index(drop=True)
+        # Population rows (one per query) of each video
+        self.video_rows = videos['videoId'].value_counts()
+
+        self.size = sizes.rename('n')
+        design = pd.concat([self.population, self.size], axis=1)
+        keys = self.videos.set_index(self.strata).index
+        self._stratum = pd.factorize(keys)[0]
+        stratum_design = design.loc[keys]
+        self._N = stratum_design['N'].to_numpy(dtype=np.float64)
+        self._n = stratum_design['n'].to_numpy(dtype=np.float64)
+        # Expansion weight of each sampled row
+        self.weights = self._N / self._n
+
+    @property
+    def population_size(self):
+        return int(self.population.sum())
+
+    def comments_of(self, comments):
+        """Comments of the sampled videos, with the position of their video row.
+
+        A comment is repeated once per sampled (video, query) row of its
+        video (`comment` is its position in `comments`). Its `weight` is
+        its share in each row: 1 / the video's number of population rows.
+        """
+        rows = self.videos[['videoId']].reset_index().rename(columns={'index': 'row'})
+        comments = comments.reset_index(drop=True).rename_axis('comment').reset_index().merge(rows, on='videoId')
+        comments['weight'] = 1.0 / comments['videoId'].map(self.video_rows).to_numpy(dtype=np.float64)
+        return comments
+
+    def per_row(self, values, comments):
+        """Weighted sum of comment-level `values` per sampled video row (0 for rows without comments).
+
+        `comments` comes from `comments_of`.
+        """
+        values = np.asarray(values, dtype=np.float64) * comments['weight'].to_numpy()
+        return np.bincount(comments['row'].to_numpy(), weights=values, minlength=len(self.videos))
+
+    def _variance(self, y):
+        """Variance of the stratified total of the row values `y`."""
+        y = pd.Series(np.asarray(y, dtype=np.float64))
+        groups = y.groupby(self._stratum)
+        s2 = groups.var(ddof=1).fillna(0.0).to_numpy()
+        first = groups.head(1).index
+        N, n = self._N[first], self._n[first]
+        return float((N ** 2 * (1 - n / N) * s2 / n).sum())
+
+    def total(self, y):
+        """Population total of a per-row variable."""
+        y = np.asarray(y, dtype=np.float64)
+        return Estimate.from_variance((self.weights * y).sum(), self._variance(y), non_negative=(y >= 0).all())
+
+    def mean(self, y):
+        """Population mean per video row of a per-row variable."""
+        N = self.population_size
+        total = self.total(y)
+        return Estimate(total.value / N, total.low / N, total.high / N)
+
+    def share(self, mask):
+        """Share of video rows satisfying a per-row condition."""
+        return self.mean(np.asarray(mask, dtype=np.float64))
+
+    def ratio(self, numerator, denominator):
+        """Ratio of two population totals (e.g. a per-comment mean), linearized variance."""
+        numerator = np.asarray(numerator, dtype=np.float64)
+        denominator = np.asarray(denominator, dtype=np.float64)
+        den_total = (self.weights * denominator).sum()
+        if not den_total:
+            return Estimate(float('nan'), float('nan'), float('nan'))
+        ratio = (self.weights * numerator).sum() / den_total
+        residual = numerator - ratio * denominator
+        return Estimate.from_variance(ratio, self._variance(residual) / den_total ** 2,
+                                      non_negative=(numerator >= 0).all() and (denominator >= 0).all())
+
+    def exact_counts(self, stratum):
+        """Exact video rows per query or per month (strata sizes are known)."""
+        return self.population.groupby(level=stratum).sum()
@@ -0,0 +1,376 @@
+"""On-disk inverted index with BM25 ranking over titles, descriptions and comments.
+
+Layout of the index directory:
+    meta.json            document count, total length, segment list
+    docs.ndjson          one metadata line per document (id order)
+    seg-NNNN/lexicon.json   term -> [offset, length, document frequency]
+    seg-NNNN/postings.bin   varint-encoded (doc id gap, term frequency) pairs
+
+New documents go into a new segment, so updates never rewrite existing
+postings; segments are merged once there are too many of them.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import time
+from array import array
+from collections import Counter, defaultdict
+from heapq import nlargest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir, get_stop_words, iter_flat_rows, normalize_keyword
+
+INDEX_DIR = 'search_index'
+MAX_SEGMENTS = 8
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_LENGTH = 160
+
+
+# =============================================================================
+# TOKENIZATION
+# =============================================================================
+
+_STOP_WORDS = get_stop_words()
+
+
+def tokenize(text):
+    """Normalized index terms of a text (same rules for documents and queries)."""
+    if not text:
+        return []
+    text = re.sub(r'<br\s*/?>', ' ', text)
+    terms = []
+    for word in re.findall(r'\b\w+\b', text.lower()):
+        if len(word) <= 2 or word in _STOP_WORDS:
+            continue
+        term = normalize_keyword(word)
+        if term and len(term) > 2:
+            terms.append(term)
+    return terms
+
+
+# =============================================================================
+# POSTING LIST COMPRESSION
+# =============================================================================
+
+def encode_postings(postings):
+    """Varint-encode sorted (doc_id, tf) pairs as (gap, tf)."""
+    out = bytearray()
+    previous = 0
+    for doc_id, tf in postings:
+        for value in (doc_id - previous, tf):
+            while value >= 0x80:
+                out.append((value & 0x7F) | 0x80)
+                value >>= 7
+            out.append(value)
+        previous = doc_id
+    return bytes(out)
+
+
+def decode_postings(data):
+    """Yield (doc_id, tf) pairs from a varint-encoded posting list."""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+
+    doc_id = 0
+    for i in range(0, len(values), 2):
+        doc_id += values[i]
+        yield doc_id, values[i + 1]
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class SearchIndex:
+    """Segmented inverted index with incremental updates and BM25 search."""
+
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or os.path.join(get_data_dir(), INDEX_DIR)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.meta = self._load_meta()
+        self._load_docs()
+        self._segments = {}
+
+    # --- persistence -------------------------------------------------------
+
+    def _load_meta(self):
+        path = os.path.join(self.index_dir, 'meta.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'n_docs': 0, 'total_length': 0, 'segments': [], 'next_segment': 0}
+
+    def _save_meta(self):
+        path = os.path.join(self.index_dir, 'meta.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, path)
+
+    def _load_docs(self):
+        """Read document lengths, keys and line offsets (not the metadata itself)."""
+        self.doc_lengths = array('I')
+        self.doc_offsets = array('Q')
+        self.doc_types = []
+        self.doc_keys = set()
+        self._docs_end = 0
+        path = os.path.join(self.index_dir, 'docs.ndjson')
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if len(self.doc_offsets) >= self.meta['n_docs']:
+                    break  # Ignore lines of an interrupted update
+                doc = json.loads(line)
+                self.doc_offsets.append(offset)
+                self.doc_lengths.append(doc['length'])
+                self.doc_types.append(doc['type'])
+                self.doc_keys.add(doc['key'])
+                offset += len(line)
+        self._docs_end = offset
+
+    def _segment(self, name):
+        """Lexicon and memory-loaded postings of a segment (cached)."""
+        if name not in self._segments:
+            seg_dir = os.path.join(self.index_dir, name)
+            with open(os.path.join(seg_dir, 'lexicon.json'), 'r', encoding='utf-8') as f:
+                lexicon = json.load(f)
+            with open(os.path.join(seg_dir, 'postings.bin'), 'rb') as f:
+                postings = f.read()
+            self._segments[name] = (lexicon, postings)
+        return self._segments[name]
+
+    def _write_segment(self, postings_by_term):
+        name = f"seg-{self.meta['next_segment']:04d}"
+        self.meta['next_segment'] += 1
+        seg_dir = os.path.join(self.index_dir, name)
+        os.makedirs(seg_dir, exist_ok=True)
+
+        lexicon = {}
+        with open(os.path.join(seg_dir, 'postings.bin'), 'wb') as f:
+            offset = 0
+            for term in sorted(postings_by_term):
+                postings = sorted(postings_by_term[term])
+                data = encode_postings(postings)
+                f.write(data)
+                lexicon[term] = [offset, len(data), len(postings)]
+                offset += len(data)
+        with open(os.path.join(seg_dir, 'lexicon.json'), 'w', encoding='utf-8') as f:
+            json.dump(lexicon, f, ensure_ascii=False)
+        return name
+
+    # --- updates -----------------------------------------------------------
+
+    def add_documents(self, documents):
+        """Index new documents; already indexed keys are skipped.
+
+        Each document is a dict with `key`, `type` and `text`, plus any
+        metadata to return with hits. Returns the number of documents added.
+        """
+        postings_by_term = defaultdict(list)
+        added = 0
+        docs_path = os.path.join(self.index_dir, 'docs.ndjson')
+
+        with open(docs_path, 'ab') as f:
+            # Drop lines left behind by an interrupted update
+            f.truncate(self._docs_end)
+            offset = self._docs_end
+            for doc in documents:
+                if doc['key'] in self.doc_keys:
+                    continue
+                terms = tokenize(doc['text'])
+                doc_id = self.meta['n_docs'] + added
+
+                for term, tf in Counter(terms).items():
+                    postings_by_term[term].append((doc_id, tf))
+
+                record = {k: v for k, v in doc.items() if k != 'text'}
+                record['snippet'] = doc['text'][:SNIPPET_LENGTH]
+                record['length'] = len(terms)
+                line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+                f.write(line)
+
+                self.doc_offsets.append(offset)
+                self.doc_lengths.append(len(terms))
+                self.doc_types.append(doc['type'])
+                self.doc_keys.add(doc['key'])
+                offset += len(line)
+                self.meta['total_length'] += len(terms)
+                added += 1
+            self._docs_end = offset
+
+        if added:
+            self.meta['segments'].append(self._write_segment(postings_by_term))
+            self.meta['n_docs'] += added
+            self._save_meta()
+            if len(self.meta['segments']) > MAX_SEGMENTS:
+                self.compact()
+        return added
+
+    def compact(self):
+        """Merge all segments into one."""
+        merged = defaultdict(list)
+        for name in self.meta['segments']:
+            lexicon, data = self._segment(name)
+            for term, (offset, length, _) in lexicon.items():
+                merged[term].extend(decode_postings(data[offset:offset + length]))
+
+        old_segments = self.meta['segments']
+        self.meta['segments'] = [self._write_segment(merged)]
+        self._save_meta()
+        for name in old_segments:
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        self._segments = {}
+
+    # --- queries -----------------------------------------------------------
+
+    def _document(self, doc_id):
+        with open(os.path.join(self.index_dir, 'docs.ndjson'), 'rb') as f:
+            f.seek(self.doc_offsets[doc_id])
+            return json.loads(f.readline())
+
+    def search(self, query, k=10, doc_type=None):
+        """Return the top-k documents for a query, ranked by BM25."""
+        n_docs = self.meta['n_docs']
+        if not n_docs:
+            return []
+        avg_length = self.meta['total_length'] / n_docs or 1.0
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = []
+            for name in self.meta['segments']:
+                lexicon, data = self._segment(name)
+                entry = lexicon.get(term)
+                if entry:
+                    offset, length, _ = entry
+                    postings.extend(decode_postings(data[offset:offset + length]))
+            if not postings:
+                continue
+
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        candidates = scores.items()
+        if doc_type:
+            candidates = [(d, s) for d, s in candidates if self.doc_types[d] == doc_type]
+
+        hits = []
+        for doc_id, score in nlargest(k, candidates, key=lambda item: item[1]):
+            doc = self._document(doc_id)
+            doc['score'] = round(score, 4)
+            hits.append(doc)
+        return hits
+
+
+# =============================================================================
+# PIPELINE INTEGRATION
+# =============================================================================
+
+def documents_from_videos(videos):
+    """Index documents for videos (title + description) and their comments."""
+    for video in videos:
+        yield {
+            'key': f"v:{video['videoId']}",
+            'type': 'video',
+            'videoId': video['videoId'],
+            'title': video.get('title', ''),
+            'channelTitle': video.get('channelTitle', ''),
+            'text': f"{video.get('title', '')}\n{video.get('description', '')}",
+        }
+        for comment in video.get('comments', []):
+            yield {
+                'key': f"c:{comment['commentId']}",
+                'type': 'comment',
+                'videoId': video['videoId'],
+                'commentId': comment['commentId'],
+                'title': video.get('title', ''),
+                'author': comment.get('author', ''),
+                'text': comment.get('text') or '',
+            }
+
+
+def documents_from_rows(rows):
+    """Index documents from flat ('video', row) / ('comment', row) pairs.
+
+    Comment documents take the title of their video, which precedes them
+    in the stream.
+    """
+    titles = {}
+    for kind, row in rows:
+        if kind == 'video':
+            titles[row['videoId']] = row.get('title', '')
+            yield {
+                'key': f"v:{row['videoId']}",
+                'type': 'video',
+                'videoId': row['videoId'],
+                'title': row.get('title', ''),
+                'channelTitle': row.get('channelTitle', ''),
+                'text': f"{row.get('title', '')}\n{row.get('description', '')}",
+            }
+        else:
+            yield {
+                'key': f"c:{row['commentId']}",
+                'type': 'comment',
+                'videoId': row['videoId'],
+                'commentId': row['commentId'],
+                'title': titles.get(row['videoId'], ''),
+                'author': row.get('author', ''),
+                'text': row.get('text') or '',
+            }
+
+
+def update_index(videos, index_dir=None):
+    """Add newly collected videos and comments to the index."""
+    index = SearchIndex(index_dir)
+    added = index.add_documents(documents_from_videos(videos))
+    print(f"   Search index: +{added} documents ({index.meta['n_docs']} total)")
+    return index
+
+
+def open_index(index_dir=None, data_dir=None):
+    """Open the index, building it from the collected data on first use."""
+    index = SearchIndex(index_dir)
+    videos_path = f'{data_dir or get_data_dir()}/youtube_videos.json'
+    if not index.meta['n_docs'] and os.path.exists(videos_path):
+        # Stream the archive rather than loading it whole
+        index.add_documents(documents_from_rows(iter_flat_rows(videos_path)))
+        print(f"   Search index: {index.meta['n_docs']} documents")
+    return index
+
+
+def main():
+    """Search the index from the command line (building it on first use)."""
+    query = ' '.join(sys.argv[1:])
+    index = open_index()
+
+    start = time.perf_counter()
+    hits = index.search(query)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(hits)} hits for '{query}' in {elapsed_ms:.1f} ms")
+    for hit in hits:
+        print(f"  [{hit['score']:.2f}] {hit['type']:<7} {hit['title'][:50]} | {hit['snippet'][:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Lexicon-based sentiment scoring for YouTube comments.
+
+Scores are computed offline (no model download) on whole columns at once:
+texts are tokenized with vectorized string operations, exploded to one
+row per token and looked up in a valence lexicon, with negation and
+booster words applied from the preceding tokens. The summed valence is
+normalized VADER-style to a compound score in [-1, 1].
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir, get_outputs_dir
+
+# =============================================================================
+# LEXICON
+# =============================================================================
+
+LEXICON = {
+    # Positive
+    'love': 3.0, 'loved': 2.9, 'loving': 2.9, 'lovely': 2.8, 'beautiful': 2.9,
+    'bless': 2.5, 'blessed': 2.6, 'blessing': 2.5, 'blessings': 2.5, 'pray': 1.5,
+    'praying': 1.5, 'prayer': 1.5, 'prayers': 1.5, 'peace': 2.5, 'peaceful': 2.4,
+    'hope': 1.9, 'hopeful': 2.0, 'hoping': 1.6, 'free': 1.5, 'freedom': 2.3,
+    'strong': 2.0, 'strongest': 2.3, 'strength': 2.2, 'brave': 2.4, 'courage': 2.2,
+    'hero': 2.6, 'heroes': 2.6, 'proud': 2.1, 'support': 1.7, 'thank': 1.9,
+    'thanks': 1.9, 'grateful': 2.3, 'great': 3.1, 'good': 1.9, 'best': 3.2,
+    'amazing': 2.8, 'wonderful': 2.7, 'kind': 2.4, 'kindness': 2.5, 'safe': 1.9,
+    'safety': 1.8, 'protect': 1.6, 'help': 1.7, 'helping': 1.7, 'justice': 2.0,
+    'victory': 2.5, 'win': 2.8, 'happy': 2.7, 'joy': 2.8, 'glad': 2.0,
+    'ameen': 1.5, 'amen': 1.5, 'mercy': 1.9, 'heal': 1.7, 'healing': 1.8,
+    'paradise': 2.3, 'jannah': 2.3, 'jannat': 2.3, 'reward': 2.0, 'solidarity': 1.8,
+    'humanity': 1.5, 'respect': 2.1, 'truth': 1.3, 'honest': 2.3, 'fair': 1.3,
+    'agree': 1.5, 'right': 0.9, 'well': 1.1, 'true': 1.5, 'save': 2.2,
+    'rebuild': 1.4, 'ceasefire': 1.2, 'inspiring': 2.6, 'resilience': 2.0,
+    'resilient': 2.0, 'salute': 1.9, 'dignity': 1.9, 'innocent': 0.6,
+    # Negative
+    'war': -2.9, 'wars': -2.6, 'genocide': -3.6, 'massacre': -3.6, 'kill': -3.7,
+    'killed': -3.5, 'killing': -3.4, 'kills': -3.4, 'murder': -3.7, 'murdered': -3.6,
+    'murderers': -3.6, 'dead': -3.3, 'death': -2.9, 'deaths': -2.9, 'die': -2.9,
+    'died': -2.6, 'dying': -2.9, 'bomb': -2.2, 'bombs': -2.2, 'bombed': -2.6,
+    'bombing': -2.6, 'attack': -2.1, 'attacks': -2.1, 'attacked': -2.1,
+    'destroy': -2.5, 'destroyed': -2.7, 'destruction': -2.7, 'terror': -3.0,
+    'terrorist': -3.3, 'terrorists': -3.3, 'terrorism': -3.3, 'evil': -3.4,
+    'hate': -2.7, 'hatred': -3.2, 'hateful': -3.1, 'cruel': -2.8, 'cruelty': -2.9,
+    'crime': -2.5, 'crimes': -2.5, 'criminal': -2.4, 'criminals': -2.5,
+    'occupation': -1.5, 'oppression': -2.8, 'oppressor': -2.7, 'apartheid': -2.8,
+    'starve': -2.8, 'starving': -3.0, 'starvation': -3.1, 'famine': -2.9,
+    'hunger': -2.3, 'suffer': -2.7, 'suffering': -2.7, 'pain': -2.3, 'painful': -2.4,
+    'sad': -2.1, 'sadness': -1.9, 'heartbreaking': -3.0, 'heartbroken': -2.9,
+    'cry': -2.1, 'crying': -2.1, 'tears': -1.9, 'horrible': -2.5, 'horrific': -3.0,
+    'terrible': -2.1, 'awful': -2.0, 'disgusting': -2.4, 'disgrace': -2.2,
+    'shame': -2.1, 'shameful': -2.2, 'shameless': -1.9, 'lie': -1.8, 'lies': -1.8,
+    'liar': -2.4, 'liars': -2.4, 'propaganda': -1.8, 'fake': -2.1, 'wrong': -2.1,
+    'bad': -2.5, 'worst': -3.1, 'fear': -2.2, 'afraid': -2.0, 'scared': -1.9,
+    'angry': -2.3, 'anger': -2.7, 'violence': -3.1, 'violent': -2.9, 'injured': -1.7,
+    'wounded': -2.1, 'victims': -2.2, 'victim': -2.2, 'tragedy': -3.4, 'tragic': -3.4,
+    'disaster': -3.1, 'catastrophe': -3.4, 'hostage': -2.3, 'hostages': -2.3,
+    'siege': -2.2, 'blockade': -1.8, 'refugee': -1.2, 'refugees': -1.2,
+    'hypocrisy': -2.3, 'hypocrite': -2.5, 'hypocrites': -2.5, 'coward': -2.5,
+    'cowards': -2.5, 'stupid': -2.4, 'idiot': -2.3, 'nonsense': -1.7,
+    'sick': -2.0, 'inhumane': -2.9, 'barbaric': -2.9, 'brutal': -2.9,
+    'ethnic': -0.4, 'cleansing': -1.2, 'stolen': -2.2, 'steal': -2.2,
+    'curse': -2.5, 'cursed': -2.4, 'damn': -1.7, 'hell': -2.2,
+    # Emoji
+    '❤': 3.0, '♥': 3.0, '💚': 2.8, '💕': 2.8, '💖': 2.8, '😍': 2.7, '😊': 2.2,
+    '🙏': 1.5, '👍': 1.8, '💪': 1.9, '✌': 1.5, '🤲': 1.4,
+    '😢': -2.2, '😭': -2.4, '💔': -2.6, '😡': -2.8, '😠': -2.5, '🤬': -3.0,
+    '😞': -2.0, '😔': -1.9, '🥀': -1.2, '👎': -1.8, '🤮': -2.5,
+}
+
+NEGATIONS = {
+    'not', 'no', 'never', 'nor', 'none', 'nobody', 'nothing', 'without',
+    "don't", 'dont', "doesn't", 'doesnt', "didn't", 'didnt', "isn't", 'isnt',
+    "aren't", 'arent', "wasn't", 'wasnt', "won't", 'wont', 'cannot', "can't", 'cant',
+    "shouldn't", 'shouldnt', "wouldn't", 'wouldnt',
+}
+
+BOOSTERS = {
+    'very': 0.3, 'so': 0.3, 'really': 0.3, 'extremely': 0.4, 'absolutely': 0.4,
+    'totally': 0.3, 'truly': 0.3, 'deeply': 0.3, 'most': 0.3, 'completely': 0.3,
+    'slightly': -0.3, 'somewhat': -0.3, 'barely': -0.4,
+}
+
+# Words and single emoji characters
+TOKEN_PATTERN = r"[a-z']+|[☀-➿\U0001F300-\U0001FAFF]"
+
+NEGATION_FACTOR = -0.74
+NORMALIZATION_ALPHA = 15
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+
+# =============================================================================
+# VECTORIZED SCORING
+# =============================================================================
+
+def score_series(texts):
+    """Compound sentiment score in [-1, 1] for every text of a Series."""
+    texts = pd.Series(texts)
+    index = texts.index
+    texts = texts.reset_index(drop=True).fillna('').astype(str)
+
+    cleaned = (texts.str.replace(r'<br\s*/?>', ' ', regex=True)
+                    .str.replace('&#39;', "'", regex=False)
+                    .str.lower())
+    tokens = cleaned.str.findall(TOKEN_PATTERN).explode().dropna()
+
+    if tokens.empty:
+        return pd.Series(0.0, index=index)
+
+    valence = tokens.map(LEXICON)
+    by_text = tokens.groupby(level=0)
+    prev1 = by_text.shift(1)
+    prev2 = by_text.shift(2)
+
+    negated = prev1.isin(NEGATIONS) | prev2.isin(NEGATIONS)
+    boost = prev1.map(BOOSTERS).fillna(0.0)
+    weighted = valence * (1 + boost) * np.where(negated, NEGATION_FACTOR, 1.0)
+
+    raw = weighted.groupby(level=0).sum().reindex(texts.index, fill_value=0.0)
+    compound = raw / np.sqrt(raw * raw + NORMALIZATION_ALPHA)
+    return pd.Series(compound.to_numpy(dtype='float64'), index=index)
+
+
+def label_series(scores):
+    """Map compound scores to positive / negative / neutral labels."""
+    scores = pd.Series(scores)
+    labels = np.select(
+        [scores >= POSITIVE_THRESHOLD, scores <= NEGATIVE_THRESHOLD],
+        ['positive', 'negative'],
+        default='neutral'
+    )
+    return pd.Series(labels, index=scores.index)
+
+
+def score_comments(comments, text_field='text'):
+    """Score a batch of comment dicts in place (`sentiment`, `sentimentScore`)."""
+    if not comments:
+        return comments
+    scores = score_series([c.get(text_field) for c in comments])
+    labels = label_series(scores)
+    for comment, score, label in zip(comments, scores, labels):
+        comment['sentimentScore'] = round(float(score), 4)
+        comment['sentiment'] = label
+    return comments
+
+
+# =============================================================================
+# AGGREGATES
+# =============================================================================
+
+def sentiment_aggregates(df_comments, df_videos):
+    """Mean score, volume and label shares by video, channel, query and month.
+
+    A comment counts once everywhere except in the per-query table, where it
+    counts under each query its video was collected for.
+    """
+    channels = df_videos[['videoId', 'channelTitle']].drop_duplicates('videoId')
+    df = df_comments[['videoId', 'publishedAt', 'sentimentScore', 'sentiment']].merge(channels, on='videoId')
+    df['month'] = pd.to_datetime(df['publishedAt'], utc=True).dt.strftime('%Y-%m')
+    df['positive'] = df['sentiment'] == 'positive'
+    df['negative'] = df['sentiment'] == 'negative'
+
+    per_query = df.merge(df_videos[['videoId', 'query']].drop_duplicates(), on='videoId')
+
+    aggregates = {}
+    for key in ('videoId', 'channelTitle', 'query', 'month'):
+        aggregates[key] = (
+            (per_query if key == 'query' else df).groupby(key)
+              .agg(comments=('sentimentScore', 'size'),
+                   mean_score=('sentimentScore', 'mean'),
+                   positive_share=('positive', 'mean'),
+                   negative_share=('negative', 'mean'))
+              .reset_index()
+              .sort_values('comments', ascending=False)
+        )
+    return aggregates
+
+
+# =============================================================================
+# BACKFILL
+# =============================================================================
+
+def backfill(data_dir=None, outputs_dir=None):
+    """Score every stored comment and rewrite the data files.
+
+    Fills `sentiment`/`sentimentScore` (and the legacy `feeling` column),
+    writes aggregate tables to outputs/ and returns the throughput in
+    comments per second.
+    """
+    import json
+
+    data_dir = data_dir or get_data_dir()
+    outputs_dir = outputs_dir or get_outputs_dir()
+
+    with open(f'{data_dir}/youtube_videos.json', 'r', encoding='utf-8') as f:
+        videos = json.load(f)
+
+    comments = [c for v in videos for c in v.get('comments', [])]
+    start = time.perf_counter()
+    scores = score_series([c.get('text') for c in comments])
+    labels = label_series(scores)
+    elapsed = time.perf_counter() - start
+    throughput = len(comments) / elapsed if elapsed > 0 else float('inf')
+
+    for comment, score, label in zip(comments, scores, labels):
+        comment['sentimentScore'] = round(float(score), 4)
+        comment['sentiment'] = label
+        if 'feeling' in comment:
+            comment['feeling'] = label
+
+    from data_collector import YouTubeCollector
+    YouTubeCollector(api_key=None).save_to_files(videos, output_dir=data_dir)
+
+    df_comments = pd.DataFrame(comments)
+    df_videos = pd.DataFrame(videos)
+    if not df_comments.empty:
+        for key, table in sentiment_aggregates(df_comments, df_videos).items():
+            table.to_csv(f'{outputs_dir}/sentiment_by_{key}.csv', index=False)
+
+    print(f"✓ Scored {len(comments)} comments in {elapsed:.3f}s ({throughput:,.0f} comments/s)")
+    if comments:
+        print(f"   {labels.value_counts().to_dict()}")
+    return throughput
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,317 @@
+"""Mergeable sketches of engagement: distinct commenters and percentiles.
+
+HyperLogLog estimates distinct commenters and KLL estimates quantiles of
+view, like and comment-like counts, per video, channel, query and month.
+Both are mergeable (the merge of two partitions' sketches is a sketch
+of their union with the same error bounds), so they are built in one
+pass, locally over the streamed data file or per Spark partition, and
+stored in `data/sketches.json` next to the data.
+
+A video listed under several queries (and its comments) counts once per
+query in the query sketches, and once in every other group.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import get_data_dir, iter_flat_rows
+
+SKETCHES_FILE = 'sketches.json'
+# Bump whenever what goes into the sketches changes: stored sketches are then rebuilt
+SKETCHES_VERSION = 2
+
+HLL_PRECISION = 12      # 4096 registers, ~1.6% standard error
+KLL_K = 200             # ~1.3% rank error
+
+GROUPS = ('video', 'channel', 'query', 'month')
+VIDEO_GROUPS = ('channel', 'query', 'month')
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+# =============================================================================
+# HYPERLOGLOG
+# =============================================================================
+
+def _hash64(value):
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**p one-byte registers."""
+
+    def __init__(self, p=HLL_PRECISION, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_json(self):
+        nonzero = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(nonzero) * 3 < self.m:
+            # Sparse: (2-byte index, 1-byte rank) per set register
+            packed = b''.join(i.to_bytes(2, 'big') + bytes([r]) for i, r in nonzero)
+            return {'p': self.p, 'sparse': base64.b64encode(packed).decode('ascii')}
+        return {'p': self.p, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_json(cls, data):
+        if 'sparse' in data:
+            sketch = cls(data['p'])
+            packed = base64.b64decode(data['sparse'])
+            for j in range(0, len(packed), 3):
+                sketch.registers[int.from_bytes(packed[j:j + 2], 'big')] = packed[j + 2]
+            return sketch
+        return cls(data['p'], base64.b64decode(data['registers']))
+
+
+# =============================================================================
+# KLL QUANTILES
+# =============================================================================
+
+class KLLSketch:
+    """Quantile sketch: a stack of compactors where level h items weigh 2**h."""
+
+    def __init__(self, k=KLL_K, levels=None, seed=0):
+        self.k = k
+        self.levels = levels or [[]]
+        self.size = sum(len(level) for level in self.levels)
+        self._random = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def add(self, value):
+        self.levels[0].append(value)
+        self.size += 1
+        if self.size >= sum(self._capacity(h) for h in range(len(self.levels))):
+            self._compress()
+
+    def _compress(self):
+        for h, level in enumerate(self.levels):
+            if len(level) >= self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                level.sort()
+                # Keep every other item (random offset) one level up at double weight
+                offset = self._random.randint(0, 1)
+                promoted = level[offset::2] if len(level) % 2 == 0 else level[offset:-1:2]
+                self.levels[h + 1].extend(promoted)
+                self.levels[h] = [] if len(level) % 2 == 0 else level[-1:]
+                self.size = sum(len(lv) for lv in self.levels)
+                break
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, level in enumerate(other.levels):
+            self.levels[h].extend(level)
+        self.size = sum(len(level) for level in self.levels)
+        while self.size >= sum(self._capacity(h) for h in range(len(self.levels))):
+            self._compress()
+        return self
+
+    def count(self):
+        return sum(len(level) << h for h, level in enumerate(self.levels))
+
+    def quantile(self, q):
+        items = sorted((value, 1 << h) for h, level in enumerate(self.levels) for value in level)
+        if not items:
+            return None
+        target = q * sum(weight for _, weight in items)
+        cumulative = 0
+        for value, weight in items:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return items[-1][0]
+
+    def to_json(self):
+        return {'k': self.k, 'levels': self.levels}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['k'], [list(level) for level in data['levels']])
+
+
+# =============================================================================
+# ENGAGEMENT SKETCHES
+# =============================================================================
+
+# Sketches kept for each group (videos have a single view/like value, so only comment sketches)
+SKETCHES = {
+    'commenters': HyperLogLog,
+    'views': KLLSketch,
+    'likes': KLLSketch,
+    'comment_likes': KLLSketch,
+}
+VIDEO_SKETCHES = ('commenters', 'comment_likes')
+
+
+class EngagementSketches:
+    """Sketches by group type ('video', 'channel', 'query', 'month') and key."""
+
+    def __init__(self, groups=None):
+        self.groups = groups or {group: {} for group in GROUPS}
+
+    def _sketches(self, group, key):
+        sketches = self.groups[group].get(key)
+        if sketches is None:
+            names = VIDEO_SKETCHES if group == 'video' else SKETCHES
+            sketches = self.groups[group][key] = {name: SKETCHES[name]() for name in names}
+        return sketches
+
+    def add_video(self, video, groups=VIDEO_GROUPS):
+        """Add a video's views and likes to its `groups` (only 'query' for a video already added)."""
+        keys = {
+            'channel': video.get('channelTitle') or '',
+            'query': video.get('query') or '',
+            'month': (video.get('publishedAt') or '')[:7],
+        }
+        for group in groups:
+            key = keys[group]
+            sketches = self._sketches(group, key)
+            sketches['views'].add(int(video.get('viewCount') or 0))
+            sketches['likes'].add(int(video.get('likeCount') or 0))
+
+    def add_comment(self, comment, video, groups=GROUPS):
+        """Add a comment; it counts for its video's channel and query and for its own month.
+
+        A comment already added under another query of its video goes to `groups=('query',)`.
+        """
+        keys = {
+            'video': comment['videoId'],
+            'channel': video.get('channelTitle') or '',
+            'query': video.get('query') or '',
+            'month': (comment.get('publishedAt') or '')[:7],
+        }
+        for group in groups:
+            key = keys[group]
+            sketches = self._sketches(group, key)
+            sketches['commenters'].add(comment.get('author') or '')
+            sketches['comment_likes'].add(int(comment.get('likeCount') or 0))
+
+    def merge(self, other):
+        for group, keyed in other.groups.items():
+            for key, sketches in keyed.items():
+                mine = self._sketches(group, key)
+                for name, sketch in sketches.items():
+                    mine[name].merge(sketch)
+        return self
+
+    def summary(self, group, percentiles=PERCENTILES):
+        """Distinct commenters and percentiles of every sketch of a group type, as rows."""
+        rows = []
+        for key, sketches in sorted(self.groups[group].items()):
+            row = {group: key}
+            for name, sketch in sketches.items():
+                if isinstance(sketch, HyperLogLog):
+                    row[f'distinct_{name}'] = sketch.count()
+                    continue
+                row[f'{name}_n'] = sketch.count()
+                for q in percentiles:
+                    row[f'{name}_p{int(q * 100)}'] = sketch.quantile(q)
+            rows.append(row)
+        return rows
+
+    def to_json(self):
+        return {
+            group: {key: {name: s.to_json() for name, s in sketches.items()} for key, sketches in keyed.items()}
+            for group, keyed in self.groups.items()
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({
+            group: {
+                key: {name: SKETCHES[name].from_json(s) for name, s in sketches.items()}
+                for key, sketches in keyed.items()
+            }
+            for group, keyed in data.items()
+        })
+
+
+def sketch_rows(rows):
+    """Build sketches from flat ('video', row) / ('comment', row) pairs in one pass.
+
+    Comments must follow their video, as in the data files. A video row
+    (or comment) seen before under another query only adds to its query.
+    """
+    sketches = EngagementSketches()
+    videos = {}
+    seen_comments = set()
+    for kind, row in rows:
+        if kind == 'video':
+            repeated = row['videoId'] in videos
+            videos[row['videoId']] = row
+            sketches.add_video(row, ('query',) if repeated else VIDEO_GROUPS)
+        else:
+            repeated = row.get('commentId') in seen_comments
+            seen_comments.add(row.get('commentId'))
+            sketches.add_comment(row, videos.get(row['videoId'], {}), ('query',) if repeated else GROUPS)
+    return sketches
+
+
+def build_sketches(data_dir=None):
+    """Sketch the videos file (streamed) and store the result next to it."""
+    from arrow_store import source_version
+
+    data_dir = data_dir or get_data_dir()
+    videos_path = os.path.join(data_dir, 'youtube_videos.json')
+    sketches = sketch_rows(iter_flat_rows(videos_path))
+    save_sketches(sketches, data_dir, source_version(videos_path))
+    return sketches
+
+
+def save_sketches(sketches, data_dir=None, version=None):
+    path = os.path.join(data_dir or get_data_dir(), SKETCHES_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'sketches_version': SKETCHES_VERSION, 'source_version': version, 'groups': sketches.to_json()},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_sketches(data_dir=None):
+    """Stored sketches, rebuilt when missing, older than the videos file or from another version."""
+    from arrow_store import source_version
+
+    data_dir = data_dir or get_data_dir()
+    path = os.path.join(data_dir, SKETCHES_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('sketches_version') == SKETCHES_VERSION and \
+                stored['source_version'] == source_version(os.path.join(data_dir, 'youtube_videos.json')):
+            return EngagementSketches.from_json(stored['groups'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_sketches(data_dir)
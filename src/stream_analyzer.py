@@ -0,0 +1,307 @@
+"""Streaming analyzer: running aggregates over the collector's micro-batch drops.
+
+While a collection runs, the collector writes each finished job's videos
+as an NDJSON file to `data/stream/incoming/`. Files are written under a
+dotted name and then renamed, so Spark never sees a partial file. This
+script runs a Spark Structured Streaming query on that directory. No
+broker is needed: the source is the local file system, and progress is
+checkpointed in `data/stream/checkpoint/`, so a restart resumes after
+the last processed drop. The running state records the checkpoint's
+query id; with a cleared or replaced checkpoint, every drop is read
+again and the state starts over.
+
+Rows are deduplicated per (video, query) within a watermark on their
+collection time. Each micro-batch is reduced on the executors to its
+latest row per (video, query) with extracted keywords. The driver
+replaces those videos' previous contributions in the running state, so
+re-collected videos update the totals instead of being counted twice.
+After every batch, a snapshot of the aggregates (videos per query,
+views per channel, keyword counts, daily timeline) is written atomically
+to `data/stream/snapshot.json`, where the GUI polls it.
+
+    python src/stream_analyzer.py            # run until interrupted
+    python src/stream_analyzer.py --once     # process pending drops and exit
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from records import as_dict
+from utils import add_title_tokens, get_data_dir
+
+STREAM_DIR = 'stream'
+SNAPSHOT_FILE = 'snapshot.json'
+STATE_FILE = 'state.json'
+
+WATERMARK = '10 minutes'        # re-collections of a video closer than this are duplicates
+TRIGGER_INTERVAL = '10 seconds'
+MAX_FILES_PER_TRIGGER = 20
+
+# Sizes of the published top lists (the state keeps everything)
+SNAPSHOT_CHANNELS = 20
+SNAPSHOT_KEYWORDS = 30
+
+DROP_FIELDS = ['videoId', 'title', 'channelTitle', 'query', 'publishedAt',
+               'viewCount', 'likeCount', 'commentCount', 'titleTokens', 'tokensVersion']
+
+
+def stream_paths(data_dir=None):
+    """Incoming drops, checkpoint, state and snapshot paths of a data directory."""
+    root = os.path.join(data_dir or get_data_dir(), STREAM_DIR)
+    return {
+        'root': root,
+        'incoming': os.path.join(root, 'incoming'),
+        'checkpoint': os.path.join(root, 'checkpoint'),
+        'state': os.path.join(root, STATE_FILE),
+        'snapshot': os.path.join(root, SNAPSHOT_FILE),
+    }
+
+
+# =============================================================================
+# DROPS (collector side)
+# =============================================================================
+
+def write_drop(videos, incoming_dir, name='batch'):
+    """Write videos (without nested comments) as one NDJSON micro-batch file."""
+    if not videos:
+        return None
+    os.makedirs(incoming_dir, exist_ok=True)
+    collected_at = datetime.now(timezone.utc).isoformat()
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    filename = f'{stamp}-{os.getpid()}-{name}.ndjson'
+
+    # Dotted temporary name: Spark's file source skips hidden files
+    tmp_path = os.path.join(incoming_dir, f'.{filename}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for video in videos:
+            row = as_dict(add_title_tokens(video))
+            row = {field: row.get(field) for field in DROP_FIELDS}
+            row['collectedAt'] = collected_at
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    path = os.path.join(incoming_dir, filename)
+    os.replace(tmp_path, path)
+    return path
+
+
+# =============================================================================
+# RUNNING STATE (driver side)
+# =============================================================================
+
+class StreamState:
+    """Running aggregates with the contribution of every (video, query) kept for replacement."""
+
+    def __init__(self, path, load=True):
+        self.path = path
+        state = {}
+        if load:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.batch_id = state.get('batch_id', -1)
+        # Spark checkpoint the batch ids belong to
+        self.query_id = state.get('query_id')
+        self.members = state.get('members', {})
+        self.queries = Counter(state.get('queries', {}))
+        self.query_views = Counter(state.get('query_views', {}))
+        self.channels = Counter(state.get('channels', {}))
+        self.keywords = Counter(state.get('keywords', {}))
+        self.timeline = Counter(state.get('timeline', {}))
+
+    def _apply(self, member, sign):
+        query, channel, day, views, keywords = member
+        for counter, key, value in ((self.queries, query, 1), (self.query_views, query, views),
+                                    (self.channels, channel, views), (self.timeline, day, 1)):
+            counter[key] += sign * value
+            if not counter[key]:
+                del counter[key]
+        for keyword in keywords:
+            self.keywords[keyword] += sign
+            if not self.keywords[keyword]:
+                del self.keywords[keyword]
+
+    def update(self, rows):
+        """Replace the contributions of the (video, query) rows of a batch."""
+        for row in rows:
+            key = f"{row['videoId']}\t{row['query'] or ''}"
+            member = [row['query'] or '', row['channelTitle'] or '', (row['publishedAt'] or '')[:10],
+                      int(row['viewCount'] or 0), list(row['keywords'] or [])]
+            old = self.members.get(key)
+            if old == member:
+                continue
+            if old:
+                self._apply(old, -1)
+            self._apply(member, 1)
+            self.members[key] = member
+
+    def snapshot(self):
+        return {
+            'batch_id': self.batch_id,
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+            'videos': len(self.members),
+            'queries': [{'query': q, 'videos': n, 'views': self.query_views[q]}
+                        for q, n in sorted(self.queries.items(), key=lambda item: (-item[1], item[0]))],
+            'channels': [{'channelTitle': c, 'views': v}
+                         for c, v in sorted(self.channels.items(), key=lambda item: (-item[1], item[0]))
+                         [:SNAPSHOT_CHANNELS]],
+            'keywords': [{'keyword': k, 'count': n}
+                         for k, n in sorted(self.keywords.items(), key=lambda item: (-item[1], item[0]))
+                         [:SNAPSHOT_KEYWORDS]],
+            'timeline': [{'date': d, 'videos': n} for d, n in sorted(self.timeline.items())],
+        }
+
+    def save(self, snapshot_path):
+        for path, data in ((self.path, {
+            'batch_id': self.batch_id,
+            'query_id': self.query_id,
+            'members': self.members,
+            'queries': self.queries,
+            'query_views': self.query_views,
+            'channels': self.channels,
+            'keywords': self.keywords,
+            'timeline': self.timeline,
+        }), (snapshot_path, self.snapshot())):
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+
+def checkpoint_query_id(checkpoint_dir):
+    """Id of the streaming query a checkpoint belongs to (None before its first start)."""
+    try:
+        with open(os.path.join(checkpoint_dir, 'metadata'), 'r', encoding='utf-8') as f:
+            return json.loads(f.readline()).get('id')
+    except (OSError, ValueError):
+        return None
+
+
+def state_for_checkpoint(paths):
+    """Running state matching the checkpoint, empty if the checkpoint was cleared or replaced.
+
+    Batch ids restart at 0 with a new checkpoint, which also reprocesses
+    every drop, so the previous aggregates are dropped with it.
+    """
+    state = StreamState(paths['state'])
+    query_id = checkpoint_query_id(paths['checkpoint'])
+    if state.batch_id >= 0 and (query_id is None or state.query_id not in (None, query_id)):
+        print(f"   Checkpoint changed since batch {state.batch_id}: aggregates rebuilt from the drops")
+        state = StreamState(paths['state'], load=False)
+    return state
+
+
+def load_snapshot(data_dir=None):
+    """Latest published snapshot, or None if the streaming analyzer never ran."""
+    try:
+        with open(stream_paths(data_dir)['snapshot'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# =============================================================================
+# STREAMING QUERY
+# =============================================================================
+
+def drop_schema():
+    from pyspark.sql.types import ArrayType, StringType, StructField, StructType
+
+    # Counts arrive as strings from the API; cast after parsing
+    return StructType(
+        [StructField(field, ArrayType(StringType()) if field == 'titleTokens' else StringType())
+         for field in DROP_FIELDS]
+        + [StructField('collectedAt', StringType())]
+    )
+
+
+def batch_rows(df):
+    """Latest row per (video, query) of a micro-batch, with its title keywords."""
+    from pyspark.sql import Window
+    from pyspark.sql.functions import col, row_number
+    from analysis_engines import with_spark_keywords
+
+    latest = Window.partitionBy("videoId", "query").orderBy(col("collectedAt").desc())
+    latest_rows = df.withColumn("rank", row_number().over(latest)) \
+                    .filter(col("rank") == 1)
+    return with_spark_keywords(latest_rows) \
+        .select("videoId", "query", "channelTitle", "publishedAt", "viewCount", "keywords")
+
+
+def start_stream(spark, paths, once=False):
+    """Start the streaming query; each micro-batch updates the state and the snapshot."""
+    from pyspark.sql.functions import col, to_timestamp
+
+    state = state_for_checkpoint(paths)
+
+    def process_batch(df, batch_id):
+        # A batch replayed after a crash was already applied before the state was saved
+        if batch_id <= state.batch_id:
+            return
+        # The query writes its checkpoint metadata when it starts
+        state.query_id = state.query_id or checkpoint_query_id(paths['checkpoint'])
+        rows = [row.asDict() for row in batch_rows(df).toLocalIterator()]
+        state.update(rows)
+        state.batch_id = batch_id
+        state.save(paths['snapshot'])
+        print(f"   Batch {batch_id}: {len(rows)} videos updated ({len(state.members)} total)")
+
+    os.makedirs(paths['incoming'], exist_ok=True)
+    drops = spark.readStream \
+        .schema(drop_schema()) \
+        .option("maxFilesPerTrigger", MAX_FILES_PER_TRIGGER) \
+        .json(paths['incoming']) \
+        .withColumn("collectedAt", to_timestamp(col("collectedAt"))) \
+        .withColumn("viewCount", col("viewCount").cast("long"))
+
+    # Same video collected twice within the watermark: keep one row
+    drops = drops.withWatermark("collectedAt", WATERMARK)
+    if hasattr(drops, 'dropDuplicatesWithinWatermark'):
+        drops = drops.dropDuplicatesWithinWatermark(["videoId", "query"])
+    else:
+        drops = drops.dropDuplicates(["videoId", "query", "collectedAt"])
+
+    writer = drops.writeStream \
+        .foreachBatch(process_batch) \
+        .option("checkpointLocation", paths['checkpoint'])
+    writer = writer.trigger(availableNow=True) if once else writer.trigger(processingTime=TRIGGER_INTERVAL)
+    return writer.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming analysis of collector micro-batch drops")
+    parser.add_argument('--once', action='store_true', help="process the pending drops, then exit")
+    args = parser.parse_args(argv)
+
+    from pyspark.sql import SparkSession
+
+    paths = stream_paths()
+    spark = SparkSession.builder \
+        .appName("YouTubeGazaStreaming") \
+        .config("spark.driver.memory", "2g") \
+        .config("spark.sql.shuffle.partitions", "8") \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+
+    print(f"=== ANALYSE EN CONTINU ({paths['incoming']}) ===")
+    query = start_stream(spark, paths, once=args.once)
+    try:
+        query.awaitTermination()
+    except KeyboardInterrupt:
+        query.stop()
+    finally:
+        spark.stop()
+
+    snapshot = load_snapshot()
+    if snapshot:
+        print(f"✓ Snapshot: {snapshot['videos']} vidéos (batch {snapshot['batch_id']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Sparse TF-IDF matrices and NMF topics of video titles and comments.
+
+Titles reuse the tokens stored at collection time and comments go
+through the same normalizer, so one vocabulary covers both. Documents
+are tokenized in batches, in a process pool or per Spark partition.
+Each batch returns a small CSR block with its own vocabulary, which the
+driver remaps to global term ids. Memory therefore follows the number
+of non-zeros, never vocabulary × documents.
+
+The count matrix is kept in `data/text_features/`. `sync` only
+tokenizes documents it has not seen and drops the rows of documents
+that disappeared. TF-IDF weights and NMF topics (multiplicative updates
+on the sparse matrix) are computed from it, and the topics, with their
+shares per query and month, are stored next to it.
+"""
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import NORMALIZER_VERSION, get_data_dir, get_stop_words, title_token_column, tokenize_title
+
+FEATURES_DIR = 'text_features'
+
+DOC_COLUMNS = ['key', 'kind', 'query', 'month']
+BATCH_SIZE = 5000
+
+# Terms in fewer documents are noise, terms in more than this share are filler
+MIN_DF = 3
+MAX_DF_SHARE = 0.5
+
+# Left out of the weighted terms only, so stored counts survive list changes
+STOP_WORDS = get_stop_words() | {
+    'are', 'was', 'were', 'been', 'has', 'had', 'did', 'does', 'why', 'very', 'much',
+    'should', 'many', 'more', 'where', 'here', 'said', 'too', 'those', 'being',
+}
+
+NUM_TOPICS = 8
+TOP_TERMS = 8
+NMF_ITERATIONS = 200
+TOPIC_GROUPS = ('query', 'month')
+
+
+# =============================================================================
+# DOCUMENTS
+# =============================================================================
+
+def documents(videos, comments):
+    """Document rows (key, kind, query, month, tokens, text) of titles and comments.
+
+    Titles carry their stored tokens; comments are tokenized later (tokens
+    None). Comments take the query of their video.
+    """
+    videos = videos.drop_duplicates(['videoId', 'query'])
+    if 'titleTokens' in videos.columns:
+        tokens = title_token_column(videos['title'], videos['titleTokens'], videos['tokensVersion'])
+    else:
+        tokens = title_token_column(videos['title'])
+    titles = pd.DataFrame({
+        'key': ('v:' + videos['videoId'] + ':' + videos['query'].fillna('')).values,
+        'kind': 'title',
+        'query': videos['query'].fillna('').values,
+        'month': videos['publishedAt'].str[:7].values,
+        'tokens': tokens,
+        'text': None,
+    })
+
+    queries = videos.drop_duplicates('videoId').set_index('videoId')['query']
+    comments = comments.drop_duplicates(['commentId', 'videoId'])
+    texts = pd.DataFrame({
+        'key': ('c:' + comments['commentId'] + ':' + comments['videoId']).values,
+        'kind': 'comment',
+        'query': comments['videoId'].map(queries).fillna('').values,
+        'month': comments['publishedAt'].str[:7].values,
+        'tokens': None,
+        'text': comments['text'].fillna('').values,
+    })
+    return pd.concat([titles, texts], ignore_index=True)
+
+
+def comment_tokens(text):
+    """Normalized tokens of a comment, without links and markup."""
+    text = re.sub(r'<a\s[^>]*>.*?</a>|https?://\S+', ' ', text or '', flags=re.IGNORECASE | re.DOTALL)
+    return tokenize_title(text)
+
+
+def tokenize_batch(rows):
+    """Count block of a batch of document rows, with its own local vocabulary.
+
+    Rows are (key, kind, query, month, tokens, text) tuples; returns the
+    document metadata, the local terms and the CSR arrays of the counts.
+    """
+    meta, vocab, indptr, indices, counts = [], {}, [0], [], []
+    for key, kind, query, month, tokens, text in rows:
+        meta.append((key, kind, query, month))
+        for term, n in Counter(comment_tokens(text) if tokens is None else tokens).items():
+            indices.append(vocab.setdefault(term, len(vocab)))
+            counts.append(n)
+        indptr.append(len(indices))
+    return (meta, list(vocab), np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32), np.array(counts, dtype=np.int32))
+
+
+# =============================================================================
+# DOCUMENT-TERM MATRIX
+# =============================================================================
+
+class DocumentTermMatrix:
+    """Term counts of every document, as a CSR matrix kept on disk."""
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or get_data_dir()
+        self.features_dir = os.path.join(self.data_dir, FEATURES_DIR)
+        self.version = None
+        self.terms = []
+        self.term_ids = {}
+        self.docs = pd.DataFrame(columns=DOC_COLUMNS)
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.features_dir, name)
+
+    def _load(self):
+        try:
+            with open(self._path('matrix.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            counts = sparse.load_npz(self._path('counts.npz')).tocsr()
+        except (OSError, ValueError, KeyError):
+            return
+        if meta.get('normalizer') != NORMALIZER_VERSION:
+            return  # tokens of another normalizer: start over
+        self.version = meta['version']
+        self.terms = meta['terms']
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.docs = pd.DataFrame(meta['docs'], columns=DOC_COLUMNS)
+        self.counts = counts
+
+    def save(self):
+        os.makedirs(self.features_dir, exist_ok=True)
+        path = self._path('counts.npz')
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        sparse.save_npz(tmp_path, self.counts)
+        os.replace(tmp_path, path)
+
+        path = self._path('matrix.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version,
+                'normalizer': NORMALIZER_VERSION,
+                'terms': self.terms,
+                'docs': self.docs.values.tolist(),
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def retain(self, keys):
+        """Drop the rows of documents not in `keys`; returns the number dropped."""
+        keep = self.docs['key'].isin(set(keys)).to_numpy()
+        self.counts = self.counts[keep]
+        self.docs = self.docs[keep].reset_index(drop=True)
+        return int((~keep).sum())
+
+    def append(self, blocks):
+        """Add the count blocks returned by `tokenize_batch`, remapped to global term ids."""
+        metas, matrices = [self.docs], []
+        for meta, terms, indptr, indices, counts in blocks:
+            ids = np.array([self.term_ids.setdefault(term, len(self.term_ids)) for term in terms], dtype=np.int32)
+            matrices.append((indptr, ids[indices] if len(indices) else indices, counts))
+            metas.append(pd.DataFrame(meta, columns=DOC_COLUMNS))
+        self.terms = list(self.term_ids)
+
+        width = len(self.terms)
+        self.counts.resize((self.counts.shape[0], width))
+        blocks = [self.counts] + [
+            sparse.csr_matrix((counts, indices, indptr), shape=(len(indptr) - 1, width))
+            for indptr, indices, counts in matrices
+        ]
+        self.counts = sparse.vstack(blocks, format='csr', dtype=np.int32)
+        self.docs = pd.concat(metas, ignore_index=True)
+
+    def sync(self, docs, version=None, workers=None):
+        """Match the matrix to `docs`, tokenizing only new documents; returns (added, removed)."""
+        removed = self.retain(docs['key'])
+        new = docs[~docs['key'].isin(set(self.docs['key']))]
+        rows = list(new[['key', 'kind', 'query', 'month', 'tokens', 'text']].itertuples(index=False, name=None))
+        batches = [rows[i:i + BATCH_SIZE] for i in range(0, len(rows), BATCH_SIZE)]
+
+        if len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                self.append(pool.map(tokenize_batch, batches))
+        else:
+            self.append(map(tokenize_batch, batches))
+        self.version = version
+        self.save()
+        return len(rows), removed
+
+    def kept_terms(self, min_df=MIN_DF, max_df_share=MAX_DF_SHARE):
+        """Column indices of the terms worth weighting, and every term's document frequency."""
+        n_docs = self.counts.shape[0]
+        df = np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+        is_stop_word = np.array([term in STOP_WORDS for term in self.terms], dtype=bool)
+        return np.flatnonzero((df >= min_df) & (df <= max_df_share * n_docs) & ~is_stop_word), df
+
+    def tfidf(self, min_df=MIN_DF, max_df_share=MAX_DF_SHARE):
+        """L2-normalized TF-IDF rows over the kept terms, and those terms."""
+        n_docs = self.counts.shape[0]
+        kept, df = self.kept_terms(min_df, max_df_share)
+
+        x = self.counts[:, kept].astype(np.float64)
+        x.data = 1 + np.log(x.data)                             # sublinear tf
+        x = x @ sparse.diags(np.log((1 + n_docs) / (1 + df[kept])) + 1)
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        x = sparse.diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)) @ x
+        return x.tocsr(), [self.terms[i] for i in kept]
+
+
+# =============================================================================
+# TOPICS
+# =============================================================================
+
+def nmf(x, k=NUM_TOPICS, iterations=NMF_ITERATIONS, seed=0):
+    """Factor a sparse non-negative matrix as W @ H (Lee-Seung multiplicative updates).
+
+    Only x, W (documents × k) and H (k × terms) are held; x is never densified.
+    """
+    rng = np.random.RandomState(seed)
+    scale = np.sqrt(x.sum() / (x.shape[0] * x.shape[1] * k)) if x.nnz else 1.0
+    w = rng.rand(x.shape[0], k) * scale
+    h = rng.rand(k, x.shape[1]) * scale
+    eps = 1e-10
+    for _ in range(iterations):
+        h *= np.asarray((x.T @ w).T) / (w.T @ w @ h + eps)
+        w *= np.asarray(x @ h.T) / (w @ (h @ h.T) + eps)
+    return w, h
+
+
+def fit_topics(matrix, k=NUM_TOPICS, top_terms=TOP_TERMS):
+    """Topics (top terms) and their mean share per query and month."""
+    x, terms = matrix.tfidf()
+    w, h = nmf(x, k=min(k, max(1, min(x.shape))))
+
+    topics = pd.DataFrame({
+        'topic': range(len(h)),
+        'terms': [[terms[i] for i in np.argsort(-row)[:top_terms]] for row in h],
+    })
+    topics['label'] = topics['terms'].map(lambda t: ' / '.join(t[:3]))
+
+    # Each document's topic mixture; documents without kept terms are left out
+    totals = w.sum(axis=1)
+    has_topics = totals > 0
+    shares = pd.DataFrame(w[has_topics] / totals[has_topics, None], columns=topics['label'])
+    docs = matrix.docs[has_topics].reset_index(drop=True)
+
+    by = {}
+    for group in TOPIC_GROUPS:
+        table = shares.groupby(docs[group].values).mean()
+        table.insert(0, 'documents', docs[group].value_counts())
+        by[group] = table.rename_axis(group).reset_index().sort_values(group, kind='mergesort') \
+                         .reset_index(drop=True)
+    return {'topics': topics, 'by': by}
+
+
+def save_topics(topics, data_dir=None, version=None):
+    path = os.path.join(data_dir or get_data_dir(), FEATURES_DIR, 'topics.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': version,
+            'topics': topics['topics'].to_dict(orient='list'),
+            'by': {group: table.to_dict(orient='split') for group, table in topics['by'].items()},
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def sources_version(data_dir):
+    """Combined version stamp of the videos and comments files."""
+    from arrow_store import source_version
+
+    return '|'.join(source_version(os.path.join(data_dir, name))
+                    for name in ('youtube_videos.json', 'youtube_comments.json'))
+
+
+def load_matrix(data_dir=None, videos=None, comments=None):
+    """Document-term matrix of the data, synced incrementally if the data changed."""
+    from arrow_store import load_frame
+
+    data_dir = data_dir or get_data_dir()
+    version = sources_version(data_dir)
+    matrix = DocumentTermMatrix(data_dir)
+    if matrix.version != version:
+        if videos is None:
+            videos = load_frame('videos', ['videoId', 'title', 'query', 'publishedAt',
+                                           'titleTokens', 'tokensVersion'], data_dir)
+        if comments is None:
+            comments = load_frame('comments', ['videoId', 'commentId', 'text', 'publishedAt'], data_dir)
+        added, removed = matrix.sync(documents(videos, comments), version)
+        print(f"   Text features: +{added} / -{removed} documents ({matrix.counts.nnz:,} non-zeros)")
+    return matrix
+
+
+def load_topics(data_dir=None, videos=None, comments=None):
+    """Stored topics, refitted when the data changed (after an incremental matrix sync)."""
+    data_dir = data_dir or get_data_dir()
+    version = sources_version(data_dir)
+    try:
+        with open(os.path.join(data_dir, FEATURES_DIR, 'topics.json'), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored['version'] == version:
+            return {
+                'topics': pd.DataFrame(stored['topics']),
+                'by': {group: pd.DataFrame(**{k: v for k, v in split.items() if k != 'index'})
+                       for group, split in stored['by'].items()},
+            }
+    except (OSError, ValueError, KeyError):
+        pass
+
+    topics = fit_topics(load_matrix(data_dir, videos, comments))
+    save_topics(topics, data_dir, version)
+    return topics
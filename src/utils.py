@@ -2,6 +2,8 @@
 
 import re
 import os
+import json
+import html
 from pathlib import Path
 
 # =============================================================================
@@ -13,16 +15,22 @@ def get_project_root():
     return Path(__file__).parent.parent
 
 
+# Overrides of the data and outputs directories (used by the batch runner
+# to give every configuration its own directories)
+DATA_DIR_ENV = 'YOUTUBE_DATA_DIR'
+OUTPUTS_DIR_ENV = 'YOUTUBE_OUTPUTS_DIR'
+
+
 def get_data_dir():
-    """Get the data directory, create if it doesn't exist."""
-    data_dir = get_project_root() / 'data'
+    """Get the data directory ($YOUTUBE_DATA_DIR if set), create if it doesn't exist."""
+    data_dir = Path(os.environ.get(DATA_DIR_ENV) or get_project_root() / 'data')
     data_dir.mkdir(parents=True, exist_ok=True)
     return str(data_dir)
 
 
 def get_outputs_dir():
-    """Get the outputs directory, create if it doesn't exist."""
-    outputs_dir = get_project_root() / 'outputs'
+    """Get the outputs directory ($YOUTUBE_OUTPUTS_DIR if set), create if it doesn't exist."""
+    outputs_dir = Path(os.environ.get(OUTPUTS_DIR_ENV) or get_project_root() / 'outputs')
     outputs_dir.mkdir(parents=True, exist_ok=True)
     return str(outputs_dir)
 
@@ -178,26 +186,7 @@ def extract_keywords(title):
     Extract and normalize keywords from title.
     PySpark-compatible (no external dependencies).
     """
-    if not title:
-        return []
-    
-    # Remove hashtags
-    title = re.sub(r'#\w+', '', title)
-    
-    # Tokenize
-    words = re.findall(r'\b\w+\b', title.lower())
-    
-    # Filter and normalize
-    keywords = []
-    stop_words = get_stop_words()
-    
-    for word in words:
-        if len(word) > 2 and word not in stop_words:
-            normalized = normalize_keyword(word)
-            if normalized and len(normalized) > 2:
-                keywords.append(normalized)
-    
-    return keywords
+    return tokenize_title(title, get_stop_words())
 
 
 # =============================================================================
@@ -225,6 +214,78 @@ def get_stop_words():
     }
 
 
+# =============================================================================
+# TITLE TOKENS
+# =============================================================================
+
+# Bump whenever cleaning, stemming or mappings change: stored tokens are then recomputed
+NORMALIZER_VERSION = 'v1'
+
+# Stop words dropped at ingest (shared by every title keyword consumer)
+TITLE_STOP_WORDS = {
+    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i',
+    'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at',
+    'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her',
+    'or', 'an', 'will', 'my', 'one', 'all', 'would', 'there', 'their',
+    'what', 'so', 'up', 'out', 'if', 'about', 'who', 'get', 'which',
+    'me', 'when', 'make', 'can', 'like', 'time', 'no', 'just', 'him',
+    'know', 'take', 'people', 'into', 'year', 'your', 'good', 'some',
+    'video', 'news', 'latest', 'live', 'watch', 'full', 'today'
+}
+
+
+def clean_text(text):
+    """Decode HTML entities (&amp;, &#39;, ...), drop <br> tags and hashtags."""
+    text = html.unescape(text)
+    text = re.sub(r'<br\s*/?>', ' ', text, flags=re.IGNORECASE)
+    return re.sub(r'#\w+', '', text)
+
+
+def tokenize_title(title, stop_words=TITLE_STOP_WORDS, min_length=3):
+    """Normalized tokens of a title, in order and with repeats.
+
+    Stop words and the minimum length are checked on the raw word, before
+    stemming (so 'breaking' is dropped while 'used' still yields 'use').
+    Stored `titleTokens` use the defaults; other lists need re-tokenizing.
+    """
+    if not title:
+        return []
+
+    tokens = []
+    for word in re.findall(r'\b\w+\b', clean_text(title).lower()):
+        if len(word) < min_length or word in stop_words:
+            continue
+        normalized = normalize_keyword(word)
+        if normalized and len(normalized) >= min_length:
+            tokens.append(normalized)
+    return tokens
+
+
+def title_tokens(video):
+    """Tokens stored with a video, recomputed if missing or from another normalizer version."""
+    if video.get('tokensVersion') == NORMALIZER_VERSION and video.get('titleTokens') is not None:
+        return list(video['titleTokens'])
+    return tokenize_title(video.get('title'))
+
+
+def add_title_tokens(video):
+    """Materialize `titleTokens` and `tokensVersion` on a video record."""
+    if video.get('tokensVersion') != NORMALIZER_VERSION:
+        video['titleTokens'] = tokenize_title(video.get('title'))
+        video['tokensVersion'] = NORMALIZER_VERSION
+    return video
+
+
+def title_token_column(titles, tokens=None, versions=None):
+    """Token lists of a column of titles, reusing stored tokens where current."""
+    if tokens is None or versions is None:
+        return [tokenize_title(title) for title in titles]
+    return [
+        list(stored) if version == NORMALIZER_VERSION and stored is not None else tokenize_title(title)
+        for title, stored, version in zip(titles, tokens, versions)
+    ]
+
+
 # =============================================================================
 # DURATION PARSING
 # =============================================================================
@@ -252,3 +313,129 @@ def parse_duration(duration_str):
         seconds = int(duration_str.split('S')[0])
         
     return hours * 3600 + minutes * 60 + seconds
+
+
+# =============================================================================
+# JSON STREAMING
+# =============================================================================
+
+def _read_past_whitespace(f, chunk_size):
+    """Read from `f` until the first non-whitespace character; returns the text from there."""
+    buffer = ''
+    while not buffer:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    return buffer
+
+
+def iter_json_array(path, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only the element being decoded is held in memory, so files larger
+    than RAM can be scanned.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = _read_past_whitespace(f, chunk_size)
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} is not a JSON array")
+        pos = 1
+        eof = False
+
+        while True:
+            # Skip separators, refilling the buffer when it runs out
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unterminated JSON array")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = chunk, 0
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                # A number cut by the buffer end ("12" of "12345", "3." of "3.5") may continue
+                complete = eof or (end < len(buffer) and buffer[end] not in '0123456789.eE+-')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # Element spans the buffer end: read more (doubling for very large elements)
+                chunk = f.read(max(chunk_size, len(buffer) - pos))
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            pos = end
+            yield element
+
+
+def iter_json_records(path):
+    """Yield the records of a JSON array file or of an NDJSON file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        head = _read_past_whitespace(f, 4096)
+
+    if head.startswith('['):
+        yield from iter_json_array(path)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_flat_rows(path, kinds=('video', 'comment')):
+    """Yield ('video', row) and ('comment', row) pairs from a data file.
+
+    Videos are yielded without their nested `comments` list, followed by
+    each of their comments; files of flat comment records (with a
+    `commentId`) yield comment rows only. Kinds not in `kinds` are skipped
+    without building their rows.
+    """
+    want_videos = 'video' in kinds
+    want_comments = 'comment' in kinds
+
+    for record in iter_json_records(path):
+        if 'commentId' in record:
+            if want_comments:
+                yield 'comment', record
+            continue
+
+        comments = record.pop('comments', None) or []
+        if want_videos:
+            yield 'video', record
+        if want_comments:
+            for comment in comments:
+                comment.setdefault('videoId', record.get('videoId'))
+                yield 'comment', comment
+
+
+def iter_row_batches(path, batch_size=5000, kinds=('video', 'comment'), fields=None):
+    """Yield (kind, rows) batches of at most `batch_size` flat rows.
+
+    `fields` optionally maps a kind to the keys to keep in its rows.
+    """
+    batches = {kind: [] for kind in kinds}
+    fields = fields or {}
+
+    for kind, row in iter_flat_rows(path, kinds):
+        keep = fields.get(kind)
+        if keep is not None:
+            row = {key: row.get(key) for key in keep}
+        batch = batches[kind]
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield kind, batch
+            batches[kind] = []
+
+    for kind, batch in batches.items():
+        if batch:
+            yield kind, batch